@@ -0,0 +1,182 @@
+"""
+CSC111 Final Project: Playlist Generator
+
+Module Description
+==================
+
+This file is dedicated to the class Adjacency, the neighbours of every point of a Graph as
+lists of rows sorted by distance.
+
+Graph.bfs visits the neighbours of a point from the closest to the farthest. Sorting the keys
+of Point.neighbours for every visited point made sorting the main cost of a recommendation.
+An Adjacency keeps the neighbour rows of each point already sorted by the distance they are
+stored under in Point.neighbours, so bfs only walks lists of integers. New edges are inserted
+in sorted position.
+
+The neighbours of a point in a binary graph file are only sorted the first time they are used,
+so that loading a graph file stays near-instant.
+
+An Adjacency can also be built on top of another one (see GraphOverlay): it reads the rows of
+the other one and copies a row the first time it changes, so the other one is never changed.
+
+Copyright and Usage Information
+===============================
+
+Permission is hereby granted, free of charge, to any person
+obtaining a copy of this software and associated documentation
+files (the "Software"), to deal in the Software without
+restriction, including without limitation the rights to use,
+copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the
+Software is furnished to do so, subject to the following
+conditions:
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES
+OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY,
+WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+OTHER DEALINGS IN THE SOFTWARE.
+
+This file is Copyright (c) 2021 Si Yuan Zhao, Hayk Nazaryan, Cliff Zhang, Joanne Pan.
+"""
+from __future__ import annotations
+from bisect import bisect_left
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+
+
+class Adjacency:
+    """
+    The neighbours of every row of a graph (rows are indices in Graph.points), each sorted by
+    the distance it is stored under in Point.neighbours.
+
+    Like Point.neighbours, a row has at most one neighbour per distance: adding a neighbour
+    under a distance the row already has replaces the old neighbour.
+
+    Representation Invariants:
+        - every list of distances is sorted in strictly increasing order
+    """
+    # Private Instance Attributes:
+    #     - _size:
+    #         The number of rows
+    #     - _sorted:
+    #         The (distances, neighbour rows) of each row whose neighbours were already sorted,
+    #         both sorted by distance
+    #     - _csr:
+    #         The (indptr, indices, distances) arrays of a binary graph file, from which the
+    #         neighbours of the rows not in _sorted are read, or None
+    #     - _base:
+    #         The adjacency from which the neighbours of the rows not in _sorted are read
+    #         (and copied into _sorted before they change), or None
+    _size: int
+    _sorted: Dict[int, Tuple[List[float], List[int]]]
+    _csr: Optional[Tuple[np.ndarray, np.ndarray, np.ndarray]]
+    _base: Optional[Adjacency]
+
+    def __init__(self, size: int = 0,
+                 csr: Optional[Tuple[np.ndarray, np.ndarray, np.ndarray]] = None,
+                 base: Optional[Adjacency] = None) -> None:
+        """
+        Initialize the adjacency of size rows. If csr and base are None the rows have no
+        neighbours. If csr is not None, the neighbours of row i are at
+        indices[indptr[i]:indptr[i + 1]], stored under the distances at the same positions of
+        distances. If base is not None, the rows have the neighbours of the same rows of base.
+
+        Preconditions:
+            - csr is None or len(csr[0]) == size + 1
+            - csr is None or base is None
+            - base is None or len(base) == size
+            - base does not change while this adjacency is used
+        """
+        self._size = size
+        self._sorted = dict()
+        self._csr = csr
+        self._base = base
+
+    def __len__(self) -> int:
+        """
+        Return the number of rows
+        """
+        return self._size
+
+    def neighbours(self, row: int) -> List[int]:
+        """
+        Return the neighbour rows of row, from the closest to the farthest.
+        The list must not be modified.
+        """
+        sorted_row = self._sorted.get(row)
+        if sorted_row is not None:
+            return sorted_row[1]
+        if self._base is not None:
+            return self._base.neighbours(row)
+        return self._sorted_row(row)[1]
+
+    def add(self, row: int, distance: float, neighbour_row: int) -> None:
+        """
+        Make neighbour_row the neighbour of row under distance, keeping the neighbours of row
+        sorted
+        """
+        distances, rows = self._sorted_row(row)
+        position = bisect_left(distances, distance)
+        if position < len(distances) and distances[position] == distance:
+            rows[position] = neighbour_row
+        else:
+            distances.insert(position, distance)
+            rows.insert(position, neighbour_row)
+
+    def append_row(self) -> int:
+        """
+        Add a row with no neighbours and return it
+        """
+        self._sorted[self._size] = ([], [])
+        self._size += 1
+        return self._size - 1
+
+    def _sorted_row(self, row: int) -> Tuple[List[float], List[int]]:
+        """
+        Return the sorted (distances, neighbour rows) of row, sorting them on first use
+        """
+        if row not in self._sorted:
+            if self._base is not None:
+                distances, rows = self._base._sorted_row(row)
+                self._sorted[row] = (list(distances), list(rows))
+            elif self._csr is None:
+                self._sorted[row] = ([], [])
+            else:
+                indptr, indices, distances = self._csr
+                start, end = int(indptr[row]), int(indptr[row + 1])
+                order = np.argsort(distances[start:end], kind='stable')
+                self._sorted[row] = (distances[start:end][order].tolist(),
+                                     indices[start:end][order].tolist())
+        return self._sorted[row]
+
+
+def adjacency_from_points(points: list) -> Adjacency:
+    """
+    Return the Adjacency of points (a list of Point), read from their neighbours dictionaries
+
+    Preconditions:
+        - every neighbour of a point in points is in points
+        - the ids of points are unique
+    """
+    row_of = {point.id: row for row, point in enumerate(points)}
+    adjacency = Adjacency()
+    for point in points:
+        row = adjacency.append_row()
+        for distance in sorted(point.neighbours):
+            adjacency.add(row, distance, row_of[point.neighbours[distance].id])
+    return adjacency
+
+
+if __name__ == '__main__':
+    import python_ta
+    python_ta.check_all(config={
+        'extra-imports': ['bisect', 'typing', 'numpy'],
+        'allowed-io': [],
+        # the names (strs) of functions that call print/open/input
+        'max-line-length': 100,
+        'disable': ['E1136']
+    })
@@ -0,0 +1,130 @@
+"""
+CSC111 Final Project: Playlist Generator
+
+Module Description
+==================
+
+This file is dedicated to the class CentroidTable, the table used to route the songs that are
+not in any graph to the graph whose centroid is closest to them.
+
+The graphs are mapped from their centroid Point, which is hashed by identity, so routing a song
+used to mean building a Point for it and comparing it with every centroid in Python. The table
+holds the positions of all the centroids in one matrix, and routes a whole batch of songs with a
+single distance computation. A centroid is known by its cluster id, its row in the table, which
+is also the number of its cluster file in a graphs directory and its position in a Graph_Save
+pickle. A graphs directory keeps its table in its centroids file, so its centroids are read
+back without unpickling any Point.
+
+Copyright and Usage Information
+===============================
+
+Permission is hereby granted, free of charge, to any person
+obtaining a copy of this software and associated documentation
+files (the "Software"), to deal in the Software without
+restriction, including without limitation the rights to use,
+copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the
+Software is furnished to do so, subject to the following
+conditions:
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES
+OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY,
+WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+OTHER DEALINGS IN THE SOFTWARE.
+
+This file is Copyright (c) 2021 Si Yuan Zhao, Hayk Nazaryan, Cliff Zhang, Joanne Pan.
+"""
+from __future__ import annotations
+import os
+from typing import Any, List
+import numpy as np
+from Point import Point
+from PointStore import pairwise_distances
+
+
+class CentroidTable:
+    """
+    The positions of the centroids of the graphs, one row per cluster id.
+
+    Instance Attributes:
+        - positions: The position of the centroid of every cluster, at the row of its cluster id
+
+    Representation Invariants:
+        - self.positions.ndim == 2
+    """
+    positions: np.ndarray
+
+    def __init__(self, positions: Any) -> None:
+        """
+        Initialize the table of the given centroid positions (a matrix, or a list of positions),
+        whose cluster ids are their indices
+
+        Preconditions:
+            - every position has the same number of coordinates
+        """
+        self.positions = np.array(positions, dtype=np.float64)
+
+    def __len__(self) -> int:
+        """
+        Return the number of clusters
+        """
+        return len(self.positions)
+
+    def route(self, positions: Any, m: int = 1) -> np.ndarray:
+        """
+        Return the cluster id of the centroid closest to each of positions (a matrix with one
+        position per row). If m > 1, return instead a matrix whose row i holds the cluster ids
+        of the m centroids closest to positions[i], from the closest to the farthest, e.g. to
+        also search the neighbouring clusters of a song near the boundary of its cluster.
+
+        Distances are computed exactly like Point.distance_from, and ties go to the smallest
+        cluster id, like a linear scan with a strict < comparison.
+
+        Preconditions:
+            - 1 <= m <= len(self)
+            - every position has as many coordinates as the centroids
+        """
+        positions = np.array(positions, dtype=np.float64).reshape(-1, self.positions.shape[1])
+        distances = pairwise_distances(positions, self.positions)
+        if m == 1:
+            return distances.argmin(axis=1)
+        return np.argsort(distances, axis=1, kind='stable')[:, :m]
+
+    def save(self, path: str) -> None:
+        """
+        Save the table to the .npy file at path, replacing it atomically
+        """
+        with open(path + '.tmp', 'wb') as file:
+            np.save(file, self.positions)
+        os.replace(path + '.tmp', path)
+
+
+def load_centroid_table(path: str) -> CentroidTable:
+    """
+    Return the table saved in the .npy file at path (see CentroidTable.save)
+    """
+    return CentroidTable(np.load(path))
+
+
+def table_from_points(centroids: List[Point]) -> CentroidTable:
+    """
+    Return the table of the given centroids: the cluster id of centroids[i] is i
+    """
+    if len(centroids) == 0:
+        return CentroidTable(np.empty((0, 0)))
+    return CentroidTable([centroid.pos for centroid in centroids])
+
+
+if __name__ == '__main__':
+    import python_ta
+    python_ta.check_all(config={
+        'extra-imports': ['os', 'typing', 'numpy', 'Point', 'PointStore'],
+        'allowed-io': ['CentroidTable.save'],
+        # the names (strs) of functions that call print/open/input
+        'max-line-length': 100,
+        'disable': ['E1136']
+    })
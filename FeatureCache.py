@@ -0,0 +1,271 @@
+"""
+CSC111 Final Project: Playlist Generator
+
+Module Description
+==================
+
+This file is dedicated to the class FeatureCache, a persistent on-disk cache of the audio
+features of songs.
+
+The audio features of a track never change, so Spotify_Client looks songs up in this cache
+before asking the Spotify API, and stores every answer it gets (including "no features" for
+unavailable tracks). The normalized features produced by Data.normalize_value are cached as
+well, keyed by the normalization they were made with, so that a playlist that was already
+seen needs no audio-features request at all.
+
+The cache is a SQLite database in WAL mode, so several processes can read and write it at
+the same time.
+
+Copyright and Usage Information
+===============================
+
+Permission is hereby granted, free of charge, to any person
+obtaining a copy of this software and associated documentation
+files (the "Software"), to deal in the Software without
+restriction, including without limitation the rights to use,
+copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the
+Software is furnished to do so, subject to the following
+conditions:
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES
+OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY,
+WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+OTHER DEALINGS IN THE SOFTWARE.
+
+This file is Copyright (c) 2021 Si Yuan Zhao, Hayk Nazaryan, Cliff Zhang, Joanne Pan.
+"""
+from __future__ import annotations
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, List, Optional
+
+# Default location of the cache database
+CACHE_FILE_NAME = 'Data/feature_cache.sqlite3'
+
+# Number of seconds a process waits for another process to finish writing
+BUSY_TIMEOUT = 30.0
+
+# Maximum number of song ids in one SQL query (SQLite limits the number of parameters)
+QUERY_CHUNK_SIZE = 500
+
+# Number of seconds an entry of a song without audio features stays valid by default: Spotify
+# may compute the audio features of a new or unavailable track later
+NEGATIVE_TTL = 7 * 24 * 60 * 60
+
+
+class FeatureCache:
+    """
+    A persistent cache mapping a song id to its raw audio features, and to its normalized
+    audio features for each normalization.
+
+    A cached value of None (a negative entry) means that Spotify has no audio features for the
+    song. Negative entries expire after negative_ttl seconds, even if the other entries never
+    expire.
+
+    Instance Attributes:
+        - path: The path of the SQLite database
+        - ttl: The number of seconds an entry stays valid, or None if entries never expire
+        - negative_ttl: The number of seconds a negative entry stays valid
+        - hits: The number of song lookups answered by the cache
+        - misses: The number of song lookups not answered by the cache
+
+    Representation Invariants:
+        - self.ttl is None or self.ttl > 0
+        - self.negative_ttl > 0
+        - self.hits >= 0 and self.misses >= 0
+    """
+    path: str
+    ttl: Optional[float]
+    negative_ttl: float
+    hits: int
+    misses: int
+
+    # Private Instance Attributes:
+    #     - _connection:
+    #         The connection to the database, opened on first use, or None
+    #     - _pid:
+    #         The id of the process that opened _connection (a forked child opens its own)
+    #     - _lock:
+    #         Serializes the use of _connection by the threads of this process
+    _connection: Optional[sqlite3.Connection]
+    _pid: int
+    _lock: threading.Lock
+
+    def __init__(self, path: str = CACHE_FILE_NAME, ttl: Optional[float] = None,
+                 negative_ttl: float = NEGATIVE_TTL) -> None:
+        """
+        Initialize a cache stored at path. The database is created on first use.
+
+        Preconditions:
+            - ttl is None or ttl > 0
+            - negative_ttl > 0
+        """
+        self.path = path
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.hits = 0
+        self.misses = 0
+        self._connection = None
+        self._pid = -1
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        """
+        Return the connection of this process to the database, creating the database if needed
+        """
+        if self._connection is None or self._pid != os.getpid():
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            connection = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT,
+                                         check_same_thread=False)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            with connection:
+                connection.execute('CREATE TABLE IF NOT EXISTS features ('
+                                   'song_id TEXT PRIMARY KEY, raw TEXT, fetched_at REAL)')
+                connection.execute('CREATE TABLE IF NOT EXISTS normalized ('
+                                   'song_id TEXT, normalization TEXT, normalized TEXT, '
+                                   'fetched_at REAL, PRIMARY KEY (song_id, normalization))')
+            self._connection = connection
+            self._pid = os.getpid()
+        return self._connection
+
+    def _oldest_valid(self) -> List[float]:
+        """
+        Return the oldest fetched_at of an entry that has not expired, and of a negative entry
+        that has not expired
+        """
+        now = time.time()
+        return [-1.0 if self.ttl is None else now - self.ttl, now - self.negative_ttl]
+
+    def get_many(self, song_ids: Iterable[str],
+                 count: bool = True) -> Dict[str, Optional[List[float]]]:
+        """
+        Return a dictionary mapping each song of song_ids found in the cache to its raw
+        audio features (None if Spotify has none). Songs not in the cache are left out.
+        If count is False, the lookups are not counted in self.hits and self.misses, e.g. for
+        songs already counted as missing from the normalized features.
+        """
+        return self._select('SELECT song_id, raw FROM features WHERE fetched_at >= ? AND '
+                            '(raw IS NOT NULL OR fetched_at >= ?) AND song_id IN ({})', [],
+                            song_ids, count)
+
+    def put_many(self, song_to_features: Dict[str, Optional[List[float]]]) -> None:
+        """
+        Store the raw audio features of each song of song_to_features (None if Spotify has none)
+        """
+        now = time.time()
+        self._insert('INSERT OR REPLACE INTO features VALUES (?, ?, ?)',
+                     [(song_id, _encode(song_to_features[song_id]), now)
+                      for song_id in song_to_features])
+
+    def get_normalized_many(self, song_ids: Iterable[str],
+                            normalization: str) -> Dict[str, Optional[List[float]]]:
+        """
+        Return a dictionary mapping each song of song_ids found in the cache to its audio features
+        normalized by the normalization named normalization (see Data.normalization_key).
+        Songs not in the cache are left out.
+        """
+        return self._select('SELECT song_id, normalized FROM normalized WHERE fetched_at >= ? '
+                            'AND (normalized IS NOT NULL OR fetched_at >= ?) '
+                            'AND normalization = ? AND song_id IN ({})', [normalization],
+                            song_ids)
+
+    def put_normalized_many(self, song_to_features: Dict[str, Optional[List[float]]],
+                            normalization: str) -> None:
+        """
+        Store the normalized audio features of each song of song_to_features, made with the
+        normalization named normalization
+        """
+        now = time.time()
+        self._insert('INSERT OR REPLACE INTO normalized VALUES (?, ?, ?, ?)',
+                     [(song_id, normalization, _encode(song_to_features[song_id]), now)
+                      for song_id in song_to_features])
+
+    def clear(self) -> None:
+        """
+        Remove every entry of the cache
+        """
+        with self._lock:
+            connection = self._connect()
+            with connection:
+                connection.execute('DELETE FROM features')
+                connection.execute('DELETE FROM normalized')
+
+    def close(self) -> None:
+        """
+        Close the connection to the database; it is reopened if the cache is used again
+        """
+        with self._lock:
+            if self._connection is not None and self._pid == os.getpid():
+                self._connection.close()
+            self._connection = None
+
+    def _select(self, query: str, parameters: list, song_ids: Iterable[str],
+                count: bool = True) -> Dict[str, Optional[List[float]]]:
+        """
+        Run query (whose first two parameters are the oldest valid fetched_at of an entry and
+        of a negative entry, followed by parameters, and whose {} is replaced by the
+        placeholders of the song ids) on song_ids, QUERY_CHUNK_SIZE songs at a time, and return
+        the decoded rows as a dictionary. Update the hit and miss counters if count is True.
+        """
+        song_ids = list(dict.fromkeys(song_ids))
+        found = dict()
+        with self._lock:
+            connection = self._connect()
+            oldest = self._oldest_valid()
+            for start in range(0, len(song_ids), QUERY_CHUNK_SIZE):
+                chunk = song_ids[start:start + QUERY_CHUNK_SIZE]
+                rows = connection.execute(query.format(', '.join('?' * len(chunk))),
+                                          oldest + parameters + chunk)
+                for song_id, value in rows:
+                    found[song_id] = _decode(value)
+            if count:
+                self.hits += len(found)
+                self.misses += len(song_ids) - len(found)
+        return found
+
+    def _insert(self, query: str, rows: list) -> None:
+        """
+        Run query on every row of rows in a single transaction
+        """
+        if len(rows) == 0:
+            return
+        with self._lock:
+            connection = self._connect()
+            with connection:
+                connection.executemany(query, rows)
+
+
+def _encode(features: Optional[List[float]]) -> Optional[str]:
+    """
+    Return features as stored in the database
+    """
+    return None if features is None else json.dumps([float(value) for value in features])
+
+
+def _decode(value: Optional[str]) -> Optional[List[float]]:
+    """
+    Return the features stored in the database as value
+    """
+    return None if value is None else json.loads(value)
+
+
+if __name__ == '__main__':
+    import python_ta
+    python_ta.check_all(config={
+        'extra-imports': ['json', 'os', 'sqlite3', 'threading', 'time', 'typing'],
+        'allowed-io': [],
+        # the names (strs) of functions that call print/open/input
+        'max-line-length': 100,
+        'disable': ['E1136']
+    })
@@ -0,0 +1,252 @@
+"""
+CSC111 Final Project: Playlist Generator
+
+Module Description
+==================
+
+This file is dedicated to the class GraphLog, an append-only log of the points that
+Graph.init_new_point adds to the graphs of a graphs file.
+
+Saving a new song used to mean pickling every graph again. Instead, every new point is
+appended to the log as one record holding the index of its graph, its id, its position and
+its neighbours (under the distances they are stored under in Point.neighbours), and the
+record is flushed to disk before init_new_point returns. When a graph is loaded, the records
+of its new points are replayed over it. Compaction (graph_file.compact_directory and
+graph_file.compact_saves) folds the log back into the graphs file and empties the log.
+
+Each record is one line: the CRC-32 of its JSON text in hexadecimal, a space and the JSON
+text. A record cut short by a crash fails its check and is dropped, with everything after it.
+
+Copyright and Usage Information
+===============================
+
+Permission is hereby granted, free of charge, to any person
+obtaining a copy of this software and associated documentation
+files (the "Software"), to deal in the Software without
+restriction, including without limitation the rights to use,
+copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the
+Software is furnished to do so, subject to the following
+conditions:
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES
+OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY,
+WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+OTHER DEALINGS IN THE SOFTWARE.
+
+This file is Copyright (c) 2021 Si Yuan Zhao, Hayk Nazaryan, Cliff Zhang, Joanne Pan.
+"""
+from __future__ import annotations
+import json
+import os
+import threading
+import zlib
+from typing import BinaryIO, Callable, Dict, List, Optional
+from Point import Point
+from post_cluster import Graph
+
+# Suffix added to the path of a graphs file (or directory) to get the path of its log
+LOG_SUFFIX = '.log'
+
+
+class GraphLog:
+    """
+    An append-only log of the points added to the graphs of a graphs file.
+
+    A record is a dictionary with the keys 'graph' (the index of the graph in the graphs
+    file), 'id', 'pos' and 'neighbours' (a list of [neighbour id, distance] pairs, in the
+    order of Point.neighbours).
+
+    Instance Attributes:
+        - path: The path of the log file
+        - records: The records of every graph, mapped from the index of the graph, in the
+          order they were appended
+
+    Representation Invariants:
+        - all(record['graph'] == i for i in self.records for record in self.records[i])
+    """
+    path: str
+    records: Dict[int, List[dict]]
+
+    # Private Instance Attributes:
+    #     - _file:
+    #         The log file opened for appending, or None until the first record is appended
+    #     - _lock:
+    #         Serializes appending and compaction
+    _file: Optional[BinaryIO]
+    _lock: threading.Lock
+
+    def __init__(self, path: str) -> None:
+        """
+        Open the log at path and read its records. The file is created on the first append.
+        A damaged record at the end of the file (from a crash during an append) is removed.
+        """
+        self.path = path
+        self.records = dict()
+        self._file = None
+        self._lock = threading.Lock()
+        if os.path.isfile(path):
+            with open(path, 'rb') as file:
+                data = file.read()
+            records, end = _parse_records(data)
+            for record in records:
+                self.records.setdefault(record['graph'], []).append(record)
+            if end < len(data):
+                with open(path, 'r+b') as file:
+                    file.truncate(end)
+
+    def __len__(self) -> int:
+        """
+        Return the number of records
+        """
+        return sum(len(records) for records in self.records.values())
+
+    def records_of(self, graph_index: int) -> List[dict]:
+        """
+        Return the records of the graph at graph_index
+        """
+        return self.records.get(graph_index, [])
+
+    def append(self, graph_index: int, point: Point) -> None:
+        """
+        Append a record of point, just added to the graph at graph_index with its neighbours,
+        and flush it to disk before returning
+        """
+        record = {'graph': graph_index, 'id': point.id, 'pos': [float(x) for x in point.pos],
+                  'neighbours': [[neighbour.id, float(distance)]
+                                 for distance, neighbour in point.neighbours.items()]}
+        line = _encode(record)
+        with self._lock:
+            if self._file is None:
+                self._file = open(self.path, 'ab')
+            self._file.write(line)
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self.records.setdefault(graph_index, []).append(record)
+
+    def watch(self, graph_index: int, graph: Graph) -> None:
+        """
+        Append a record of every point that Graph.init_new_point adds to graph (the graph at
+        graph_index)
+        """
+        graph.new_point_listeners.append(lambda point: self.append(graph_index, point))
+
+    def compact(self, fold: Callable[[Dict[int, List[dict]]], None]) -> int:
+        """
+        Call fold with the records currently in the log, which must write them into the
+        graphs file, then remove those records from the log file. Records appended while fold
+        runs stay in the log. Return the number of records folded.
+
+        self.records keeps every record, so that graphs loaded from a copy of the graphs file
+        made before compaction still get them; replaying a record whose point is already in
+        the graph has no effect.
+        """
+        with self._lock:
+            records = {i: list(self.records[i]) for i in self.records}
+            offset = self._size()
+        if offset == 0:
+            return 0
+        fold(records)
+        with self._lock:
+            with open(self.path, 'rb') as file:
+                file.seek(offset)
+                rest = file.read()
+            temporary_path = self.path + '.tmp'
+            with open(temporary_path, 'wb') as file:
+                file.write(rest)
+                file.flush()
+                os.fsync(file.fileno())
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+            os.replace(temporary_path, self.path)
+        return sum(len(records[i]) for i in records)
+
+    def close(self) -> None:
+        """
+        Close the log file; it is reopened if a record is appended again
+        """
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def _size(self) -> int:
+        """
+        Return the number of bytes in the log file
+        """
+        return os.path.getsize(self.path) if os.path.isfile(self.path) else 0
+
+
+def log_path(graphs_file_name: str) -> str:
+    """
+    Return the path of the log of the graphs file (or graphs directory) graphs_file_name
+    """
+    return graphs_file_name.rstrip('/' + os.sep) + LOG_SUFFIX
+
+
+def apply_records(graph: Graph, records: List[dict]) -> int:
+    """
+    Add the point of every record to graph, with the same neighbours under the same distances
+    as when it was logged. Records of points already in graph are skipped.
+    Return the number of points added.
+
+    Preconditions:
+        - the neighbours of every record are in graph or in an earlier record
+    """
+    added = 0
+    for record in records:
+        if record['id'] in graph.id_point_mapping:
+            continue
+        point = Point(record['pos'], record['id'])
+        graph.add_point(point)
+        for neighbour_id, distance in record['neighbours']:
+            graph.connect(point, graph.id_point_mapping[neighbour_id], distance)
+        added += 1
+    return added
+
+
+def _encode(record: dict) -> bytes:
+    """
+    Return the line of record in the log file
+    """
+    text = json.dumps(record, separators=(',', ':')).encode('utf-8')
+    return b'%08x %s\n' % (zlib.crc32(text), text)
+
+
+def _parse_records(data: bytes) -> tuple:
+    """
+    Return the records of the log file content data up to the first damaged record, and the
+    number of bytes they take
+    """
+    records = []
+    end = 0
+    while end < len(data):
+        line_end = data.find(b'\n', end)
+        if line_end == -1:
+            break
+        line = data[end:line_end]
+        checksum, _, text = line.partition(b' ')
+        try:
+            if int(checksum, 16) != zlib.crc32(text):
+                break
+            records.append(json.loads(text))
+        except ValueError:
+            break
+        end = line_end + 1
+    return records, end
+
+
+if __name__ == '__main__':
+    import python_ta
+    python_ta.check_all(config={
+        'extra-imports': ['json', 'os', 'threading', 'zlib', 'typing', 'Point', 'post_cluster'],
+        'allowed-io': ['GraphLog.__init__', 'GraphLog.append', 'GraphLog.compact'],
+        # the names (strs) of functions that call print/open/input
+        'max-line-length': 100,
+        'disable': ['E1136']
+    })
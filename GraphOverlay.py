@@ -0,0 +1,251 @@
+"""
+CSC111 Final Project: Playlist Generator
+
+Module Description
+==================
+
+This file is dedicated to the class GraphOverlay, a graph made of a base graph, which it never
+changes, and the songs that a recommendation adds on top of it.
+
+Graph.init_new_point used to add the songs of a playlist that are not in a graph to the graph
+itself, changing its points and the neighbours of its points, so a graph could not be searched
+by several recommendations at the same time. Each recommendation now adds its new songs to its
+own GraphOverlay, searches the base graph and the overlay together, and only merges the overlay
+into the base graph at the end (see Recommendation.action), as a separate step.
+
+Copyright and Usage Information
+===============================
+
+Permission is hereby granted, free of charge, to any person
+obtaining a copy of this software and associated documentation
+files (the "Software"), to deal in the Software without
+restriction, including without limitation the rights to use,
+copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the
+Software is furnished to do so, subject to the following
+conditions:
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES
+OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY,
+WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+OTHER DEALINGS IN THE SOFTWARE.
+
+This file is Copyright (c) 2021 Si Yuan Zhao, Hayk Nazaryan, Cliff Zhang, Joanne Pan.
+"""
+from __future__ import annotations
+from collections import ChainMap
+from typing import Any, Dict, List, Optional
+import numpy as np
+from Adjacency import Adjacency
+from GraphLog import apply_records
+from Point import Point
+from PointStore import pairwise_distances
+from post_cluster import Graph
+
+
+class GraphOverlay(Graph):
+    """
+    A graph made of a base graph and the points added to it by init_new_point, which are kept
+    in the overlay: the base graph, its points and their neighbours are never changed.
+
+    The overlay has its own lists of points and song ids, shallow copies of those of the base
+    graph (the Point objects are shared, and never changed by the overlay), so the rows
+    (indices in self.points) of the base graph are the same in the overlay, and the new points
+    come after them. When a new point becomes the neighbour of a point of the base
+    graph, the sorted neighbours of that point are copied into the overlay (see Adjacency), so
+    that searches see the new edge without changing the base graph.
+
+    Only the methods used to recommend songs (recommend, extend_recommendations,
+    fill_recommendations, search_many, bfs and init_new_point) can be used on an overlay.
+
+    Instance Attributes:
+        - base: The graph under the overlay
+        - new_points: The points added to the overlay, in order
+        - records: The id, position and neighbours (as [neighbour id, distance] pairs) of each
+          new point right after it was added, in the format of GraphLog records
+
+    Representation Invariants:
+        - len(self.new_points) == len(self.records)
+        - all(point.id not in self.base.id_point_mapping for point in self.new_points)
+    """
+    base: Graph
+    new_points: List[Point]
+    records: List[dict]
+
+    # Private Instance Attributes:
+    #     - _base_size:
+    #         The number of points of the base graph
+    #     - _new_rows:
+    #         The row of every new point, mapped from its id
+    #     - _new_positions:
+    #         The position of every new point, in order
+    _base_size: int
+    _new_rows: Dict[str, int]
+    _new_positions: List[List[float]]
+
+    def __init__(self, base: Graph) -> None:
+        """
+        Initialize an overlay with no new points on top of base.
+        Graph.__init__ is not called: the points, song ids and id mapping of the overlay are
+        those of base, to which the new points are added.
+
+        Preconditions:
+            - base does not change while the overlay is used (see is_on and rebased)
+        """
+        self.base = base
+        self.new_points = []
+        self.records = []
+        self._base_size = len(base.points)
+        self._new_rows = dict()
+        self._new_positions = []
+        self.epsilon = base.epsilon
+        self.points = list(base.points)
+        self.song_ids = list(base.song_ids)
+        self.id_point_mapping = ChainMap(dict(), base.id_point_mapping)
+        self.mutated = False
+        self.new_point_listeners = [self._record]
+        self._index = None
+        self._adjacency = Adjacency(self._base_size, base=base.adjacency)
+
+    def row_of(self, song_id: str) -> int:
+        """
+        Return the row of the song (its index in self.points)
+
+        Preconditions:
+            - song_id in self.id_point_mapping
+        """
+        if song_id in self._new_rows:
+            return self._new_rows[song_id]
+        return self.base.row_of(song_id)
+
+    def rows_within_epsilon(self, pos: List[float]) -> Any:
+        """
+        Return the rows of the points within self.epsilon of the given position, in increasing
+        order: those of the base graph, then those of the new points
+        """
+        rows = self.base.rows_within_epsilon(pos)
+        if len(self.new_points) > 0:
+            distances = self._new_distances(pos)
+            rows.extend((np.nonzero(distances <= self.epsilon)[0] + self._base_size).tolist())
+        return rows
+
+    def closest_point_index(self, point: Point) -> Any:
+        """
+        Return index of the closest point (in self.points), other than point itself.
+        Ties go to the smallest index.
+        """
+        # The closest new point is where the search of the base graph starts: its rows come
+        # after those of the base graph, so base points as close win the tie
+        candidates = None
+        if len(self.new_points) > 0:
+            distances = self._new_distances(point.pos)
+            if point.id in self._new_rows:
+                distances[self._new_rows[point.id] - self._base_size] = np.inf
+            new_i = int(distances.argmin())
+            if distances[new_i] < np.inf:
+                candidates = (distances[[new_i]], np.array([self._base_size + new_i]))
+        return int(self.base.index.nearest(np.array([point.pos], dtype=float),
+                                           candidates=candidates)[0])
+
+    def add_point(self, new_point: Point) -> None:
+        """
+        Add new_point to the overlay as it is, without giving it neighbours and without calling
+        self.new_point_listeners
+        """
+        self._new_rows[new_point.id] = self._base_size + len(self.new_points)
+        self.new_points.append(new_point)
+        self._new_positions.append(list(new_point.pos))
+        self.points.append(new_point)
+        self.song_ids.append(new_point.id)
+        self.id_point_mapping[new_point.id] = new_point
+        self._adjacency.append_row()
+
+    def connect(self, point: Point, neighbour: Point, distance: Optional[float] = None) -> None:
+        """
+        Make point and neighbour neighbours under distance, or under the distance
+        Point.become_neighbour would use if distance is None. Only the neighbours of new
+        points are changed: the edge is added to the copy of the neighbours of a base point
+        in the adjacency of the overlay.
+
+        Preconditions:
+            - point in self.new_points and neighbour in self.points
+        """
+        if distance is None:
+            distance = point.neighbour_distance(neighbour)
+        point.neighbours[distance] = neighbour
+        if neighbour.id in self._new_rows:
+            neighbour.neighbours[distance] = point
+        row, neighbour_row = self._new_rows[point.id], self.row_of(neighbour.id)
+        self._adjacency.add(row, distance, neighbour_row)
+        self._adjacency.add(neighbour_row, distance, row)
+
+    def is_on(self, graph: Graph) -> bool:
+        """
+        Return whether the overlay is on graph as it is now: graph is the base graph, and no
+        point was added to it since the overlay was created
+        """
+        return graph is self.base and len(graph.points) == self._base_size
+
+    def rebased(self, graph: Graph) -> GraphOverlay:
+        """
+        Return an overlay on graph (e.g. the base graph after other overlays were merged into
+        it) with the new points of this overlay that are not in graph, added again in order by
+        init_new_point, so that their neighbours are found in graph as it is now.
+        The overlay must not be used after it is rebased.
+        """
+        overlay = GraphOverlay(graph)
+        for record in self.records:
+            if record['id'] not in graph.id_point_mapping:
+                overlay.init_new_point(Point(record['pos'], record['id']))
+        return overlay
+
+    def merge(self, graph: Optional[Graph] = None) -> int:
+        """
+        Add the new points of the overlay to graph (self.base if graph is None), with the
+        neighbours they had right after they were added, and call graph.new_point_listeners
+        with each. Points whose id is already in graph (e.g. merged from another overlay) are
+        skipped. Return the number of points added.
+
+        Points are matched by id, so graph can be another copy of the base graph (e.g. one
+        loaded again by graph_file.LazyGraphs). The overlay must not be used after it is merged.
+        """
+        graph = self.base if graph is None else graph
+        added = 0
+        for record in self.records:
+            if apply_records(graph, [record]) == 1:
+                graph.mutated = True
+                for listener in graph.new_point_listeners:
+                    listener(graph.id_point_mapping[record['id']])
+                added += 1
+        return added
+
+    def _record(self, point: Point) -> None:
+        """
+        Append the record of point, just added by init_new_point, to self.records
+        """
+        self.records.append({'id': point.id, 'pos': list(point.pos),
+                             'neighbours': [[neighbour.id, distance]
+                                            for distance, neighbour in point.neighbours.items()]})
+
+    def _new_distances(self, pos: List[float]) -> np.ndarray:
+        """
+        Return the distance from pos to every new point (as computed by Point.distance_from)
+        """
+        return pairwise_distances(np.array([pos], dtype=float),
+                                  np.array(self._new_positions, dtype=float))[0]
+
+
+if __name__ == '__main__':
+    import python_ta
+    python_ta.check_all(config={
+        'extra-imports': ['collections', 'typing', 'numpy', 'Adjacency', 'GraphLog', 'Point',
+                          'PointStore', 'post_cluster'],
+        'allowed-io': [],
+        # the names (strs) of functions that call print/open/input
+        'max-line-length': 100,
+        'disable': ['E1136']
+    })
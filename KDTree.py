@@ -0,0 +1,302 @@
+"""
+CSC111 Final Project: Playlist Generator
+
+Module Description
+==================
+
+This file is dedicated to the class KDTree, a spatial index over the rows of a PointStore.
+
+Graph uses it to find every song within epsilon of a song (radius queries) and the closest
+song to a song (nearest-neighbour queries) without comparing against every song in the graph.
+Candidate songs are always checked with the same distance computation as Point.distance_from,
+so the answers are exactly the ones a linear scan would give.
+
+Copyright and Usage Information
+===============================
+
+Permission is hereby granted, free of charge, to any person
+obtaining a copy of this software and associated documentation
+files (the "Software"), to deal in the Software without
+restriction, including without limitation the rights to use,
+copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the
+Software is furnished to do so, subject to the following
+conditions:
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES
+OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY,
+WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+OTHER DEALINGS IN THE SOFTWARE.
+
+This file is Copyright (c) 2021 Si Yuan Zhao, Hayk Nazaryan, Cliff Zhang, Joanne Pan.
+"""
+from __future__ import annotations
+from typing import List, Optional, Tuple
+import numpy as np
+from PointStore import PointStore, pairwise_distances
+
+# Maximum number of rows in a leaf of the tree
+LEAF_SIZE = 32
+
+# Relative slack added to the pruning bounds, so that rounding errors in the bounding box
+# distances can never prune a song whose exact distance is within the radius
+BOUND_SLACK = 1e-9
+
+
+class KDTree:
+    """
+    A k-d tree over the rows of a PointStore. Each node covers a set of rows and stores
+    the bounding box of their positions; a leaf keeps its rows sorted.
+
+    Rows appended to the store after the tree was built are kept in a pending list and
+    checked by a linear scan, until there are enough of them to rebuild the tree.
+
+    Instance Attributes:
+        - store: The PointStore whose rows are indexed
+        - leaf_size: The maximum number of rows in a leaf
+
+    Representation Invariants:
+        - self.leaf_size > 0
+    """
+    store: PointStore
+    leaf_size: int
+
+    # Private Instance Attributes:
+    #     - _order:
+    #         A permutation of the indexed rows; each node covers _order[_start[i]:_end[i]]
+    #     - _start, _end:
+    #         The range of _order covered by each node
+    #     - _children:
+    #         The (left, right) children of each node, or (-1, -1) for a leaf
+    #     - _lower, _upper:
+    #         (number of nodes, dimension) matrices of the bounding box of each node
+    #     - _pending:
+    #         Rows of the store that are not in the tree yet
+    _order: np.ndarray
+    _start: np.ndarray
+    _end: np.ndarray
+    _children: np.ndarray
+    _lower: np.ndarray
+    _upper: np.ndarray
+    _pending: List[int]
+
+    def __init__(self, store: PointStore, leaf_size: int = LEAF_SIZE) -> None:
+        """
+        Build the tree over every row currently in store.
+
+        Preconditions:
+            - leaf_size > 0
+        """
+        self.store = store
+        self.leaf_size = leaf_size
+        self._build()
+
+    def __len__(self) -> int:
+        """
+        Return the number of rows covered by the index (including the pending rows)
+        """
+        return len(self._order) + len(self._pending)
+
+    def _build(self) -> None:
+        """
+        (Re)build the tree over every row of self.store, splitting each node at the median
+        of the dimension in which its positions are the most spread out
+        """
+        positions = self.store.positions
+        self._order = np.arange(len(self.store), dtype=np.intp)
+        self._pending = []
+        starts, ends, children, lowers, uppers = [], [], [], [], []
+        if len(self._order) > 0:
+            stack = [(0, len(self._order), -1, 0)]
+        else:
+            stack = []
+        while stack:
+            start, end, parent, side = stack.pop()
+            node = len(starts)
+            if parent >= 0:
+                children[parent][side] = node
+            rows = self._order[start:end]
+            lower, upper = positions[rows].min(axis=0), positions[rows].max(axis=0)
+            starts.append(start)
+            ends.append(end)
+            children.append([-1, -1])
+            lowers.append(lower)
+            uppers.append(upper)
+            if end - start > self.leaf_size:
+                dim = int(np.argmax(upper - lower))
+                middle = (end - start) // 2
+                split = np.argpartition(positions[rows, dim], middle)
+                self._order[start:end] = rows[split]
+                stack.append((start + middle, end, node, 1))
+                stack.append((start, start + middle, node, 0))
+            else:
+                self._order[start:end] = np.sort(rows)
+        self._start = np.array(starts, dtype=np.intp)
+        self._end = np.array(ends, dtype=np.intp)
+        self._children = np.array(children, dtype=np.intp).reshape(-1, 2)
+        self._lower = np.array(lowers, dtype=float).reshape(len(starts), positions.shape[1])
+        self._upper = np.array(uppers, dtype=float).reshape(len(starts), positions.shape[1])
+
+    def add(self, row: int) -> None:
+        """
+        Add a row that was appended to self.store after the tree was built.
+        The tree is rebuilt once the pending rows make up a quarter of the index.
+        """
+        self._pending.append(row)
+        if len(self._pending) > max(self.leaf_size, len(self._order) // 4):
+            self._build()
+
+    def _box_distances(self, node: int, queries: np.ndarray) -> np.ndarray:
+        """
+        Return a lower bound on the distance from each query to the bounding box of node
+        """
+        gaps = np.maximum(self._lower[node] - queries, 0) + \
+            np.maximum(queries - self._upper[node], 0)
+        return np.sqrt((gaps * gaps).sum(axis=1))
+
+    def query_radius(self, queries: np.ndarray, radius: float) -> List[np.ndarray]:
+        """
+        Return, for each row of queries, the sorted array of the rows of self.store whose
+        distance to the query (as computed by Point.distance_from) is at most radius
+        """
+        queries = np.asarray(queries, dtype=float)
+        positions = self.store.positions
+        bound = radius + BOUND_SLACK * max(abs(radius), 1)
+        found_queries, found_rows = [], []
+
+        if len(self._order) > 0:
+            stack = [(0, np.arange(len(queries)))]
+        else:
+            stack = []
+        while stack:
+            node, active = stack.pop()
+            active = active[self._box_distances(node, queries[active]) <= bound]
+            if len(active) == 0:
+                continue
+            left, right = self._children[node]
+            if left >= 0:
+                stack.append((right, active))
+                stack.append((left, active))
+            else:
+                rows = self._order[self._start[node]:self._end[node]]
+                _collect(queries[active], active, positions[rows], rows, radius,
+                         found_queries, found_rows)
+
+        if self._pending:
+            rows = np.array(self._pending, dtype=np.intp)
+            _collect(queries, np.arange(len(queries)), positions[rows], rows, radius,
+                     found_queries, found_rows)
+
+        if not found_queries:
+            return [np.empty(0, dtype=np.intp) for _ in range(len(queries))]
+        found_queries = np.concatenate(found_queries)
+        found_rows = np.concatenate(found_rows)
+        order = np.lexsort((found_rows, found_queries))
+        bounds = np.searchsorted(found_queries[order], np.arange(len(queries) + 1))
+        found_rows = found_rows[order]
+        return [found_rows[bounds[i]:bounds[i + 1]] for i in range(len(queries))]
+
+    def nearest(self, queries: np.ndarray, exclude: Optional[np.ndarray] = None,
+                candidates: Optional[Tuple[np.ndarray, np.ndarray]] = None) -> np.ndarray:
+        """
+        Return, for each row of queries, the row of self.store closest to the query, ignoring
+        the row exclude[i] for query i (-1 to ignore nothing). Ties go to the smallest row, like
+        a linear scan with a strict < comparison. The result is -1 if there is no other row.
+
+        candidates is a pair of arrays with, for each query, a distance and a row (which need
+        not be a row of self.store, e.g. a point kept outside the tree) to start from as the
+        closest found so far: it is returned if no row of self.store is closer (or as close
+        with a smaller row). Nodes farther than it are skipped from the start.
+
+        Each query visits the children of a node nearest first, and skips any node whose
+        bounding box is farther than the closest row found so far.
+        """
+        queries = np.asarray(queries, dtype=float)
+        if exclude is None:
+            exclude = np.full(len(queries), -1, dtype=np.intp)
+        positions = self.store.positions
+        if candidates is None:
+            best_distances = np.full(len(queries), np.inf)
+            best_rows = np.full(len(queries), -1, dtype=np.intp)
+        else:
+            best_distances = np.array(candidates[0], dtype=float)
+            best_rows = np.array(candidates[1], dtype=np.intp)
+
+        if self._pending:
+            rows = np.array(self._pending, dtype=np.intp)
+            _improve(queries, np.arange(len(queries)), exclude, positions[rows], rows,
+                     best_distances, best_rows)
+
+        if len(self._order) > 0:
+            stack = [(0, np.arange(len(queries)))]
+        else:
+            stack = []
+        while stack:
+            node, active = stack.pop()
+            bounds = best_distances[active]
+            bounds = bounds + BOUND_SLACK * np.maximum(bounds, 1)
+            active = active[self._box_distances(node, queries[active]) <= bounds]
+            if len(active) == 0:
+                continue
+            left, right = self._children[node]
+            if left >= 0:
+                left_first = self._box_distances(left, queries[active]) <= \
+                    self._box_distances(right, queries[active])
+                stack.append((left, active[~left_first]))
+                stack.append((right, active[left_first]))
+                stack.append((right, active[~left_first]))
+                stack.append((left, active[left_first]))
+            else:
+                rows = self._order[self._start[node]:self._end[node]]
+                _improve(queries[active], active, exclude, positions[rows], rows,
+                         best_distances, best_rows)
+        return best_rows
+
+
+def _collect(queries: np.ndarray, query_indices: np.ndarray, positions: np.ndarray,
+             rows: np.ndarray, radius: float, found_queries: list, found_rows: list) -> None:
+    """Helper function for KDTree.query_radius.
+    Append the (query index, row) pairs whose distance is at most radius to found_queries
+    and found_rows."""
+    within = pairwise_distances(queries, positions) <= radius
+    query_i, row_i = np.nonzero(within)
+    found_queries.append(query_indices[query_i])
+    found_rows.append(rows[row_i])
+
+
+def _improve(queries: np.ndarray, query_indices: np.ndarray, exclude: np.ndarray,
+             positions: np.ndarray, rows: np.ndarray, best_distances: np.ndarray,
+             best_rows: np.ndarray) -> None:
+    """Helper function for KDTree.nearest.
+    Replace best_distances[i] and best_rows[i] for each i in query_indices with the closest
+    of the given rows, if it is closer (or as close with a smaller row).
+
+    Preconditions:
+        - rows is sorted in increasing order
+    """
+    distances = pairwise_distances(queries, positions)
+    distances[exclude[query_indices, None] == rows[None, :]] = np.inf
+    closest = distances.argmin(axis=1)
+    closest_distances = distances[np.arange(len(queries)), closest]
+    closest_rows = rows[closest]
+    old_distances, old_rows = best_distances[query_indices], best_rows[query_indices]
+    better = (closest_distances < old_distances) | \
+        ((closest_distances == old_distances) & (closest_rows < old_rows) &
+         (closest_distances < np.inf))
+    best_distances[query_indices[better]] = closest_distances[better]
+    best_rows[query_indices[better]] = closest_rows[better]
+
+
+if __name__ == '__main__':
+    import python_ta
+    python_ta.check_all(config={
+        'extra-imports': ['numpy', 'typing', 'PointStore'],
+        'allowed-io': [],
+        # the names (strs) of functions that call print/open/input
+        'max-line-length': 100,
+        'disable': ['E1136']
+    })
@@ -64,16 +64,26 @@ class Point:
         """
         return str(self.id)
 
-    def become_neighbour(self, point: Point) -> None:
+    def become_neighbour(self, point: Point) -> float:
         """
         Add self to point.neighbours
         Add point to self.neighbours
+        Return the distance they are neighbours under
+        """
+        distance = self.neighbour_distance(point)
+        self.neighbours[distance] = point
+        point.neighbours[distance] = self
+        return distance
+
+    def neighbour_distance(self, point: Point) -> float:
+        """
+        Return the distance become_neighbour would make self and point neighbours under:
+        their distance, raised until it is not already in self.neighbours
         """
         distance = self.distance_from(point)
         while distance in self.neighbours:
             distance += 0.0000000001
-        self.neighbours[distance] = point
-        point.neighbours[distance] = self
+        return distance
 
     def is_neighbour_with(self, point: Point) -> bool:
         """
@@ -91,10 +101,11 @@ class Point:
         """
         Returns the distance from a given point
         """
-        dimension = len(self.pos)
+        self_pos, point_pos = self.pos, point.pos
+        dimension = len(self_pos)
         accumulator = 0
         for i in range(dimension):
-            delta = self.pos[i] - point.pos[i]
+            delta = self_pos[i] - point_pos[i]
             accumulator += delta ** 2
         return accumulator ** 0.5
 
@@ -0,0 +1,251 @@
+"""
+CSC111 Final Project: Playlist Generator
+
+Module Description
+==================
+
+This file is dedicated to the class PointStore, which stores every song position in one
+contiguous float matrix instead of one Point object per song.
+
+The hot paths (k-means, graph construction and recommendations) work on row indices into a
+PointStore. StoredPoint is a thin Point view of a single row, for code that still expects Points.
+
+Copyright and Usage Information
+===============================
+
+Permission is hereby granted, free of charge, to any person
+obtaining a copy of this software and associated documentation
+files (the "Software"), to deal in the Software without
+restriction, including without limitation the rights to use,
+copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the
+Software is furnished to do so, subject to the following
+conditions:
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES
+OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY,
+WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+OTHER DEALINGS IN THE SOFTWARE.
+
+This file is Copyright (c) 2021 Si Yuan Zhao, Hayk Nazaryan, Cliff Zhang, Joanne Pan.
+"""
+from __future__ import annotations
+from typing import Any, Iterable, List, Optional
+import numpy as np
+from Point import Point
+
+
+class PointStore:
+    """
+    A columnar store of songs.
+
+    Instance Attributes:
+        - positions: A (number of songs, dimension) float matrix; row i is the position of song i
+        - ids: An array of song ids, parallel to the rows of positions
+        - id_to_row: A dictionary mapping a song id to its row
+
+    Representation Invariants:
+        - len(self.positions) == len(self.ids) == len(self.id_to_row)
+        - all(self.ids[self.id_to_row[song_id]] == song_id for song_id in self.id_to_row)
+    """
+    id_to_row: dict
+
+    # Private Instance Attributes:
+    #     - _positions:
+    #         The allocated position matrix. Only the first _size rows are in use, so that
+    #         append does not need to copy the whole matrix every time.
+    #     - _ids:
+    #         The allocated id array, with the same capacity as _positions.
+    #     - _size:
+    #         The number of songs in the store.
+    #     - _views:
+    #         The StoredPoint views handed out so far, mapped from their row. A row is always
+    #         viewed by the same StoredPoint, so identity comparisons between Points still work.
+    _positions: np.ndarray
+    _ids: np.ndarray
+    _size: int
+    _views: dict
+
+    def __init__(self, positions: Any, ids: Iterable[str]) -> None:
+        """
+        Initialize the store with the given positions and ids.
+        A float array (e.g. a numpy.memmap) is used as is, without copying it.
+
+        Preconditions:
+            - len(positions) == len(ids)
+            - ids contains no duplicates
+        """
+        self._ids = np.array(list(ids), dtype=str)
+        if len(self._ids) == 0:
+            self._positions = np.empty((0, 0))
+        else:
+            self._positions = np.asarray(positions, dtype=float).reshape(len(self._ids), -1)
+        self._size = len(self._ids)
+        self.id_to_row = {song_id: row for row, song_id in enumerate(self._ids.tolist())}
+        self._views = dict()
+
+    def __len__(self) -> int:
+        """
+        Return the number of songs in the store
+        """
+        return self._size
+
+    @property
+    def positions(self) -> np.ndarray:
+        """
+        The position matrix, one row per song
+        """
+        return self._positions[:self._size]
+
+    @property
+    def ids(self) -> np.ndarray:
+        """
+        The song ids, parallel to the rows of positions
+        """
+        return self._ids[:self._size]
+
+    @property
+    def dimension(self) -> int:
+        """
+        The number of attributes in every position
+        """
+        return self._positions.shape[1]
+
+    def row_of(self, song_id: str) -> Optional[int]:
+        """
+        Return the row of the given song, or None if the song is not in the store
+        """
+        return self.id_to_row.get(song_id)
+
+    def point(self, row: int) -> StoredPoint:
+        """
+        Return the StoredPoint view of the given row
+        """
+        if row not in self._views:
+            self._views[row] = StoredPoint(self, row)
+        return self._views[row]
+
+    def points(self, rows: Optional[Iterable[int]] = None) -> List[StoredPoint]:
+        """
+        Return the StoredPoint views of the given rows (every row if rows is None)
+        """
+        if rows is None:
+            rows = range(self._size)
+        return [self.point(int(row)) for row in rows]
+
+    def append(self, pos: List[float], song_id: str) -> int:
+        """
+        Add a new song at the end of the store and return its row.
+        The underlying arrays grow geometrically, so appending is amortized O(dimension).
+
+        Preconditions:
+            - song_id not in self.id_to_row
+            - len(pos) == self.dimension
+        """
+        if self._size == 0 and self.dimension != len(pos):
+            self._positions = np.empty((0, len(pos)))
+        if self._size == len(self._positions):
+            capacity = max(16, 2 * len(self._positions))
+            positions = np.empty((capacity, self.dimension))
+            positions[:self._size] = self.positions
+            self._positions = positions
+            self._ids = np.resize(self._ids, capacity)
+        if len(song_id) > self._ids.itemsize // np.dtype('<U1').itemsize:
+            self._ids = self._ids.astype(f'<U{len(song_id)}')
+        self._positions[self._size] = pos
+        self._ids[self._size] = song_id
+        self.id_to_row[song_id] = self._size
+        self._size += 1
+        return self._size - 1
+
+    def distances_from(self, pos: List[float], rows: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Return the distances from pos to every song in rows (every song if rows is None).
+        Each distance is exactly equal to the one Point.distance_from returns.
+        """
+        positions = self.positions if rows is None else self.positions[rows]
+        return pairwise_distances(positions, np.array([pos], dtype=float))[:, 0]
+
+    def nbytes(self) -> int:
+        """
+        Return the number of bytes used by the arrays of the store in use
+        (not counting id_to_row and the StoredPoint views)
+        """
+        return self.positions.nbytes + self.ids.nbytes
+
+
+class StoredPoint(Point):
+    """
+    A Point whose position is a row of a PointStore.
+
+    Instance Attributes:
+        - store: The PointStore holding the position of this point
+        - row: The row of this point in store
+        - id: String representing Song id registered with Spotify
+        - neighbours: Dictionary mapping distance to neighbour
+    """
+    store: PointStore
+    row: int
+
+    def __init__(self, store: PointStore, row: int) -> None:
+        """
+        Initialize a view of the given row, with no neighbours
+        """
+        # Point.__init__ is not called because pos is read from the store
+        self.store = store
+        self.row = row
+        self.id = str(store.ids[row])
+        self.neighbours = dict()
+
+    @property
+    def pos(self) -> List[float]:
+        """
+        The normalized position of the point, read from the store
+        """
+        return self.store.positions[self.row].tolist()
+
+
+def store_from_rows(data: List[List]) -> PointStore:
+    """
+    Return a PointStore for rows in the format returned by k_means.load_path,
+    i.e. each row is [id, position values...]
+    """
+    return PointStore([line[1:] for line in data], [line[0] for line in data])
+
+
+def store_from_points(points: List[Point]) -> PointStore:
+    """
+    Return a PointStore holding a copy of the positions and ids of the given points.
+    Row i of the store is points[i].
+    """
+    if len(points) == 0:
+        return PointStore(np.empty((0, 0)), [])
+    return PointStore([point.pos for point in points], [point.id for point in points])
+
+
+def pairwise_distances(positions: np.ndarray, others: np.ndarray) -> np.ndarray:
+    """Return the matrix of distances between every row of positions and every row of others.
+
+    The squared differences are accumulated one dimension at a time, in the same order as
+    Point.distance_from, so every entry is exactly equal to the distance that method returns.
+    """
+    accumulator = np.zeros((positions.shape[0], others.shape[0]))
+    for i in range(positions.shape[1]):
+        delta = positions[:, i, None] - others[None, :, i]
+        accumulator += delta * delta
+    return np.sqrt(accumulator)
+
+
+if __name__ == '__main__':
+    import python_ta
+    python_ta.check_all(config={
+        'extra-imports': ['numpy', 'Point', 'typing'],
+        'allowed-io': [],
+        # the names (strs) of functions that call print/open/input
+        'max-line-length': 100,
+        'disable': ['E1136']
+    })
@@ -0,0 +1,122 @@
+"""
+CSC111 Final Project: Playlist Generator
+
+Module Description
+==================
+
+This file is dedicated to the class ReadWriteLock, the lock shared by the recommendations that
+use the same graphs (see Recommendation.graph_lock).
+
+Recommendations only read the graphs while they search them, adding their new songs to their
+own GraphOverlay, so any number of them can search at the same time. Merging the new songs into
+the graphs changes them, so it is done by one recommendation at a time, while no other one is
+searching.
+
+Copyright and Usage Information
+===============================
+
+Permission is hereby granted, free of charge, to any person
+obtaining a copy of this software and associated documentation
+files (the "Software"), to deal in the Software without
+restriction, including without limitation the rights to use,
+copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the
+Software is furnished to do so, subject to the following
+conditions:
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES
+OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY,
+WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+OTHER DEALINGS IN THE SOFTWARE.
+
+This file is Copyright (c) 2021 Si Yuan Zhao, Hayk Nazaryan, Cliff Zhang, Joanne Pan.
+"""
+from __future__ import annotations
+import threading
+from contextlib import contextmanager
+from typing import Iterator
+
+
+class ReadWriteLock:
+    """
+    A lock held either by any number of readers at the same time, or by a single writer.
+
+    A writer waiting for the lock keeps new readers from taking it, so that a steady stream of
+    readers cannot keep it waiting forever. The lock is not reentrant: a thread holding it must
+    not take it again.
+    """
+    # Private Instance Attributes:
+    #     - _condition:
+    #         Protects the attributes below, and is notified whenever the lock is released
+    #     - _readers:
+    #         The number of threads holding the lock for reading
+    #     - _writing:
+    #         Whether a thread holds the lock for writing
+    #     - _waiting_writers:
+    #         The number of threads waiting to hold the lock for writing
+    _condition: threading.Condition
+    _readers: int
+    _writing: bool
+    _waiting_writers: int
+
+    def __init__(self) -> None:
+        """
+        Initialize a lock held by no thread
+        """
+        self._condition = threading.Condition()
+        self._readers = 0
+        self._writing = False
+        self._waiting_writers = 0
+
+    @contextmanager
+    def reading(self) -> Iterator[None]:
+        """
+        Hold the lock for reading during the with statement
+        """
+        with self._condition:
+            while self._writing or self._waiting_writers > 0:
+                self._condition.wait()
+            self._readers += 1
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._readers -= 1
+                if self._readers == 0:
+                    self._condition.notify_all()
+
+    @contextmanager
+    def writing(self) -> Iterator[None]:
+        """
+        Hold the lock for writing during the with statement
+        """
+        with self._condition:
+            self._waiting_writers += 1
+            try:
+                while self._writing or self._readers > 0:
+                    self._condition.wait()
+            finally:
+                self._waiting_writers -= 1
+                self._condition.notify_all()
+            self._writing = True
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._writing = False
+                self._condition.notify_all()
+
+
+if __name__ == '__main__':
+    import python_ta
+    python_ta.check_all(config={
+        'extra-imports': ['threading', 'contextlib', 'typing'],
+        'allowed-io': [],
+        # the names (strs) of functions that call print/open/input
+        'max-line-length': 100,
+        'disable': ['E1136']
+    })
@@ -33,10 +33,14 @@ This file is Copyright (c) 2021 Si Yuan Zhao, Hayk Nazaryan, Cliff Zhang, Joanne
 """
 
 import pickle
-from typing import Any
-from spotify_client import Spotify_Client
-from Point import Point
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+from spotify_client import AUDIO_FEATURES_LIMIT, FEATURE_WORKERS, Spotify_Client
+from CentroidTable import CentroidTable, table_from_points
 from post_cluster import Graph_Save
+from GraphOverlay import GraphOverlay
+from ReadWriteLock import ReadWriteLock
+from SongIndex import SongIndex, index_graphs
 
 
 class Recommendation:
@@ -49,6 +53,12 @@ class Recommendation:
         - data: a data object to normalize new song values
         - sp: Spotify API
         - centroid_to_graph: This is a mapping of centroid point to graph object
+        - song_index: This is a mapping of song id to the centroid of the graph containing it
+        - graph_lock: This is held for reading while the graphs are searched, and for writing
+        while new songs are merged into them, so that recommendations running in several
+        threads can share the graphs
+        - centroid_table: This is the table routing the songs that are not in the graphs to
+        the graph with the closest centroid
 
     """
 
@@ -57,106 +67,228 @@ class Recommendation:
     data: Any
     sp: Any
     centroid_to_graph: Any
+    song_index: SongIndex
+    graph_lock: ReadWriteLock
+    centroid_table: CentroidTable
+
+    # Private Instance Attributes:
+    #     - _centroids:
+    #         The centroids of centroid_to_graph, each at the index of its cluster id in
+    #         centroid_table
+    _centroids: list
 
     def __init__(self, playlist_link: str, adventure: int, data: Any, sp: Any,
-                 centroid_to_graph: Any) -> None:
+                 centroid_to_graph: Any, song_index: Optional[SongIndex] = None,
+                 graph_lock: Optional[ReadWriteLock] = None) -> None:
         """
         Initialize the Recommendation class
+        If song_index is None, it is built from every graph of centroid_to_graph.
+        If graph_lock is None, the graphs are not shared with other threads.
+        The centroid table of centroid_to_graph (see graph_file.LazyGraphs) is used if it has
+        one; otherwise one is built from its centroids.
         """
         self.playlist_link = playlist_link
         self.adventure = adventure
         self.data = data
         self.sp = sp
         self.centroid_to_graph = centroid_to_graph
+        self.song_index = index_graphs(centroid_to_graph) if song_index is None else song_index
+        self.graph_lock = ReadWriteLock() if graph_lock is None else graph_lock
+        self._centroids = list(centroid_to_graph)
+        self.centroid_table = getattr(centroid_to_graph, 'centroid_table', None)
+        if self.centroid_table is None:
+            self.centroid_table = table_from_points(self._centroids)
 
     def action(self) -> Any:
         """
         Performs the recommendations as described by the comments
 
+        The steps overlap: features are requested (FEATURE_WORKERS requests at a time) while
+        the rest of the playlist is still arriving. No song of the playlist can be recommended,
+        so the graphs are only searched once every song of the playlist is known; the songs are
+        then matched with graphs and searched as soon as their features arrive, while the
+        features of later songs are still being fetched.
+
+        The graphs are not changed while they are searched: songs that are not in the graphs
+        are added to a GraphOverlay of their graph, and the overlays are merged into the graphs
+        at the end, so other recommendations can search the graphs at the same time. The graph
+        lock is only held while songs are searched, never while waiting for features.
         """
         # Get song ids from input playlist link
         # Get normalized features for each song id
+        # Only songs that are not in the graphs need features (to find their closest graph)
         print('Getting song ids, features; and normalizing features...', end='\r')
-        # song_ids = get_song_ids(self.playlist_link, self.sp)
         spotify_instance = Spotify_Client()
-        song_ids = spotify_instance.get_song_ids(self.playlist_link)
-        song_id_to_features = []
-        for song_id in song_ids:
-            # features = get_features(song_id, self.sp)
-            features = spotify_instance.get_song_features(song_id)
-            normalized_features = self.data.normalize_value(features)
-            song_id_to_features.append([song_id, normalized_features])
-        print('Done getting song ids, features; and normalizing features!\n', end='\r')
+        executor = ThreadPoolExecutor(max_workers=FEATURE_WORKERS)
+        try:
+            song_ids, song_requests = self._request_features(spotify_instance, executor)
+            print('Done getting song ids!\n', end='\r')
+
+            # Match songs with graphs and make recommendations, a few songs at a time:
+            # the songs whose features already arrived are used before waiting for the others
+            print('Matching songs with graphs and making recommendations...', end='\r')
+            playlist_song_ids = set(song_ids)
+            progress = dict()
+            graph_mutate = False
+            matched = set()
+            songs = []
+            for song_id, request in zip(song_ids, song_requests):
+                if song_id in matched:
+                    continue
+                matched.add(song_id)
+                if request is not None and not request.done() and len(songs) > 0:
+                    with self.graph_lock.reading():
+                        graph_mutate |= self._recommend_songs(songs, playlist_song_ids, progress)
+                    songs = []
+                # Waiting for the features of the song is done without the graph lock
+                features = None if request is None else request.result()[song_id]
+                songs.append([song_id, features])
+            with self.graph_lock.reading():
+                graph_mutate |= self._recommend_songs(songs, playlist_song_ids, progress)
+
+                # Handle the fails of each graph
+                for centroid in progress:
+                    overlay, blacklist, recommendations, fails = progress[centroid]
+                    overlay.fill_recommendations(fails, blacklist, recommendations)
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+        # Combine all recommendations
+        all_recommendations = []
+        for centroid in progress:
+            recommendations = progress[centroid][2]
+            all_recommendations.extend(recommendations)
+        print('Done making recommendations!\n', end='\r')
+
+        # If graph(s) mutated: Save the new songs
+        # Unlike before, here graph_mutate means: Graph mutated
+        if graph_mutate:
+            print('Graph(s) were mutated during the recommendation process,', end=' ')
+            print('because the input playlist included song(s) that were not '
+                  'found in the graph file.\n', end='\r')
+            # Merge the new songs of every overlay into its graph, while no other
+            # recommendation is searching the graphs. Another recommendation may have merged new
+            # songs into the graph since the last search: the new songs of the overlay are then
+            # added again over the graph as it is now, so that they get those songs as neighbours.
+            with self.graph_lock.writing():
+                for centroid in progress:
+                    graph = self.centroid_to_graph[centroid]
+                    overlay = progress[centroid][0]
+                    if not overlay.is_on(graph):
+                        overlay = overlay.rebased(graph)
+                    overlay.merge(graph)
+                self._save_new_songs()
+        else:
+            print('Graph(s) were not mutated during the recommendation process,', end=' ')
+            print('because all songs in the input playlist were found in the graph file.\n',
+                  end='\r')
+
+        return all_recommendations
+
+    def _request_features(self, spotify_instance: Spotify_Client,
+                          executor: ThreadPoolExecutor) -> Tuple[List[str], List[Optional[Future]]]:
+        """
+        Read every song id of the playlist, and submit to executor the requests for the
+        normalized features of the songs that are not in the graphs, AUDIO_FEATURES_LIMIT songs
+        per request, as soon as enough songs are read.
+        Return the song ids and, for each of them, the request returning a dictionary of its
+        normalized features (None if the song is in a graph).
+        """
+        song_ids = []
+        song_requests = []
+        requests = []
+        lookups = []
+        for song_id in spotify_instance.iter_song_ids(self.playlist_link):
+            song_ids.append(song_id)
+            if song_id in self.song_index:
+                song_requests.append(None)
+                continue
+            song_requests.append(len(requests))
+            lookups.append(song_id)
+            if len(lookups) == AUDIO_FEATURES_LIMIT:
+                requests.append(executor.submit(_normalized_features, spotify_instance, lookups,
+                                                self.data))
+                lookups = []
+        if len(lookups) > 0:
+            requests.append(executor.submit(_normalized_features, spotify_instance, lookups,
+                                            self.data))
+        return song_ids, [None if i is None else requests[i] for i in song_requests]
+
+    def _recommend_songs(self, songs: List[list], playlist_song_ids: set,
+                         progress: Dict[Any, list]) -> bool:
+        """
+        Match each [song id, normalized features] pair of songs with a graph and search the
+        graphs for them (see Graph.extend_recommendations), adding the songs that are not in a
+        graph to its overlay. progress maps the centroid of every graph searched so far to its
+        [overlay, blacklist, recommendations, fails], which are updated. An overlay whose graph
+        changed since the last call (new songs of another recommendation were merged into it)
+        is rebased on the graph first.
+        Return whether new songs were added to the overlays.
+
+        Preconditions:
+            - playlist_song_ids contains every song of the playlist
+            - self.graph_lock is held for reading
+        """
+        # The graph lock was released since the last call, so other recommendations may have
+        # merged new songs into the graphs under the overlays
+        for centroid in progress:
+            graph = self.centroid_to_graph[centroid]
+            if not progress[centroid][0].is_on(graph):
+                progress[centroid][0] = progress[centroid][0].rebased(graph)
 
         # Match each song with a graph
         # - If the song can be found in Graph_Final.pickle / Graph_Final_Evolve.pickle:
         #       Match song with graph
         # - If the song cannot be found:
         #       Match song with closest graph (by checking distance to graph centroid)
-        #       And mutate Graph (to be saved)
-        print('Matching songs with graphs...', end='\r')
+        #       And add it to the overlay of the graph (to be merged and saved)
+        # Songs that are not in the graphs and have no audio features are skipped
         song_to_centroid = dict()
-        graph_mutate = False
-        for song in song_id_to_features:
+        new_song_positions = dict()
+        for song in songs:
             cur_song_id, cur_song_features = song
-            is_in_dataset = False
-            corresponding_centroid = None
-            for centroid in self.centroid_to_graph:
-                if not is_in_dataset:
-                    cur_graph = self.centroid_to_graph[centroid]
-                    cur_graph_point_ids = [point.id for point in cur_graph.points]
-                    if cur_song_id in cur_graph_point_ids:
-                        is_in_dataset = True
-                        corresponding_centroid = centroid
-            if is_in_dataset:
+            corresponding_centroid = self.song_index.centroid_of(cur_song_id)
+            if corresponding_centroid is not None:
                 # If song in dataset:
                 song_to_centroid[cur_song_id] = corresponding_centroid
-            else:
-                # If song not in dataset, find closest centroid
-                graph_mutate = True     # Here graph_mutate means: Graph will mutate
-                closest_centroid = None
-                closest_centroid_distance = None
-                cur_point = Point(pos=cur_song_features, point_id=cur_song_id)
-                for centroid in self.centroid_to_graph:
-                    distance_to_centroid = cur_point.distance_from(centroid)
-                    if closest_centroid_distance is None or \
-                            distance_to_centroid < closest_centroid_distance:
-                        closest_centroid = centroid
-                        closest_centroid_distance = distance_to_centroid
-                song_to_centroid[cur_song_id] = closest_centroid
-        # Before making recommendations:
+            elif cur_song_features is not None:
+                # If song not in dataset, its closest centroid is found below
+                new_song_positions[cur_song_id] = cur_song_features
+                song_to_centroid[cur_song_id] = None
+        if len(new_song_positions) > 0:
+            # Route every song not in dataset at once
+            # (ties go to the first centroid, like the strict < comparison did)
+            cluster_ids = self.centroid_table.route(list(new_song_positions.values()))
+            for cur_song_id, cluster_id in zip(new_song_positions, cluster_ids.tolist()):
+                song_to_centroid[cur_song_id] = self._centroids[cluster_id]
         # Convert song_to_centroid => centroid_to_songs
-        # to avoid duplicate recommendations
         centroid_to_songs = dict()
         for song in song_to_centroid:
-            corresponding_centroid = song_to_centroid[song]
-            if corresponding_centroid in centroid_to_songs:
-                centroid_to_songs[corresponding_centroid].extend([song])
-            else:
-                centroid_to_songs[corresponding_centroid] = [song]
-        print('Done matching songs with graphs!\n', end='\r')
+            centroid_to_songs.setdefault(song_to_centroid[song], []).append(song)
 
         # For each centroid in centroid_to_songs:
-        # - g = self.centroid_to_graph[centroid]
-        # - songs = centroid_to_songs[centroid]
-        # - Use songs as input to g to make recommendations
-        # Combine all recommendations
-        print('Making recommendations...', end='\r')
-        all_recommendations = []
+        # Use its songs as input to the overlay of its graph, continuing the recommendations
+        # made for the songs before them (the blacklist of every graph holds the whole playlist)
         for centroid in centroid_to_songs:
-            cur_input_songs = centroid_to_songs[centroid]
-            cur_graph = self.centroid_to_graph[centroid]
-            recommendations, fails = cur_graph.recommend(
-                input_song_ids=cur_input_songs, adventure=self.adventure)
-            all_recommendations.extend(recommendations)
-        print('Done making recommendations!\n', end='\r')
+            if centroid not in progress:
+                progress[centroid] = [GraphOverlay(self.centroid_to_graph[centroid]),
+                                      set(playlist_song_ids), [], 0]
+            overlay, blacklist, recommendations, _ = progress[centroid]
+            progress[centroid][3] += overlay.extend_recommendations(
+                centroid_to_songs[centroid], self.adventure, blacklist, recommendations,
+                new_song_positions)
+        return len(new_song_positions) > 0
 
-        # If graph(s) mutated: Save to Graph_Final_Evolve.pickle
-        # Unlike before, here graph_mutate means: Graph mutated
-        if graph_mutate:
-            print('Graph(s) were mutated during the recommendation process,', end=' ')
-            print('because the input playlist included song(s) that were not '
-                  'found in the graph file.\n', end='\r')
+    def _save_new_songs(self) -> None:
+        """
+        Save the songs added to the graphs: they are already in the GraphLog of the graphs, if
+        they have one; otherwise every graph is saved to Graph_Final_Evolve.pickle
+        """
+        graph_log = getattr(self.centroid_to_graph, 'log', None)
+        if graph_log is not None:
+            # Each new song was already appended to the log by GraphOverlay.merge
+            print(f'New songs were saved to {graph_log.path}.')
+        else:
             print('Saving mutated Graphs to Graph_Final_Evolve.pickle...')
             centroid_to_graph_save = dict()
             for centroid in self.centroid_to_graph:
@@ -169,12 +301,74 @@ class Recommendation:
                         protocol=pickle.HIGHEST_PROTOCOL)
             save_file.close()
             print('Done saving mutated Graphs to Graph_Final_Evolve.pickle!')
-        else:
-            print('Graph(s) were not mutated during the recommendation process,', end=' ')
-            print('because all songs in the input playlist were found in the graph file.\n',
-                  end='\r')
 
-        return all_recommendations
+
+def recommend_playlist(playlist_link: str, adventure: int, playlist_name: str, core: dict,
+                       graph_lock: Optional[ReadWriteLock] = None) -> Dict[str, Any]:
+    """
+    Create a new playlist named playlist_name of the songs recommended for the playlist at
+    playlist_link, using the data object, Spotify API, graphs and song index of core (as
+    passed to song_tkinter.UserPlaylistEntry).
+    Return a dictionary with the link of the new playlist ('playlist_link'), the recommended
+    song ids ('recommendations') and the averages of their features ('summary', see
+    playlist_summary).
+    """
+    # The playlist is only created once the recommendations are made, so that no empty playlist
+    # is left if they fail. The averages of the recommended songs are computed while the
+    # playlist is created and the songs are added to it.
+    spotify_instance = Spotify_Client()
+    recommendation = Recommendation(playlist_link, adventure, core['data_obj'], core['sp'],
+                                    core['centroid_to_graph'], core['song_index'], graph_lock)
+    recommended_song_ids = recommendation.action()
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        summarizing = executor.submit(playlist_summary, recommended_song_ids, core['data_obj'])
+        opening = executor.submit(spotify_instance.open_playlist, playlist_name)
+        new_playlist_link, playlist_writer = opening.result()
+        try:
+            playlist_writer.append(recommended_song_ids)
+        finally:
+            playlist_writer.close()
+        summary = summarizing.result()
+    return {'playlist_link': new_playlist_link,
+            'recommendations': recommended_song_ids,
+            'summary': summary}
+
+
+def _normalized_features(spotify_instance: Spotify_Client, song_ids: List[str],
+                         data: Any) -> Dict[str, Optional[List[float]]]:
+    """Helper function for Recommendation._request_features.
+    Return the normalized features of each song of song_ids, mapped from its id."""
+    return dict(zip(song_ids, spotify_instance.get_songs_normalized_features(song_ids, data)))
+
+
+def playlist_summary(song_ids: List[str], data: Any) -> Dict[str, int]:
+    """
+    Return the averages of the normalized features of the songs, in percent, as displayed by
+    song_tkinter.NewPlaylistOutput. Songs without audio features are left out.
+    """
+    aves = [0] * 9      # 9 features
+    num_songs = 0
+    for features in Spotify_Client().get_songs_normalized_features(song_ids, data):
+        if features is None:
+            continue
+        num_songs += 1
+
+        # Removing duration(ms) and key
+        cols_removed_features = features[:3] + features[4:10]
+        for i in range(len(aves)):
+            aves[i] += cols_removed_features[i]
+
+    aves = list(map(lambda ave: round(ave / max(num_songs, 1) * 100), aves))
+
+    return {'Acousticness': aves[0],
+            'Danceability': aves[1],
+            'Energy': aves[2],
+            'Instrumentalness': aves[3],
+            'Valence': aves[4],
+            'Tempo': aves[5],
+            'Liveness': aves[6],
+            'Loudness': aves[7],
+            'Speechiness': aves[8]}
 
 
 if __name__ == '__main__':
@@ -182,9 +376,10 @@ if __name__ == '__main__':
     python_ta.check_all(config={
         'extra-imports': ['pickle', 'tkinter', 'PIL', 'urllib', 'webbrowser',
                           'Recommendation', 'k_means', 'spotipy', 'argparse',
-                          'song_tkinter', 'preprocess', 'post_cluster', 'Point',
-                          'spotify_client'],
-        'allowed-io': ['action'],
+                          'song_tkinter', 'preprocess', 'post_cluster',
+                          'spotify_client', 'SongIndex', 'typing', 'concurrent.futures',
+                          'GraphOverlay', 'ReadWriteLock', 'CentroidTable', 'graph_file'],
+        'allowed-io': ['action', '_save_new_songs'],
         # the names (strs) of functions that call print/open/input
         'max-line-length': 100,
         'disable': ['E1136']
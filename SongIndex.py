@@ -0,0 +1,127 @@
+"""
+CSC111 Final Project: Playlist Generator
+
+Module Description
+==================
+
+This file is dedicated to the class SongIndex, which maps every song id to the centroid of
+the graph that contains the song.
+
+Recommendation uses it to match each song of a playlist with its graph in O(1), instead of
+checking every graph. The index is built once when the graphs are loaded, and it watches the
+graphs so that songs added by Graph.init_new_point are indexed too.
+
+Copyright and Usage Information
+===============================
+
+Permission is hereby granted, free of charge, to any person
+obtaining a copy of this software and associated documentation
+files (the "Software"), to deal in the Software without
+restriction, including without limitation the rights to use,
+copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the
+Software is furnished to do so, subject to the following
+conditions:
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES
+OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY,
+WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+OTHER DEALINGS IN THE SOFTWARE.
+
+This file is Copyright (c) 2021 Si Yuan Zhao, Hayk Nazaryan, Cliff Zhang, Joanne Pan.
+"""
+from __future__ import annotations
+from typing import Any, Iterable, Optional
+from weakref import WeakSet
+from Point import Point
+
+
+class SongIndex:
+    """
+    A mapping of song id to the centroid of the graph that contains the song.
+    If several graphs contain a song, the first graph added wins.
+
+    Instance Attributes:
+        - song_to_centroid: A dictionary mapping a song id to a centroid
+    """
+    song_to_centroid: dict
+
+    # Private Instance Attributes:
+    #     - _watched:
+    #         The graphs whose new points are added to the index. Weak references are used so
+    #         that graphs dropped by graph_file.LazyGraphs can be freed.
+    _watched: WeakSet
+
+    def __init__(self) -> None:
+        """
+        Initialize an empty index
+        """
+        self.song_to_centroid = dict()
+        self._watched = WeakSet()
+
+    def __len__(self) -> int:
+        """
+        Return the number of indexed songs
+        """
+        return len(self.song_to_centroid)
+
+    def __contains__(self, song_id: str) -> bool:
+        """
+        Return whether the song is in a graph
+        """
+        return song_id in self.song_to_centroid
+
+    def centroid_of(self, song_id: str) -> Optional[Point]:
+        """
+        Return the centroid of the graph containing the song, or None if no graph contains it
+        """
+        return self.song_to_centroid.get(song_id)
+
+    def add(self, song_id: str, centroid: Point) -> None:
+        """
+        Record that the graph of centroid contains the song
+        """
+        self.song_to_centroid.setdefault(song_id, centroid)
+
+    def add_graph(self, centroid: Point, song_ids: Iterable[str]) -> None:
+        """
+        Record that the graph of centroid contains every song of song_ids
+        """
+        for song_id in song_ids:
+            self.add(song_id, centroid)
+
+    def watch(self, centroid: Point, graph: Any) -> None:
+        """
+        Add every point that Graph.init_new_point adds to graph (the graph of centroid)
+        to the index. Watching the same graph twice has no effect.
+        """
+        if graph not in self._watched:
+            self._watched.add(graph)
+            graph.new_point_listeners.append(lambda point: self.add(point.id, centroid))
+
+
+def index_graphs(centroid_to_graph: dict) -> SongIndex:
+    """
+    Return a SongIndex of every song of every graph of centroid_to_graph, watching every graph
+    """
+    song_index = SongIndex()
+    for centroid in centroid_to_graph:
+        graph = centroid_to_graph[centroid]
+        song_index.add_graph(centroid, graph.song_ids)
+        song_index.watch(centroid, graph)
+    return song_index
+
+
+if __name__ == '__main__':
+    import python_ta
+    python_ta.check_all(config={
+        'extra-imports': ['typing', 'weakref', 'Point'],
+        'allowed-io': [],
+        # the names (strs) of functions that call print/open/input
+        'max-line-length': 100,
+        'disable': ['E1136']
+    })
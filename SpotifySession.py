@@ -0,0 +1,315 @@
+"""
+CSC111 Final Project: Playlist Generator
+
+Module Description
+==================
+
+This file is dedicated to the class SpotifySession, a long-lived logged in connection to the
+Spotify API.
+
+Creating a spotipy client for every request re-reads the token cache file and opens new
+TCP/TLS connections each time. A SpotifySession is created once and shared by every
+Spotify_Client: it owns one requests.Session whose connections are pooled and reused, keeps
+the access token in memory, and refreshes the token in a background thread before it expires,
+so no request ever waits for a token refresh.
+
+The Spotify API can be replaced by a local stand-in (see fake_spotify.py) by setting the
+SPOTIFY_API_URL environment variable to its address. The token is then only kept in memory
+and refreshed by the stand-in, so that the token cache file of the user is never touched.
+
+Copyright and Usage Information
+===============================
+
+Permission is hereby granted, free of charge, to any person
+obtaining a copy of this software and associated documentation
+files (the "Software"), to deal in the Software without
+restriction, including without limitation the rights to use,
+copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the
+Software is furnished to do so, subject to the following
+conditions:
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES
+OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY,
+WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+OTHER DEALINGS IN THE SOFTWARE.
+
+This file is Copyright (c) 2021 Si Yuan Zhao, Hayk Nazaryan, Cliff Zhang, Joanne Pan.
+"""
+from __future__ import annotations
+import os
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import spotipy
+
+# Address of the Spotify Web API and of its token endpoint; SPOTIFY_API_URL overrides it
+API_URL = 'https://api.spotify.com'
+API_URL_VARIABLE = 'SPOTIFY_API_URL'
+
+# Maximum number of connections kept open to each host
+POOL_SIZE = 10
+
+# Number of seconds before the access token expires at which the background thread refreshes
+# it (spotipy itself only refreshes a token 60 seconds before it expires, during a request)
+REFRESH_MARGIN = 300
+
+# Number of seconds the background thread waits before checking again when there is no token
+# yet (the user has not logged in) or when a refresh failed
+REFRESH_RETRY = 30
+
+# Retries of failed requests, as configured by spotipy for its own sessions
+MAX_RETRIES = 3
+RETRY_BACKOFF = 0.3
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+# The statuses a POST request is retried on: unlike a 5xx error, 429 Too Many Requests tells
+# that the request was not applied, and adding tracks to a playlist twice adds them twice
+POST_RETRY_STATUSES = (429,)
+
+
+class SpotifySession:
+    """
+    A logged in Spotify API client with pooled connections and a token refreshed in the
+    background.
+
+    Instance Attributes:
+        - http: The requests session used for every request, including token requests
+        - auth_manager: The OAuth manager of the session
+        - client: The logged in spotipy client
+        - refresh_margin: How many seconds before expiry the token is refreshed
+        - api_url: The address of the Spotify Web API (or of a stand-in for it)
+
+    Representation Invariants:
+        - self.refresh_margin > 60
+    """
+    http: requests.Session
+    auth_manager: spotipy.oauth2.SpotifyOAuth
+    client: spotipy.Spotify
+    refresh_margin: float
+    api_url: str
+
+    # Private Instance Attributes:
+    #     - _stop:
+    #         Set when the session is closed, to stop the refresher thread
+    #     - _refresher:
+    #         The background thread refreshing the token, or None
+    _stop: threading.Event
+    _refresher: Optional[threading.Thread]
+
+    def __init__(self, client_id: str, client_secret: str, redirect_uri: str, scope: str,
+                 pool_size: int = POOL_SIZE, refresh_margin: float = REFRESH_MARGIN,
+                 refresh_in_background: bool = True, api_url: str = API_URL) -> None:
+        """
+        Initialize a session logged in with the given application credentials and scope.
+        The user is only asked to log in on the first request if no token is cached.
+        Requests go to the Spotify Web API at api_url. If api_url is not the real Spotify Web
+        API, the session starts with an expired token that is refreshed at api_url/api/token.
+
+        Preconditions:
+            - pool_size > 0
+            - refresh_margin > 60
+        """
+        self.api_url = api_url.rstrip('/')
+        self.http = requests.Session()
+        retry = PostSafeRetry(total=MAX_RETRIES, connect=None, read=False,
+                              allowed_methods=frozenset(['GET', 'POST', 'PUT', 'DELETE']),
+                              status=MAX_RETRIES, backoff_factor=RETRY_BACKOFF,
+                              status_forcelist=RETRY_STATUSES)
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size,
+                              max_retries=retry)
+        self.http.mount('http://', adapter)
+        self.http.mount('https://', adapter)
+        if self.api_url == API_URL:
+            cache_handler = MemoryFileCacheHandler()
+        else:
+            cache_handler = MemoryCacheHandler(
+                {'access_token': 'expired', 'refresh_token': 'stand-in', 'token_type': 'Bearer',
+                 'expires_in': 0, 'expires_at': 0, 'scope': scope})
+        self.auth_manager = spotipy.oauth2.SpotifyOAuth(
+            scope=scope, client_id=client_id, client_secret=client_secret,
+            redirect_uri=redirect_uri, requests_session=self.http,
+            cache_handler=cache_handler)
+        self.client = spotipy.Spotify(auth_manager=self.auth_manager, requests_session=self.http)
+        if self.api_url != API_URL:
+            self.client.prefix = self.api_url + '/v1/'
+            self.auth_manager.OAUTH_TOKEN_URL = self.api_url + '/api/token'
+        self.refresh_margin = refresh_margin
+        self._stop = threading.Event()
+        self._refresher = None
+        if refresh_in_background:
+            self._refresher = threading.Thread(target=self._refresh_loop, daemon=True)
+            self._refresher.start()
+
+    def seconds_until_refresh(self) -> Optional[float]:
+        """
+        Return the number of seconds until the token must be refreshed (at most 0 if it must
+        be refreshed now), or None if there is no token yet
+        """
+        token_info = self.auth_manager.cache_handler.get_cached_token()
+        if token_info is None:
+            return None
+        return token_info['expires_at'] - self.refresh_margin - time.time()
+
+    def refresh_if_needed(self) -> bool:
+        """
+        Refresh the token if it expires within self.refresh_margin seconds.
+        Return whether it was refreshed.
+        """
+        token_info = self.auth_manager.cache_handler.get_cached_token()
+        if token_info is None or token_info['expires_at'] - self.refresh_margin > time.time():
+            return False
+        self.auth_manager.refresh_access_token(token_info['refresh_token'])
+        return True
+
+    def _refresh_loop(self) -> None:
+        """
+        Refresh the token shortly before it expires, until the session is closed
+        """
+        while not self._stop.is_set():
+            try:
+                self.refresh_if_needed()
+                remaining = self.seconds_until_refresh()
+            except (requests.RequestException, spotipy.SpotifyException,
+                    spotipy.oauth2.SpotifyOauthError, KeyError):
+                remaining = None
+            if remaining is None or remaining <= 0:
+                remaining = REFRESH_RETRY
+            self._stop.wait(remaining)
+
+    def close(self) -> None:
+        """
+        Stop the refresher thread and close the pooled connections
+        """
+        self._stop.set()
+        if self._refresher is not None:
+            self._refresher.join()
+        self.http.close()
+
+
+class PostSafeRetry(Retry):
+    """
+    The retry configuration of the pooled connections: a POST request is only retried on the
+    POST_RETRY_STATUSES, since it is not idempotent
+    """
+
+    def is_retry(self, method: str, status_code: int, has_retry_after: bool = False) -> bool:
+        """
+        Return whether the request should be retried after the response status_code
+        """
+        if method.upper() == 'POST' and status_code not in POST_RETRY_STATUSES:
+            return False
+        return super().is_retry(method, status_code, has_retry_after)
+
+
+class MemoryCacheHandler(spotipy.cache_handler.CacheHandler):
+    """
+    A token cache kept in memory only, e.g. for a stand-in for the Spotify API
+    """
+    # Private Instance Attributes:
+    #     - _token_info:
+    #         The current token, or None if there is none
+    #     - _lock:
+    #         Protects _token_info from the refresher thread
+    _token_info: Optional[dict]
+    _lock: threading.Lock
+
+    def __init__(self, token_info: Optional[dict] = None) -> None:
+        """
+        Initialize the cache handler with the token token_info
+        """
+        self._token_info = token_info
+        self._lock = threading.Lock()
+
+    def get_cached_token(self) -> Optional[dict]:
+        """
+        Return the current token
+        """
+        with self._lock:
+            return self._token_info
+
+    def save_token_to_cache(self, token_info: dict) -> None:
+        """
+        Make token_info the current token
+        """
+        with self._lock:
+            self._token_info = token_info
+
+
+class MemoryFileCacheHandler(spotipy.cache_handler.CacheFileHandler):
+    """
+    A token cache file that is read only once: the token is kept in memory and every new token
+    is written to both memory and the file (so that later runs stay logged in)
+    """
+    # Private Instance Attributes:
+    #     - _token_info:
+    #         The current token, or None if it has not been read or there is none
+    #     - _lock:
+    #         Protects _token_info from the refresher thread
+    _token_info: Optional[dict]
+    _lock: threading.Lock
+
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        """
+        Initialize the cache handler; the arguments are those of CacheFileHandler
+        """
+        super().__init__(*args, **kwargs)
+        self._token_info = None
+        self._lock = threading.Lock()
+
+    def get_cached_token(self) -> Optional[dict]:
+        """
+        Return the current token, reading the cache file only if there is none in memory
+        """
+        with self._lock:
+            if self._token_info is None:
+                self._token_info = super().get_cached_token()
+            return self._token_info
+
+    def save_token_to_cache(self, token_info: dict) -> None:
+        """
+        Make token_info the current token
+        """
+        with self._lock:
+            self._token_info = token_info
+            super().save_token_to_cache(token_info)
+
+
+# The sessions shared by every Spotify_Client, by credentials and API address
+_SESSIONS: Dict[Tuple[str, str, str, str, str], SpotifySession] = dict()
+_SESSIONS_LOCK = threading.Lock()
+
+
+def shared_session(client_id: str, client_secret: str, redirect_uri: str,
+                   scope: str) -> SpotifySession:
+    """
+    Return the SpotifySession of this process for the given credentials and scope, creating
+    it on the first call. It uses the API at the address in the SPOTIFY_API_URL environment
+    variable if it is set.
+    """
+    api_url = os.environ.get(API_URL_VARIABLE, API_URL)
+    key = (client_id, client_secret, redirect_uri, scope, api_url)
+    with _SESSIONS_LOCK:
+        if key not in _SESSIONS:
+            _SESSIONS[key] = SpotifySession(client_id, client_secret, redirect_uri, scope,
+                                            api_url=api_url)
+        return _SESSIONS[key]
+
+
+if __name__ == '__main__':
+    import python_ta
+    python_ta.check_all(config={
+        'extra-imports': ['os', 'threading', 'time', 'typing', 'requests', 'requests.adapters',
+                          'urllib3.util.retry', 'spotipy'],
+        'allowed-io': [],
+        # the names (strs) of functions that call print/open/input
+        'max-line-length': 100,
+        'disable': ['E1136']
+    })
@@ -0,0 +1,281 @@
+"""
+CSC111 Final Project: Playlist Generator
+
+Module Description
+==================
+
+This file is dedicated to the class FakeSpotify, a local stand-in for the parts of the Spotify
+Web API used by Spotify_Client, so that the recommendation server (see server.py) can be
+tried without a Spotify account or network access.
+
+It serves the items of the playlists it is given, audio features (read from a music data CSV,
+or made up from the song id for songs that are not in it), the current user, playlist creation
+and the addition of songs to playlists, and token refreshes. Every created playlist is kept in
+memory. Point the program at it with the SPOTIFY_API_URL environment variable, e.g.:
+python fake_spotify.py --port=8222 --playlists-file=playlists.json --music-data-file=music.csv
+SPOTIFY_API_URL=http://127.0.0.1:8222 python main.py --graphs-file-name=Graph_Final
+or
+SPOTIFY_API_URL=http://127.0.0.1:8222 python server.py serve --graphs-file-name=Graph_Final
+
+Copyright and Usage Information
+===============================
+
+Permission is hereby granted, free of charge, to any person
+obtaining a copy of this software and associated documentation
+files (the "Software"), to deal in the Software without
+restriction, including without limitation the rights to use,
+copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the
+Software is furnished to do so, subject to the following
+conditions:
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES
+OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY,
+WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+OTHER DEALINGS IN THE SOFTWARE.
+
+This file is Copyright (c) 2021 Si Yuan Zhao, Hayk Nazaryan, Cliff Zhang, Joanne Pan.
+"""
+from __future__ import annotations
+import csv
+import hashlib
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+from urllib.parse import parse_qs, urlparse
+from spotify_client import FEATURE_NAMES
+
+# The id of the user of the stand-in
+USER_ID = 'fake-user'
+
+# Last part of the path of the items of a playlist (spotipy uses either, depending on its version)
+PLAYLIST_ITEMS = ('items', 'tracks')
+
+# Number of seconds a token of the stand-in is valid
+TOKEN_LIFETIME = 3600
+
+
+class FakeSpotify(ThreadingHTTPServer):
+    """
+    A local HTTP server answering like the Spotify Web API.
+
+    Instance Attributes:
+        - playlists: The song ids of every playlist, mapped from the playlist id
+        - features: The audio features of the songs of the music data, mapped from song id
+        - requests: The number of requests answered, by path without its ids
+        - latency: The number of seconds every request waits before it is answered, to
+          imitate the round trip to Spotify
+    """
+    daemon_threads = True
+    playlists: Dict[str, List[str]]
+    features: Dict[str, dict]
+    requests: Dict[str, int]
+    latency: float
+
+    # Private Instance Attributes:
+    #     - _lock:
+    #         Protects playlists and requests from the request threads
+    _lock: threading.Lock
+
+    def __init__(self, playlists: Dict[str, List[str]], features: Optional[Dict[str, dict]] = None,
+                 host: str = '127.0.0.1', port: int = 0, latency: float = 0.0) -> None:
+        """
+        Start listening on host:port (any free port if port is 0) with the given playlists and
+        audio features. Call serve_forever to answer requests.
+        """
+        super().__init__((host, port), FakeSpotifyRequestHandler)
+        self.playlists = {playlist_id: list(song_ids) for playlist_id, song_ids
+                          in playlists.items()}
+        self.features = dict() if features is None else features
+        self.requests = dict()
+        self.latency = latency
+        self._lock = threading.Lock()
+
+    @property
+    def url(self) -> str:
+        """
+        The address to set SPOTIFY_API_URL to
+        """
+        host, port = self.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def count(self, endpoint: str) -> None:
+        """
+        Count a request to endpoint, then wait for self.latency seconds
+        """
+        with self._lock:
+            self.requests[endpoint] = self.requests.get(endpoint, 0) + 1
+        time.sleep(self.latency)
+
+    def song_features(self, song_id: str) -> dict:
+        """
+        Return the audio-features object of the song: from the music data if the song is in it,
+        otherwise made up from the song id (the same every time)
+        """
+        if song_id in self.features:
+            features = dict(self.features[song_id])
+        else:
+            generator = random.Random(hashlib.sha256(song_id.encode('utf-8')).digest())
+            features = {name: generator.random() for name in FEATURE_NAMES}
+            features.update({'duration_ms': generator.randint(60000, 600000),
+                             'tempo': generator.uniform(50.0, 200.0),
+                             'loudness': generator.uniform(-40.0, 0.0),
+                             'key': generator.randint(0, 11)})
+        features.update({'id': song_id, 'type': 'audio_features'})
+        return features
+
+    def create_playlist(self, name: str) -> str:
+        """
+        Create an empty playlist and return its id
+        """
+        with self._lock:
+            playlist_id = f'fake{len(self.playlists):06d}{_slug(name)}'
+            self.playlists[playlist_id] = []
+        return playlist_id
+
+    def add_songs(self, playlist_id: str, uris: List[str]) -> None:
+        """
+        Add the songs of the Spotify URIs (or ids) uris at the end of the playlist
+        """
+        with self._lock:
+            self.playlists[playlist_id].extend(uri.split(':')[-1] for uri in uris)
+
+
+class FakeSpotifyRequestHandler(BaseHTTPRequestHandler):
+    """
+    Answers one connection to a FakeSpotify
+    """
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+    server: FakeSpotify
+
+    def do_GET(self) -> None:
+        """
+        Answer the playlist items, audio features and current user endpoints
+        """
+        url = urlparse(self.path)
+        parts = [part for part in url.path.split('/') if part != '']
+        query = parse_qs(url.query)
+        if parts[:2] == ['v1', 'playlists'] and len(parts) == 4 and parts[3] in PLAYLIST_ITEMS:
+            self.server.count('playlist_items')
+            if parts[2] not in self.server.playlists:
+                self._reply(404, {'error': {'status': 404, 'message': 'Not found.'}})
+                return
+            song_ids = self.server.playlists[parts[2]]
+            offset = int(query.get('offset', ['0'])[0])
+            limit = int(query.get('limit', ['100'])[0])
+            items = [{'is_local': False, 'track': {'id': song_id, 'type': 'track'}}
+                     for song_id in song_ids[offset:offset + limit]]
+            self._reply(200, {'items': items, 'total': len(song_ids)})
+        elif parts[:2] == ['v1', 'audio-features']:
+            self.server.count('audio_features')
+            song_ids = query.get('ids', [''])[0].split(',')
+            self._reply(200, {'audio_features': [self.server.song_features(song_id)
+                                                 for song_id in song_ids]})
+        elif parts == ['v1', 'me']:
+            self.server.count('me')
+            self._reply(200, {'id': USER_ID, 'type': 'user'})
+        else:
+            self._reply(404, {'error': {'status': 404, 'message': 'Service not found'}})
+
+    def do_POST(self) -> None:
+        """
+        Answer the token, playlist creation and playlist addition endpoints
+        """
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        parts = [part for part in urlparse(self.path).path.split('/') if part != '']
+        if parts == ['api', 'token']:
+            self.server.count('token')
+            self._reply(200, {'access_token': 'fake-token', 'token_type': 'Bearer',
+                              'expires_in': TOKEN_LIFETIME, 'refresh_token': 'stand-in',
+                              'scope': 'playlist-modify-public'})
+        elif parts[:2] == ['v1', 'users'] and len(parts) == 4 and parts[3] == 'playlists':
+            self.server.count('playlist_create')
+            playlist_id = self.server.create_playlist(json.loads(body).get('name', ''))
+            self._reply(201, {'id': playlist_id, 'name': json.loads(body).get('name', ''),
+                              'external_urls': {
+                                  'spotify': f'{self.server.url}/playlist/{playlist_id}'}})
+        elif parts[:2] == ['v1', 'playlists'] and len(parts) == 4 and parts[3] in PLAYLIST_ITEMS:
+            self.server.count('playlist_add_items')
+            if parts[2] not in self.server.playlists:
+                self._reply(404, {'error': {'status': 404, 'message': 'Not found.'}})
+                return
+            uris = json.loads(body)
+            if isinstance(uris, dict):
+                uris = uris.get('uris', [])
+            self.server.add_songs(parts[2], uris)
+            self._reply(201, {'snapshot_id': str(len(self.server.playlists[parts[2]]))})
+        else:
+            self._reply(404, {'error': {'status': 404, 'message': 'Service not found'}})
+
+    def log_message(self, *args: Any) -> None:
+        """
+        Do not log every request
+        """
+
+    def _reply(self, status: int, content: Any) -> None:
+        """
+        Send content as a JSON response with the given status
+        """
+        data = json.dumps(content).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def read_music_data(path: str) -> Dict[str, dict]:
+    """
+    Return the audio features of every song of the music data CSV at path, mapped from song id
+    """
+    features = dict()
+    with open(path, newline='') as file:
+        for row in csv.DictReader(file):
+            features[row['id']] = {name: float(row[name]) for name in FEATURE_NAMES}
+    return features
+
+
+def _slug(name: str) -> str:
+    """
+    Return the letters and digits of name, as used in the id of a new playlist
+    """
+    return ''.join(character for character in name if character.isalnum())[:16]
+
+
+if __name__ == '__main__':
+    import python_ta
+    python_ta.check_all(config={
+        'extra-imports': ['csv', 'hashlib', 'json', 'random', 'threading', 'time', 'http.server',
+                          'typing', 'urllib.parse', 'spotify_client', 'argparse'],
+        'allowed-io': ['read_music_data'],
+        # the names (strs) of functions that call print/open/input
+        'max-line-length': 100,
+        'disable': ['E1136']
+    })
+
+    from argparse import ArgumentParser
+
+    arg_parser = ArgumentParser()
+    arg_parser.add_argument('--port', type=int, default=8222)
+    # JSON object mapping each playlist id to the list of its song ids
+    arg_parser.add_argument('--playlists-file', type=str)
+    arg_parser.add_argument('--music-data-file', type=str, default=None)
+    arg_parser.add_argument('--latency-ms', type=float, default=0.0)
+    args = arg_parser.parse_args()
+
+    with open(args.playlists_file) as playlists_file:
+        playlists_json = json.load(playlists_file)
+    music_data = None if args.music_data_file is None else read_music_data(args.music_data_file)
+    fake_spotify = FakeSpotify(playlists_json, music_data, port=args.port,
+                               latency=args.latency_ms / 1000)
+    print(f'Stand-in Spotify API at {fake_spotify.url} '
+          f'(set SPOTIFY_API_URL={fake_spotify.url})')
+    fake_spotify.serve_forever()
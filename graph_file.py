@@ -0,0 +1,637 @@
+"""
+CSC111 Final Project: Playlist Generator
+
+Module Description
+==================
+
+This file is dedicated to the binary graph files that replace the Graph_Save pickles.
+
+Each cluster is saved in its own file, which holds the position matrix, the id table and the
+adjacency of the graph in CSR form (for every point, the rows of its neighbours and the
+distances they are stored under in Point.neighbours). Every array is read with numpy.memmap,
+so loading a graph is near-instant and the pages of the file are only read when touched.
+The neighbours of a point are only turned into a dictionary the first time they are used.
+
+A graphs directory holds one file per cluster plus the table of centroid positions (a
+CentroidTable).
+LazyGraphs maps each centroid to its Graph, but only loads a graph the first time it is
+used, and keeps a bounded number of graphs in memory. New songs are appended to the GraphLog
+of the graphs file and replayed when a graph is loaded; compact_directory and compact_saves fold
+the log back into the graphs file.
+Existing Graph_Final.pickle / Graph_Final_Evolve.pickle files can be converted with:
+python graph_file.py --input-graphs-file-name=Graph_Final.pickle --output-directory=Graph_Final
+
+Copyright and Usage Information
+===============================
+
+Permission is hereby granted, free of charge, to any person
+obtaining a copy of this software and associated documentation
+files (the "Software"), to deal in the Software without
+restriction, including without limitation the rights to use,
+copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the
+Software is furnished to do so, subject to the following
+conditions:
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES
+OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY,
+WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+OTHER DEALINGS IN THE SOFTWARE.
+
+This file is Copyright (c) 2021 Si Yuan Zhao, Hayk Nazaryan, Cliff Zhang, Joanne Pan.
+"""
+from __future__ import annotations
+import os
+import pickle
+import struct
+import threading
+from collections import OrderedDict
+from collections.abc import Mapping
+from typing import Any, Callable, Dict, Iterator, List, Optional
+import numpy as np
+from Point import Point
+from PointStore import PointStore, StoredPoint
+from post_cluster import Graph, Graph_Save
+from Adjacency import Adjacency
+from SongIndex import SongIndex
+from GraphLog import GraphLog, apply_records, log_path
+from CentroidTable import CentroidTable, load_centroid_table, table_from_points
+
+# File header: magic, version, number of points, dimension, number of adjacency entries,
+# epsilon and the width (in bytes) of an id. The header is padded to HEADER_SIZE bytes.
+MAGIC = b'SPGF'
+VERSION = 1
+HEADER_FORMAT = '<4sIQIQdI'
+HEADER_SIZE = 64
+
+# Names of the files in a graphs directory
+CENTROIDS_FILE_NAME = 'centroids.npy'
+CLUSTER_FILE_NAME = 'cluster_{}.graph'
+
+# Rough number of bytes used by every point of a loaded graph (the Point object, its
+# neighbours dictionary and its entries in the Graph dictionaries), used by LazyGraphs
+POINT_BYTES = 1024
+
+# Default memory budget of LazyGraphs, in bytes
+MEMORY_BUDGET = 1024 ** 3
+
+
+class GraphFile:
+    """
+    The memory-mapped arrays of a binary graph file.
+
+    Instance Attributes:
+        - path: The path of the file
+        - epsilon: The epsilon of the graph
+        - positions: A (number of points, dimension) float matrix of the point positions
+        - ids: The point ids, parallel to the rows of positions
+        - indptr: The neighbours of row i are at indices[indptr[i]:indptr[i + 1]]
+        - indices: The rows of the neighbours of every point
+        - distances: The key of each neighbour in Point.neighbours, parallel to indices
+
+    Representation Invariants:
+        - len(self.indptr) == len(self.positions) + 1
+        - len(self.indices) == len(self.distances) == self.indptr[-1]
+    """
+    path: str
+    epsilon: float
+    positions: np.ndarray
+    ids: np.ndarray
+    indptr: np.ndarray
+    indices: np.ndarray
+    distances: np.ndarray
+
+    def __init__(self, path: str) -> None:
+        """
+        Memory-map the binary graph file at path.
+        Raise a ValueError if the file is not a graph file of a supported version.
+        """
+        self.path = path
+        with open(path, 'rb') as file:
+            header = file.read(struct.calcsize(HEADER_FORMAT))
+        magic, version, n, dimension, nnz, epsilon, id_width = \
+            struct.unpack(HEADER_FORMAT, header)
+        if magic != MAGIC:
+            raise ValueError(f'{path} is not a graph file')
+        if version != VERSION:
+            raise ValueError(f'{path} has version {version}, expected version {VERSION}')
+        self.epsilon = epsilon
+
+        offset = HEADER_SIZE
+        sections = []
+        for dtype, shape in [(np.float64, (n, dimension)), (f'S{max(id_width, 1)}', (n,)),
+                             (np.int64, (n + 1,)), (np.int64, (nnz,)), (np.float64, (nnz,))]:
+            sections.append(_map(path, dtype, shape, offset))
+            offset += _padded(int(np.prod(shape)) * np.dtype(dtype).itemsize)
+        self.positions, self.ids, self.indptr, self.indices, self.distances = sections
+
+    def __len__(self) -> int:
+        """
+        Return the number of points in the file
+        """
+        return len(self.positions)
+
+    def neighbours_of(self, row: int, points: List[Point]) -> dict:
+        """
+        Return the neighbours dictionary of the point at the given row, mapping each distance
+        to the corresponding Point of points
+        """
+        start, end = int(self.indptr[row]), int(self.indptr[row + 1])
+        return {distance: points[neighbour_row] for distance, neighbour_row
+                in zip(self.distances[start:end].tolist(), self.indices[start:end].tolist())}
+
+    def to_graph(self) -> Graph:
+        """
+        Return the Graph stored in the file. Its store reads the positions from the file, and
+        the neighbours of each point are read (and sorted, for Graph.bfs) from the file the
+        first time they are used.
+        """
+        store = PointStore(self.positions, np.char.decode(self.ids, 'ascii'))
+        points = []
+        points.extend(LinkedPoint(store, row, self, points) for row in range(len(self)))
+        adjacency = Adjacency(len(self), (self.indptr, self.indices, self.distances))
+        return Graph(points=points, epsilon=self.epsilon, store=store, adjacency=adjacency)
+
+
+class LinkedPoint(StoredPoint):
+    """
+    A StoredPoint whose neighbours are read from a GraphFile the first time they are used.
+
+    Instance Attributes:
+        - graph_file: The GraphFile holding the neighbours of this point
+        - graph_points: The points of the graph, indexed by row
+    """
+    graph_file: GraphFile
+    graph_points: List[Point]
+
+    # Private Instance Attributes:
+    #     - _neighbours:
+    #         The neighbours dictionary, or None until it is read from graph_file.
+    _neighbours: Optional[dict]
+
+    def __init__(self, store: PointStore, row: int, graph_file: GraphFile,
+                 graph_points: List[Point]) -> None:
+        """
+        Initialize a view of the given row, whose neighbours are not read yet
+        """
+        super().__init__(store, row)
+        self.graph_file = graph_file
+        self.graph_points = graph_points
+        self._neighbours = None
+
+    @property
+    def neighbours(self) -> dict:
+        """
+        Dictionary mapping distance to neighbour
+        """
+        if self._neighbours is None:
+            self._neighbours = self.graph_file.neighbours_of(self.row, self.graph_points)
+        return self._neighbours
+
+    @neighbours.setter
+    def neighbours(self, neighbours: dict) -> None:
+        """
+        Replace the neighbours dictionary
+        """
+        self._neighbours = neighbours
+
+
+def save_graph(graph: Graph, path: str) -> None:
+    """
+    Save graph to a binary graph file at path. The file is flushed to disk before save_graph
+    returns.
+
+    Preconditions:
+        - every neighbour of a point in graph.points is in graph.points
+        - every id in graph.song_ids is an ASCII string
+    """
+    row_of = {point.id: row for row, point in enumerate(graph.points)}
+    if len(graph.points) == 0:
+        positions, ids = np.empty((0, 0)), np.empty(0, dtype='S1')
+    else:
+        positions = np.array([point.pos for point in graph.points], dtype=np.float64)
+        ids = np.array([point.id.encode('ascii') for point in graph.points], dtype=bytes)
+    indptr = np.zeros(len(graph.points) + 1, dtype=np.int64)
+    indices, distances = [], []
+    for row, point in enumerate(graph.points):
+        for distance, neighbour in point.neighbours.items():
+            distances.append(distance)
+            indices.append(row_of[neighbour.id])
+        indptr[row + 1] = len(indices)
+
+    header = struct.pack(HEADER_FORMAT, MAGIC, VERSION, positions.shape[0], positions.shape[1],
+                         len(indices), graph.epsilon, ids.dtype.itemsize)
+    with open(path, 'wb') as file:
+        file.write(header.ljust(HEADER_SIZE, b'\0'))
+        for array in [positions, ids, indptr, np.array(indices, dtype=np.int64),
+                      np.array(distances, dtype=np.float64)]:
+            data = array.tobytes()
+            file.write(data.ljust(_padded(len(data)), b'\0'))
+        file.flush()
+        os.fsync(file.fileno())
+
+
+def load_graph(path: str) -> Graph:
+    """
+    Load the Graph saved in the binary graph file at path
+    """
+    return GraphFile(path).to_graph()
+
+
+def save_graphs(centroid_to_graph: Dict[Point, Graph], directory: str) -> None:
+    """
+    Save every graph of centroid_to_graph to its own file in directory, together with the
+    table of centroid positions. The directory is created if it does not exist.
+    """
+    os.makedirs(directory, exist_ok=True)
+    centroids = list(centroid_to_graph)
+    table_from_points(centroids).save(os.path.join(directory, CENTROIDS_FILE_NAME))
+    for i, centroid in enumerate(centroids):
+        cluster_path = os.path.join(directory, CLUSTER_FILE_NAME.format(i))
+        save_graph(centroid_to_graph[centroid], cluster_path)
+
+
+def load_centroids(directory: str) -> List[Point]:
+    """
+    Return the centroids of the graphs directory, in the order of their cluster files
+    """
+    table = load_centroid_table(os.path.join(directory, CENTROIDS_FILE_NAME))
+    return [Point(pos) for pos in table.positions.tolist()]
+
+
+def load_graphs(directory: str) -> Dict[Point, Graph]:
+    """
+    Load every graph of the graphs directory, mapped from its centroid
+    """
+    return {centroid: load_graph(os.path.join(directory, CLUSTER_FILE_NAME.format(i)))
+            for i, centroid in enumerate(load_centroids(directory))}
+
+
+def is_graphs_directory(path: str) -> bool:
+    """
+    Return whether path is a graphs directory (instead of a Graph_Save pickle)
+    """
+    return os.path.isfile(os.path.join(path, CENTROIDS_FILE_NAME))
+
+
+def same_graph(expected: Graph, actual: Graph) -> bool:
+    """
+    Return whether actual has the same epsilon, the same points (in the same order, with the
+    same positions) and the same neighbours (under the same distances) as expected
+    """
+    if expected.epsilon != actual.epsilon or len(expected.points) != len(actual.points):
+        return False
+    for expected_point, actual_point in zip(expected.points, actual.points):
+        if expected_point.id != actual_point.id or \
+                list(expected_point.pos) != list(actual_point.pos):
+            return False
+        expected_neighbours = {distance: neighbour.id for distance, neighbour
+                               in expected_point.neighbours.items()}
+        actual_neighbours = {distance: neighbour.id for distance, neighbour
+                             in actual_point.neighbours.items()}
+        if expected_neighbours != actual_neighbours:
+            return False
+    return True
+
+
+def convert_graph_saves(centroid_to_graph_save: Dict[Point, Graph_Save],
+                        directory: str) -> Dict[Point, Graph]:
+    """
+    Save the graph of every Graph_Save of centroid_to_graph_save (the content of a Graph_Save
+    pickle) to the graphs directory directory, and return the graphs loaded back from it,
+    mapped from their centroids in the same order.
+    Raise a ValueError if a graph does not load back the same as Graph_Save.restore().
+    """
+    restored_graphs = {centroid: centroid_to_graph_save[centroid].restore()
+                       for centroid in centroid_to_graph_save}
+    save_graphs(restored_graphs, directory)
+    loaded_graphs = load_graphs(directory)
+    for i, (restored_graph, loaded_graph) in enumerate(zip(restored_graphs.values(),
+                                                           loaded_graphs.values())):
+        if not same_graph(restored_graph, loaded_graph):
+            raise ValueError(f'Graph {i} does not load back the same from {directory}')
+    return loaded_graphs
+
+
+class LazyGraphs(Mapping):
+    """
+    A mapping of centroid to Graph that only loads a graph the first time it is asked for.
+
+    Loaded graphs are kept from the most to the least recently used. When the estimated size
+    of the loaded graphs exceeds the memory budget, the least recently used graphs are
+    dropped, and loaded again the next time they are asked for. Without a log, mutated graphs
+    are never dropped, so that no new song is lost. With a log, the new points of a graph are
+    appended to the log and replayed over the graph every time it is loaded, so mutated
+    graphs can be dropped too.
+
+    The song index is built from the song ids of every graph (and of the log) when the mapping
+    is created, without loading the graphs, and watches every graph once it is loaded.
+
+    Graphs can be asked for from several threads at the same time (see
+    Recommendation.graph_lock): loading, reordering and dropping graphs is done by one thread
+    at a time.
+
+    Instance Attributes:
+        - memory_budget: The maximum estimated number of bytes of the loaded graphs
+        - song_index: A SongIndex of every song of every graph
+        - log: The log of the new points of the graphs, or None
+        - centroid_table: The CentroidTable of the centroids: the cluster id of a centroid is
+          its index in the order the mapping iterates over them
+
+    Representation Invariants:
+        - self.memory_budget >= 0
+        - len(self.centroid_table) == len(self)
+    """
+    memory_budget: int
+    song_index: SongIndex
+    log: Optional[GraphLog]
+    centroid_table: CentroidTable
+
+    # Private Instance Attributes:
+    #     - _centroids:
+    #         The centroids, in the order the load function expects
+    #     - _centroid_to_index:
+    #         A dictionary mapping each centroid to its index in _centroids
+    #     - _load:
+    #         A function returning the graph of the centroid at the given index
+    #     - _loaded:
+    #         The loaded graphs, mapped from their centroid index, least recently used first
+    #     - _lock:
+    #         Held while _loaded is changed
+    _centroids: List[Point]
+    _centroid_to_index: Dict[Point, int]
+    _load: Callable[[int], Graph]
+    _loaded: OrderedDict
+    _lock: threading.Lock
+
+    def __init__(self, centroids: List[Point], load: Callable[[int], Graph],
+                 load_song_ids: Callable[[int], List[str]],
+                 memory_budget: int = MEMORY_BUDGET, log: Optional[GraphLog] = None,
+                 centroid_table: Optional[CentroidTable] = None) -> None:
+        """
+        Initialize the mapping with no graph loaded. load(i) must return the graph of
+        centroids[i], and load_song_ids(i) the ids of its songs. If centroid_table is None, it
+        is built from centroids.
+
+        Preconditions:
+            - centroid_table is None or row i of centroid_table.positions is centroids[i].pos
+        """
+        self.memory_budget = memory_budget
+        self.log = log
+        self.centroid_table = table_from_points(centroids) if centroid_table is None \
+            else centroid_table
+        self._centroids = centroids
+        self._centroid_to_index = {centroid: i for i, centroid in enumerate(centroids)}
+        self._load = load
+        self._loaded = OrderedDict()
+        self._lock = threading.Lock()
+        self.song_index = SongIndex()
+        for i, centroid in enumerate(centroids):
+            self.song_index.add_graph(centroid, load_song_ids(i))
+            if log is not None:
+                self.song_index.add_graph(centroid, [record['id']
+                                                     for record in log.records_of(i)])
+
+    def __getitem__(self, centroid: Point) -> Graph:
+        """
+        Return the graph of centroid, loading it if needed
+        """
+        i = self._centroid_to_index[centroid]
+        with self._lock:
+            if i in self._loaded:
+                self._loaded.move_to_end(i)
+                return self._loaded[i]
+            graph = self._load(i)
+            if self.log is not None:
+                apply_records(graph, self.log.records_of(i))
+                self.log.watch(i, graph)
+            self._loaded[i] = graph
+            self.song_index.watch(centroid, graph)
+            self._evict()
+            return graph
+
+    def __iter__(self) -> Iterator[Point]:
+        """
+        Iterate over the centroids, without loading any graph
+        """
+        return iter(self._centroids)
+
+    def __len__(self) -> int:
+        """
+        Return the number of centroids
+        """
+        return len(self._centroids)
+
+    def is_loaded(self, centroid: Point) -> bool:
+        """
+        Return whether the graph of centroid is currently loaded
+        """
+        return self._centroid_to_index[centroid] in self._loaded
+
+    def loaded_bytes(self) -> int:
+        """
+        Return the estimated number of bytes used by the loaded graphs
+        """
+        return sum(graph_bytes(graph) for graph in list(self._loaded.values()))
+
+    def _evict(self) -> None:
+        """
+        Drop the least recently used graphs that are not mutated (or any graph, if there is a
+        log) until the loaded graphs fit in the memory budget. The most recently used graph is
+        always kept.
+
+        Preconditions:
+            - self._lock is held
+        """
+        total = self.loaded_bytes()
+        for i in list(self._loaded)[:-1]:
+            if total <= self.memory_budget:
+                return
+            if self.log is not None or not self._loaded[i].mutated:
+                total -= graph_bytes(self._loaded.pop(i))
+
+
+def graph_bytes(graph: Graph) -> int:
+    """
+    Return a rough estimate of the number of bytes used by graph
+    """
+    return len(graph.points) * POINT_BYTES + graph.store.nbytes()
+
+
+def lazy_graphs_from_directory(directory: str, memory_budget: int = MEMORY_BUDGET,
+                               log: Optional[GraphLog] = None) -> LazyGraphs:
+    """
+    Return a LazyGraphs of the graphs directory, whose new points are replayed from and
+    appended to log if it is not None.
+    Only the centroid table and the id table of every graph are read.
+    """
+    table = load_centroid_table(os.path.join(directory, CENTROIDS_FILE_NAME))
+    centroids = [Point(pos) for pos in table.positions.tolist()]
+    paths = [os.path.join(directory, CLUSTER_FILE_NAME.format(i)) for i in range(len(centroids))]
+    return LazyGraphs(centroids,
+                      lambda i: load_graph(paths[i]),
+                      lambda i: np.char.decode(GraphFile(paths[i]).ids, 'ascii').tolist(),
+                      memory_budget, log, table)
+
+
+def lazy_graphs_from_saves(centroid_to_graph_save: Dict[Point, Graph_Save],
+                           memory_budget: int = MEMORY_BUDGET,
+                           log: Optional[GraphLog] = None) -> LazyGraphs:
+    """
+    Return a LazyGraphs of the Graph_Save objects of a Graph_Save pickle, whose new points are
+    replayed from and appended to log if it is not None.
+    Each graph is restored the first time it is used.
+    """
+    centroids = list(centroid_to_graph_save)
+    return LazyGraphs(centroids,
+                      lambda i: centroid_to_graph_save[centroids[i]].restore(),
+                      lambda i: [point_id for _, point_id in
+                                 centroid_to_graph_save[centroids[i]].points],
+                      memory_budget, log)
+
+
+def compact_directory(directory: str, log: GraphLog) -> int:
+    """
+    Fold the records of log into the cluster files of the graphs directory they belong to and
+    remove them from the log. Only the cluster files of graphs with new points are rewritten,
+    each one replaced atomically and flushed to disk before the log is. Return the number of
+    records folded.
+
+    On Windows, a cluster file cannot be replaced while it is memory-mapped (its graph is
+    loaded): the log is then left as it is, its records are still replayed when the graphs are
+    loaded, and they are folded on a later run (replaying a record whose point is already in
+    a cluster file has no effect). 0 is returned.
+    """
+    def fold(records: Dict[int, List[dict]]) -> None:
+        for i in records:
+            path = os.path.join(directory, CLUSTER_FILE_NAME.format(i))
+            graph = load_graph(path)
+            if apply_records(graph, records[i]) > 0:
+                save_graph(graph, path + '.tmp')
+                try:
+                    os.replace(path + '.tmp', path)
+                except PermissionError:
+                    os.remove(path + '.tmp')
+                    raise
+        _fsync_directory(directory)
+
+    try:
+        return log.compact(fold)
+    except PermissionError:
+        return 0
+
+
+def compact_saves(centroid_to_graph_save: Dict[Point, Graph_Save], graphs_file_name: str,
+                  log: GraphLog) -> int:
+    """
+    Fold the records of log into the Graph_Save objects of centroid_to_graph_save (the content
+    of the Graph_Save pickle graphs_file_name), write the pickle again and remove the records
+    from the log. The pickle is replaced atomically. Return the number of records folded.
+    """
+    def fold(records: Dict[int, List[dict]]) -> None:
+        centroids = list(centroid_to_graph_save)
+        for i in records:
+            graph = centroid_to_graph_save[centroids[i]].restore()
+            if apply_records(graph, records[i]) > 0:
+                graph_save = Graph_Save()
+                graph_save.save(graph)
+                centroid_to_graph_save[centroids[i]] = graph_save
+        with open(graphs_file_name + '.tmp', 'wb') as file:
+            pickle.dump(obj=centroid_to_graph_save, file=file, protocol=pickle.HIGHEST_PROTOCOL)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(graphs_file_name + '.tmp', graphs_file_name)
+        _fsync_directory(os.path.dirname(graphs_file_name))
+
+    return log.compact(fold)
+
+
+def open_graphs(graphs_file_name: str, memory_budget: int = MEMORY_BUDGET) -> LazyGraphs:
+    """
+    Return a LazyGraphs of the graphs directory or Graph_Save pickle graphs_file_name, whose new
+    points are replayed from and appended to its GraphLog. If the log has records from earlier
+    runs, they are folded into the graphs file by a daemon thread (every file is replaced
+    atomically, so the program can exit during compaction without losing anything).
+    """
+    graph_log = GraphLog(log_path(graphs_file_name))
+    if is_graphs_directory(graphs_file_name):
+        centroid_to_graph = lazy_graphs_from_directory(graphs_file_name, memory_budget,
+                                                       graph_log)
+        compaction = threading.Thread(target=compact_directory,
+                                      args=(graphs_file_name, graph_log), daemon=True)
+    else:
+        with open(graphs_file_name, 'rb') as graphs_file:
+            centroid_to_graph_save = pickle.load(file=graphs_file)
+        centroid_to_graph = lazy_graphs_from_saves(centroid_to_graph_save, memory_budget,
+                                                   graph_log)
+        compaction = threading.Thread(target=compact_saves,
+                                      args=(centroid_to_graph_save, graphs_file_name,
+                                            graph_log), daemon=True)
+    if len(graph_log) > 0:
+        compaction.start()
+    return centroid_to_graph
+
+
+def _map(path: str, dtype: Any, shape: tuple, offset: int) -> np.ndarray:
+    """
+    Return a read-only memory map of an array of the file, or an empty array if the array
+    has no elements (numpy.memmap cannot map 0 bytes)
+    """
+    if int(np.prod(shape)) == 0:
+        return np.empty(shape, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode='r', offset=offset, shape=shape)
+
+
+def _fsync_directory(directory: str) -> None:
+    """
+    Flush the entries of directory (e.g. a file just replaced in it) to disk. A directory
+    cannot be opened on Windows, so nothing is done there.
+    """
+    if os.name == 'nt':
+        return
+    descriptor = os.open(directory if directory != '' else '.', os.O_RDONLY)
+    try:
+        os.fsync(descriptor)
+    finally:
+        os.close(descriptor)
+
+
+def _padded(size: int) -> int:
+    """
+    Return size rounded up to a multiple of 8, so that every array of the file is aligned
+    """
+    return (size + 7) // 8 * 8
+
+
+if __name__ == '__main__':
+    import python_ta
+    python_ta.check_all(config={
+        'extra-imports': ['os', 'pickle', 'struct', 'threading', 'collections',
+                          'collections.abc', 'typing', 'numpy', 'Point', 'PointStore',
+                          'post_cluster', 'SongIndex', 'GraphLog', 'Adjacency', 'CentroidTable',
+                          'argparse'],
+        'allowed-io': ['GraphFile.__init__', 'save_graph', 'compact_saves', 'open_graphs'],
+        # the names (strs) of functions that call print/open/input
+        'max-line-length': 100,
+        'disable': ['E1136']
+    })
+
+    # Convert a Graph_Save pickle (mapping of centroid to Graph_Save) into a graphs directory,
+    # and check that every converted graph loads back the same as Graph_Save.restore()
+    from argparse import ArgumentParser
+
+    arg_parser = ArgumentParser()
+    arg_parser.add_argument('--input-graphs-file-name', type=str)
+    arg_parser.add_argument('--output-directory', type=str)
+    args = arg_parser.parse_args()
+
+    graphs_file = open(args.input_graphs_file_name, 'rb')
+    centroid_to_graph_save = pickle.load(file=graphs_file)
+    graphs_file.close()
+
+    loaded_graphs = convert_graph_saves(centroid_to_graph_save, args.output_directory)
+    print(f'Converted {len(loaded_graphs)} graphs to {args.output_directory}')
@@ -37,18 +37,44 @@ OTHER DEALINGS IN THE SOFTWARE.
 This file is Copyright (c) 2021 Si Yuan Zhao, Hayk Nazaryan, Cliff Zhang, Joanne Pan.
 """
 from __future__ import annotations
-from typing import List
+from typing import List, Optional
 import random
 import csv
+import hashlib
+import json
+import os
+import time
+import numpy as np
 import matplotlib.pyplot as plt
 from mpl_toolkits.mplot3d import Axes3D
 from Point import Point
+from PointStore import PointStore, pairwise_distances
 
 ATTRIBUTE_TO_INDEX = {'acousticness': 0, 'danceability': 1, 'energy': 2, 'duration(ms)': 3,
                       'instrumentalness': 4, 'valence': 5, 'tempo': 6, 'liveness': 7,
                       'loudness': 8, 'speechiness': 10, 'key': 11}
 COLOR_CHOICES = list(plt.cm.colors.cnames)
 
+# Number of points whose distances to every centroid are computed at once in vectorized mode.
+# Keeps the (block, k) distance matrix small even for large k.
+BLOCK_SIZE = 4096
+
+# Suffixes of the binary cache files that load_store writes next to a dataset: the position
+# matrix, the id array, and the description of the dataset file the cache was made from
+POSITIONS_CACHE_SUFFIX = '.positions.npy'
+IDS_CACHE_SUFFIX = '.ids.npy'
+CACHE_INFO_SUFFIX = '.cache.json'
+
+# Default number of points sampled in each iteration of run_mini_batch
+MINI_BATCH_SIZE = 1024
+
+# Number of sampling rounds of the k-means|| initialization
+PARALLEL_INIT_ROUNDS = 5
+
+# Relative slack added to the distance bounds of run_until_converged, so that rounding errors
+# can never skip a point whose closest centroid changed
+BOUND_SLACK = 1e-9
+
 
 class KMeansAlgo:
     """Object to store data and methods for executing k-means algorithm. Specifically,
@@ -59,46 +85,298 @@ class KMeansAlgo:
         - data: A list of Point objects that are used in the algorithm to form clusters
         - centroids: A list of Point objects that describe the centers of the cluster
         - cluster: A dictionary mapping a centroid to a list of Points in that cluster
+        - vectorized: Whether iterations run on the positions matrix instead of Point objects
+        - store: A PointStore holding the position and id of every data point
+        - positions: A float matrix where row i is the position of self.data[i]
+        - labels: In vectorized mode, the index (into self.clusters) of the cluster of each point
+        - iteration_stats: One dictionary of statistics per iteration of run_until_converged
 
     Representation Invariants:
         - self.k > 0
         - len(self.centroids) > 0
+        - len(self.store) == len(self.data)
     """
 
-    data: list
     centroids: list
-    clusters: dict
-
-    def __init__(self, path: str, k: int) -> None:
-        """Initializes the k_means object with k number of centroids that are picked randomly
+    vectorized: bool
+    store: PointStore
+    labels: Optional[np.ndarray]
+    iteration_stats: List[dict]
+
+    # Private Instance Attributes:
+    #     - _data:
+    #         The StoredPoint views of every row of self.store, or None until self.data is used.
+    #         Vectorized iterations never need them.
+    #     - _clusters:
+    #         The clusters, or None if they need to be rebuilt from self.labels.
+    #     - _labelled_centroids:
+    #         The distinct centroids that self.labels indexes into.
+    #     - _upper, _lower:
+    #         Hamerly bounds kept by run_until_converged: an upper bound on the distance from
+    #         each point to its centroid, and a lower bound on the distance to any other
+    #         centroid. None whenever the labels were computed without updating them.
+    _data: Optional[list]
+    _clusters: Optional[dict]
+    _labelled_centroids: list
+    _upper: Optional[np.ndarray]
+    _lower: Optional[np.ndarray]
+
+    def __init__(self, path: str, k: int, vectorized: bool = True, init: str = 'random',
+                 seed: Optional[int] = None) -> None:
+        """Initializes the k_means object with k number of centroids that are picked
         from the data points. The initialization also does the first round of clustering based
         on those centroids.
 
+        The centroids are picked according to init:
+            - 'random': k points picked uniformly at random (the same point can be picked twice)
+            - 'k-means++': each centroid is picked with probability proportional to its
+              squared distance to the closest centroid picked so far
+            - 'k-means||': a few rounds sample many candidates at once, and the k centroids
+              are picked among them with k-means++, weighting each candidate by the number
+              of points closest to it
+        If seed is not None, the centroids picked are the same every time.
+
+        If vectorized is True, every iteration works on a single float matrix holding all the
+        positions. This produces exactly the same clusters as the Point based iteration.
+
         Preconditions:
             - k > 0
             - path contains a file that is formatted correctly for the load_path function
+            - init in {'random', 'k-means++', 'k-means||'}
         """
-        self.data = initialize_data(load_path(path))
-        self.centroids = [random.choice(self.data) for _ in range(k)]
-        self.clusters = self.update_clusters()
-
-    def run_n_times(self, n: int) -> None:
+        self.store = load_store(path)
+        self.vectorized = vectorized
+        self.labels = None
+        self._data = None
+        self._clusters = None
+        self._labelled_centroids = []
+        self._upper, self._lower = None, None
+        self.iteration_stats = []
+        if init == 'random':
+            rand = random if seed is None else random.Random(seed)
+            rows = [rand.randrange(len(self.store)) for _ in range(k)]
+        elif init == 'k-means++':
+            rows = k_means_plus_plus(self.positions, k, np.random.default_rng(seed))
+        else:
+            rows = k_means_parallel(self.positions, k, np.random.default_rng(seed))
+        self.centroids = [self.store.point(int(row)) for row in rows]
+        self._assign_points()
+
+    @property
+    def data(self) -> list:
+        """A list of Point objects (views of self.store) that are used in the algorithm"""
+        if self._data is None:
+            self._data = self.store.points()
+        return self._data
+
+    @property
+    def positions(self) -> np.ndarray:
+        """A float matrix where row i is the position of self.data[i]"""
+        return self.store.positions
+
+    @property
+    def clusters(self) -> dict:
+        """A dictionary mapping a centroid to a list of Points in that cluster"""
+        if self._clusters is None:
+            self._clusters = {centroid: self.store.points(rows)
+                              for centroid, rows in self.cluster_rows().items()}
+        return self._clusters
+
+    @clusters.setter
+    def clusters(self, clusters: dict) -> None:
+        """Replace the clusters"""
+        self._clusters = clusters
+
+    def run_n_times(self, n: int) -> List[float]:
         """Run the k_means algorithm n times. Function will not run if n <= 0.
+        Prints and returns the time (in seconds) taken by each iteration.
         """
-        for _ in range(n):
+        times = []
+        for i in range(n):
+            start = time.perf_counter()
             self.run_once()
+            times.append(time.perf_counter() - start)
+            print(f'Iteration {i + 1} / {n}: {round(times[-1], 3)}s')
+        return times
+
+    def run_mini_batch(self, n: int, batch_size: int = MINI_BATCH_SIZE,
+                       seed: Optional[int] = None) -> List[float]:
+        """Run n iterations of mini-batch k-means, then assign every point to its closest
+        centroid. Prints the total time taken and returns the time (in seconds) taken by each
+        iteration, including the final assignment pass.
+
+        Each iteration samples batch_size points (without replacement) and moves every
+        centroid towards the average of its sampled points. The learning rate of a centroid is
+        1 / (number of points it has been assigned so far), so each centroid is the running
+        average of all the points it was assigned in previous batches. Centroids that were
+        never assigned a point stay where they are.
+
+        Preconditions:
+            - batch_size > 0
+        """
+        rng = np.random.default_rng(seed)
+        batch_size = min(batch_size, len(self.store))
+        centroid_matrix = np.array([centroid.pos for centroid in dict.fromkeys(self.centroids)],
+                                   dtype=float)
+        seen = np.zeros(len(centroid_matrix))
+        times = []
+        for _ in range(n):
+            start = time.perf_counter()
+            batch = self.positions[rng.choice(len(self.store), batch_size, replace=False)]
+            batch_labels = assign_labels(batch, centroid_matrix)
+            sums, counts = sum_by_label(batch, batch_labels, len(centroid_matrix))
+            seen += counts
+            moved = counts > 0
+            centroid_matrix[moved] += (sums[moved] - counts[moved, None] *
+                                       centroid_matrix[moved]) / seen[moved, None]
+            times.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        self.centroids = [Point(pos) for pos in centroid_matrix.tolist()]
+        self._assign_points()
+        times.append(time.perf_counter() - start)
+        print(f'Mini-batch: {n} iterations of {batch_size} points: {round(sum(times), 3)}s')
+        return times
+
+    def run_until_converged(self, max_iterations: int = 100, shift_tolerance: float = 0.0,
+                            label_tolerance: int = 0,
+                            inertia_tolerance: float = 0.0) -> List[dict]:
+        """Run the k-means algorithm until it converges, or for max_iterations iterations.
+        The algorithm has converged as soon as one iteration:
+            - moves every centroid by at most shift_tolerance, or
+            - changes the cluster of at most label_tolerance points, or
+            - lowers the inertia by at most inertia_tolerance times the previous inertia.
+        With the default tolerances, it stops when the clusters no longer change.
+
+        Each iteration produces exactly the same clusters as run_once, but uses Hamerly's
+        triangle inequality bounds to skip the distances to every centroid for the points that
+        cannot change cluster. Statistics of every iteration are printed, appended to
+        self.iteration_stats and returned, as dictionaries with the keys:
+            - 'time': the time (in seconds) taken by the iteration
+            - 'inertia': the inertia after the iteration
+            - 'label_changes': the number of points that changed cluster
+            - 'max_shift': the largest distance that a centroid moved
+            - 'skipped_ratio': the fraction of the (points x centroids) distances skipped
+
+        Preconditions:
+            - self.vectorized
+            - max_iterations >= 0
+        """
+        stats = []
+        previous_inertia = self.inertia()
+        for i in range(max_iterations):
+            start = time.perf_counter()
+            old_matrix = np.array([centroid.pos for centroid in self._labelled_centroids],
+                                  dtype=float)
+            # Every new centroid is a distinct object, so they keep the indices of self.labels
+            new_centroids = self._find_new_centroids_vectorized()
+            new_matrix = np.array([centroid.pos for centroid in new_centroids], dtype=float)
+            deltas = new_matrix - old_matrix
+            shifts = np.sqrt((deltas * deltas).sum(axis=1))
+
+            old_labels = self.labels
+            computed = self._label_points_with_bounds(new_matrix, shifts)
+            self.centroids = new_centroids
+            self._labelled_centroids = list(new_centroids)
+            self._clusters = None
+
+            inertia = self.inertia()
+            iteration = {'time': time.perf_counter() - start,
+                         'inertia': inertia,
+                         'label_changes': int((self.labels != old_labels).sum()),
+                         'max_shift': float(shifts.max()),
+                         'skipped_ratio': 1 - computed / (len(self.store) * len(new_matrix))}
+            stats.append(iteration)
+            self.iteration_stats.append(iteration)
+            print(f'Iteration {i + 1}: {round(iteration["time"], 3)}s, '
+                  f'inertia {round(inertia, 3)}, {iteration["label_changes"]} changes, '
+                  f'{round(100 * iteration["skipped_ratio"], 1)}% distances skipped')
+
+            if iteration['max_shift'] <= shift_tolerance or \
+                    iteration['label_changes'] <= label_tolerance or \
+                    previous_inertia - inertia <= inertia_tolerance * previous_inertia:
+                break
+            previous_inertia = inertia
+        return stats
+
+    def _label_points_with_bounds(self, centroids: np.ndarray, shifts: np.ndarray) -> int:
+        """Label every row of self.positions with the index of its closest row of centroids,
+        given that row j of centroids moved by shifts[j] since the last labelling. The labels
+        are exactly those assign_labels would give. Returns the number of point to centroid
+        distances that were computed."""
+        n, k = len(self.store), len(centroids)
+        if self._upper is None:
+            self.labels, self._upper, self._lower = two_closest(self.positions, centroids)
+            return n * k
+
+        # Moving the centroids loosens the bounds by at most the distance they moved
+        upper = self._upper + shifts[self.labels]
+        if k > 1:
+            largest, second = np.argsort(shifts)[::-1][:2]
+            lower = self._lower - np.where(self.labels == largest, shifts[second],
+                                           shifts[largest])
+            # A point closer to its centroid than half the distance to the closest other
+            # centroid cannot change cluster either
+            centroid_distances = pairwise_distances(centroids, centroids)
+            np.fill_diagonal(centroid_distances, np.inf)
+            bound = np.maximum(lower, centroid_distances.min(axis=1)[self.labels] / 2)
+        else:
+            lower = self._lower
+            bound = lower
+        computed = k * k
+
+        # Tighten the upper bound of the points that might change cluster
+        candidates = np.flatnonzero(upper + BOUND_SLACK * np.maximum(upper, 1) >= bound)
+        deltas = self.positions[candidates] - centroids[self.labels[candidates]]
+        upper[candidates] = np.sqrt((deltas * deltas).sum(axis=1))
+        computed += len(candidates)
+
+        # Compute every distance for the points that still might change cluster
+        slack = BOUND_SLACK * np.maximum(upper[candidates], 1)
+        candidates = candidates[upper[candidates] + slack >= bound[candidates]]
+        labels = self.labels.copy()
+        labels[candidates], upper[candidates], lower[candidates] = \
+            two_closest(self.positions[candidates], centroids)
+        computed += len(candidates) * k
+
+        self.labels, self._upper, self._lower = labels, upper, lower
+        return computed
+
+    def inertia(self) -> float:
+        """Return the sum of the squared distances from every point to the centroid of
+        its cluster"""
+        if self.vectorized:
+            centroid_matrix = np.array([centroid.pos for centroid in self._labelled_centroids],
+                                       dtype=float)
+            deltas = self.positions - centroid_matrix[self.labels]
+            return float((deltas * deltas).sum())
+
+        return sum(point.distance_from(centroid) ** 2
+                   for centroid, points in self.clusters.items() for point in points)
 
     def run_once(self) -> None:
         """Runs the k-means algorithm once. The algorithm first finds the new centers of the
         clusters and then updates the clusters themselves. The function stores the new clusters
         in it's attributes."""
         self.centroids = self.find_new_centroids()
-        self.clusters = self.update_clusters()
+        self._assign_points()
+
+    def _assign_points(self) -> None:
+        """Assign every point to the cluster of its closest centroid. In vectorized mode only
+        self.labels is updated, and self.clusters is rebuilt the next time it is used."""
+        if self.vectorized:
+            self.label_points()
+        else:
+            self.clusters = self.update_clusters()
 
     def update_clusters(self) -> dict:
         """Sorts every point in self.data into a cluster based on the centroid that the point
         is closest to. Returns a dictionary mapping each centroid to a list of points which
         represents the clusters."""
+        if self.vectorized:
+            self.label_points()
+            return self.clusters
+
         # initialize a dictionary mapping each current centroid to a empty list
         clusters = dict((key, []) for key in self.centroids)
 
@@ -121,9 +399,37 @@ class KMeansAlgo:
 
         return clusters
 
+    def label_points(self) -> None:
+        """Vectorized version of update_clusters. Labels every row of self.positions with the
+        index of its closest centroid."""
+        # Duplicate centroids collapse into a single cluster, exactly like the dictionary keys
+        # in update_clusters. The first occurrence wins ties in both versions.
+        self._labelled_centroids = list(dict.fromkeys(self.centroids))
+        centroid_matrix = np.array([centroid.pos for centroid in self._labelled_centroids],
+                                   dtype=float)
+        self.labels = assign_labels(self.positions, centroid_matrix)
+        self._clusters = None
+        self._upper, self._lower = None, None
+
+    def cluster_rows(self) -> dict:
+        """Returns a dictionary mapping each centroid to an array of the rows (in self.store)
+        of the points in its cluster, in the same order as self.clusters."""
+        if not self.vectorized:
+            return {centroid: np.array([point.row for point in points], dtype=np.intp)
+                    for centroid, points in self.clusters.items()}
+
+        # A stable sort keeps the rows of each cluster in increasing order
+        centroids = self._labelled_centroids
+        order = np.argsort(self.labels, kind='stable')
+        bounds = np.searchsorted(self.labels[order], np.arange(len(centroids) + 1))
+        return {centroids[i]: order[bounds[i]:bounds[i + 1]] for i in range(len(centroids))}
+
     def find_new_centroids(self) -> List[Point]:
         """Returns the new centroids for each cluster based on the average of the attributes of the
         points in each cluster. The new centroids are returned as a list of Point objects"""
+        if self.vectorized:
+            return self._find_new_centroids_vectorized()
+
         new_centroids = []
 
         # Iterate through the clusters and update each center
@@ -136,6 +442,16 @@ class KMeansAlgo:
         # returns a list of the new centroids which will be used to update the clusters
         return new_centroids
 
+    def _find_new_centroids_vectorized(self) -> List[Point]:
+        """Vectorized version of find_new_centroids. The averages are computed from
+        self.labels with one bincount per dimension instead of calling _update_centroid."""
+        old_centroids = self._labelled_centroids
+        means, counts = mean_by_label(self.positions, self.labels, len(old_centroids))
+
+        # Empty clusters keep their original centroid, like _update_centroid
+        return [Point(means[i].tolist()) if counts[i] > 0 else old_centroids[i]
+                for i in range(len(old_centroids))]
+
     def print_cluster_len(self) -> None:
         """Print the lengths of each cluster in self.cluster"""
         for cluster in self.clusters:
@@ -322,6 +638,168 @@ def _update_centroid(centroid: Point, points: list) -> Point:
         return Point(new_pos)
 
 
+def assign_labels(positions: np.ndarray, centroids: np.ndarray,
+                  block_size: int = BLOCK_SIZE) -> np.ndarray:
+    """Return the index of the closest centroid for every row of positions. The distances are
+    computed block_size rows at a time. Ties go to the centroid with the smallest index.
+
+    Preconditions:
+        - block_size > 0
+        - len(centroids) > 0
+    """
+    labels = np.empty(positions.shape[0], dtype=np.intp)
+    for start in range(0, positions.shape[0], block_size):
+        block = positions[start:start + block_size]
+        labels[start:start + block_size] = pairwise_distances(block, centroids).argmin(axis=1)
+    return labels
+
+
+def two_closest(positions: np.ndarray, centroids: np.ndarray,
+                block_size: int = BLOCK_SIZE) -> tuple:
+    """Return the index of the closest centroid for every row of positions (exactly like
+    assign_labels), the distance to that centroid and the distance to the second closest
+    centroid (infinity if there is only one centroid).
+
+    Preconditions:
+        - block_size > 0
+        - len(centroids) > 0
+    """
+    labels = np.empty(positions.shape[0], dtype=np.intp)
+    first = np.empty(positions.shape[0])
+    second = np.full(positions.shape[0], np.inf)
+    for start in range(0, positions.shape[0], block_size):
+        distances = pairwise_distances(positions[start:start + block_size], centroids)
+        block_labels = distances.argmin(axis=1)
+        block_rows = np.arange(len(distances))
+        labels[start:start + block_size] = block_labels
+        first[start:start + block_size] = distances[block_rows, block_labels]
+        if len(centroids) > 1:
+            distances[block_rows, block_labels] = np.inf
+            second[start:start + block_size] = distances.min(axis=1)
+    return labels, first, second
+
+
+def mean_by_label(positions: np.ndarray, labels: np.ndarray, k: int) -> tuple:
+    """Return a (k, dimension) matrix of the average position of the rows with each label,
+    together with the number of rows with each label. Rows of labels with no points are 0.
+
+    The sums are accumulated in row order by bincount, so each average is exactly equal to
+    the one computed by _update_centroid.
+    """
+    sums, counts = sum_by_label(positions, labels, k)
+    means = np.zeros((k, positions.shape[1]))
+    non_empty = counts > 0
+    means[non_empty] = sums[non_empty] / counts[non_empty, None]
+    return means, counts
+
+
+def sum_by_label(positions: np.ndarray, labels: np.ndarray, k: int) -> tuple:
+    """Return a (k, dimension) matrix of the sum of the rows with each label, together with
+    the number of rows with each label. The sums are accumulated in row order.
+    """
+    counts = np.bincount(labels, minlength=k)
+    sums = np.zeros((k, positions.shape[1]))
+    for i in range(positions.shape[1]):
+        sums[:, i] = np.bincount(labels, weights=positions[:, i], minlength=k)
+    return sums, counts
+
+
+def k_means_plus_plus(positions: np.ndarray, k: int, rng: np.random.Generator,
+                      weights: Optional[np.ndarray] = None) -> np.ndarray:
+    """Return the rows of k distinct positions picked with k-means++ seeding: the first row
+    is picked at random, then each row is picked with probability proportional to its weight
+    times its squared distance to the closest row picked so far. Every weight is 1 if weights
+    is None. Returns fewer than k rows if there are fewer than k distinct positions.
+
+    Preconditions:
+        - k > 0
+        - len(positions) > 0
+        - weights is None or (len(weights) == len(positions) and all(weights > 0))
+    """
+    if weights is None:
+        weights = np.ones(len(positions))
+    rows = [int(rng.choice(len(positions), p=weights / weights.sum()))]
+    closest = squared_distances(positions, positions[rows[0]])
+    for _ in range(k - 1):
+        scores = weights * closest
+        total = scores.sum()
+        if total <= 0:
+            break
+        row = int(rng.choice(len(positions), p=scores / total))
+        rows.append(row)
+        np.minimum(closest, squared_distances(positions, positions[row]), out=closest)
+    return np.array(rows, dtype=np.intp)
+
+
+def k_means_parallel(positions: np.ndarray, k: int, rng: np.random.Generator,
+                     rounds: int = PARALLEL_INIT_ROUNDS) -> np.ndarray:
+    """Return the rows of k distinct positions picked with k-means|| seeding.
+
+    Starting from one random row, each of the rounds samples every row independently with
+    probability 2k * (squared distance to the closest candidate) / (sum of those distances),
+    so about 2k candidates are added per round. The candidates are then weighted by the number
+    of positions closest to them, and k of them are picked with weighted k-means++. Returns
+    fewer than k rows if there are fewer than k distinct positions.
+
+    Preconditions:
+        - k > 0
+        - len(positions) > 0
+        - rounds >= 0
+    """
+    candidates = [int(rng.integers(len(positions)))]
+    closest = squared_distances(positions, positions[candidates[0]])
+    for _ in range(rounds):
+        total = closest.sum()
+        if total <= 0:
+            break
+        sampled = np.flatnonzero(rng.random(len(positions)) < 2 * k * closest / total)
+        candidates.extend(sampled.tolist())
+        if len(sampled) > 0:
+            np.minimum(closest, closest_squared_distances(positions, positions[sampled])[0],
+                       out=closest)
+
+    candidates = np.array(candidates, dtype=np.intp)
+    # Rows at the same position can be sampled in the same round; only the first one is kept
+    first = np.unique(positions[candidates], axis=0, return_index=True)[1]
+    candidates = candidates[np.sort(first)]
+    if len(candidates) <= k:
+        return candidates
+    labels = closest_squared_distances(positions, positions[candidates])[1]
+    weights = np.bincount(labels, minlength=len(candidates)).astype(float)
+    # Candidates closest to no position (duplicates) can never be picked
+    candidates, weights = candidates[weights > 0], weights[weights > 0]
+    return candidates[k_means_plus_plus(positions[candidates], k, rng, weights)]
+
+
+def squared_distances(positions: np.ndarray, pos: np.ndarray) -> np.ndarray:
+    """Return the squared distance from every row of positions to pos"""
+    deltas = positions - pos
+    return np.einsum('ij,ij->i', deltas, deltas)
+
+
+def closest_squared_distances(positions: np.ndarray, others: np.ndarray,
+                              block_size: int = BLOCK_SIZE) -> tuple:
+    """Return the squared distance from every row of positions to the closest row of others,
+    together with the index of that row. The distances are computed block_size rows at a time
+    with a matrix product, which is much faster than pairwise_distances but can differ from
+    the exact distances by rounding errors, so this is only used for seeding.
+
+    Preconditions:
+        - block_size > 0
+        - len(others) > 0
+    """
+    squared_result = np.empty(len(positions))
+    labels = np.empty(len(positions), dtype=np.intp)
+    others_norms = np.einsum('ij,ij->i', others, others)
+    for start in range(0, len(positions), block_size):
+        block = positions[start:start + block_size]
+        block_norms = np.einsum('ij,ij->i', block, block)
+        squared = block_norms[:, None] + others_norms[None, :] - 2 * (block @ others.T)
+        labels[start:start + block_size] = squared.argmin(axis=1)
+        squared_result[start:start + block_size] = np.maximum(squared.min(axis=1), 0)
+    return squared_result, labels
+
+
 def load_path(path: str) -> List[List]:
     """Loads the .csv file at path. This function assumes that the first column represents the id
     of the song and the rest of the columns represent the position values. The function
@@ -333,19 +811,97 @@ def load_path(path: str) -> List[List]:
             [acousticness, danceability, energy, duration_ms, instrumentalness, valence, tempo,
             loudness, speechiness, key]
     """
-    file = csv.reader(open(path))
-    next(file)
     accumulator = []
+    with open(path) as csv_file:
+        file = csv.reader(csv_file)
+        next(file)
 
-    for line in file:
-        entry = list()
-        entry.append(line[0])
-        entry.extend([float(val) for val in line[1:]])
-        accumulator.append(entry)
+        for line in file:
+            entry = list()
+            entry.append(line[0])
+            entry.extend([float(val) for val in line[1:]])
+            accumulator.append(entry)
 
     return accumulator
 
 
+def load_store(path: str) -> PointStore:
+    """Return a PointStore of the .csv file at path, with the same rows as
+    store_from_rows(load_path(path)).
+
+    The first call converts the file into a binary cache next to it (path + POSITIONS_CACHE_SUFFIX
+    and path + IDS_CACHE_SUFFIX); later calls memory-map the cache instead of parsing the file.
+    The cache is rebuilt whenever the file changes: if its size or modification time differ
+    from when the cache was made, and its SHA-256 hash too.
+
+    Preconditions:
+        - path contains a file that is formatted correctly for the load_path function
+    """
+    positions_path, ids_path = path + POSITIONS_CACHE_SUFFIX, path + IDS_CACHE_SUFFIX
+    if not _dataset_cache_is_valid(path):
+        info = _file_info(path)
+        rows = load_path(path)
+        if len(rows) == 0:
+            positions, ids = np.empty((0, 0)), np.empty(0, dtype=str)
+        else:
+            positions = np.array([line[1:] for line in rows], dtype=float)
+            ids = np.array([line[0] for line in rows], dtype=str)
+        for array, array_path in [(positions, positions_path), (ids, ids_path)]:
+            temporary_path = f'{array_path}.{os.getpid()}.tmp'
+            with open(temporary_path, 'wb') as file:
+                np.save(file, array)
+            os.replace(temporary_path, array_path)
+        _write_cache_info(path, info)
+    ids = np.load(ids_path, mmap_mode='r')
+    return PointStore(np.load(positions_path, mmap_mode='r'), ids.tolist())
+
+
+def _file_info(path: str, sha256: Optional[str] = None) -> dict:
+    """Helper function for load_store.
+    Return the size, modification time and SHA-256 hash (computed if sha256 is None) of the file
+    at path."""
+    if sha256 is None:
+        digest = hashlib.sha256()
+        with open(path, 'rb') as file:
+            for block in iter(lambda: file.read(1 << 20), b''):
+                digest.update(block)
+        sha256 = digest.hexdigest()
+    stat = os.stat(path)
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'sha256': sha256}
+
+
+def _write_cache_info(path: str, info: dict) -> None:
+    """Helper function for load_store.
+    Record that the cache of the file at path was made from the file described by info."""
+    temporary_path = f'{path}{CACHE_INFO_SUFFIX}.{os.getpid()}.tmp'
+    with open(temporary_path, 'w') as file:
+        json.dump(info, file)
+    os.replace(temporary_path, path + CACHE_INFO_SUFFIX)
+
+
+def _dataset_cache_is_valid(path: str) -> bool:
+    """Helper function for load_store.
+    Return whether the binary cache of the file at path exists and was made from the file as
+    it is now. If only the modification time of the file changed, the cache is still valid and
+    its recorded modification time is updated."""
+    cache_paths = [path + suffix for suffix in
+                   [POSITIONS_CACHE_SUFFIX, IDS_CACHE_SUFFIX, CACHE_INFO_SUFFIX]]
+    if not all(os.path.exists(cache_path) for cache_path in cache_paths):
+        return False
+    with open(path + CACHE_INFO_SUFFIX) as file:
+        info = json.load(file)
+    stat = os.stat(path)
+    if stat.st_size != info['size']:
+        return False
+    if stat.st_mtime_ns == info['mtime_ns']:
+        return True
+    current = _file_info(path)
+    if current['sha256'] != info['sha256']:
+        return False
+    _write_cache_info(path, current)
+    return True
+
+
 def initialize_data(data: List[List]) -> List[Point]:
     """Given a list of lists in the appropriate format, returns a list of Point objects.
 
@@ -360,9 +916,13 @@ if __name__ == "__main__":
     import python_ta
     python_ta.check_all(config={
         'extra-imports': ['__future', 'typing', 'matplotlib.pyplot', 'mpl_toolkits.mplot3d',
-                          'Point', 'random', 'csv'],  # the names (strs) of imported modules
-        'allowed-io': ['print_cluster_len', 'load_path'],  # the names (strs) of functions that
-        # call print/open/input
+                          'Point', 'PointStore', 'random', 'csv', 'time', 'numpy', 'hashlib',
+                          'json', 'os'],
+        # the names (strs) of imported modules
+        'allowed-io': ['print_cluster_len', 'load_path', 'run_n_times', 'run_mini_batch',
+                       'run_until_converged', 'load_store', '_file_info', '_write_cache_info',
+                       '_dataset_cache_is_valid'],
+        # the names (strs) of functions that call print/open/input
         'max-line-length': 100,
         'disable': ['E1136']
     })
@@ -38,9 +38,9 @@ if __name__ == '__main__':
 
     import python_ta
     python_ta.check_all(config={
-        'extra-imports': ['pickle', 'tkinter', 'PIL', 'urllib', 'webbrowser',
+        'extra-imports': ['tkinter', 'PIL', 'urllib', 'webbrowser',
                           'Recommendation', 'k_means', 'spotipy', 'argparse', 'song_tkinter',
-                          'preprocess', 'post_cluster'],
+                          'preprocess', 'post_cluster', 'graph_file', 'server'],
         'allowed-io': [],
         # the names (strs) of functions that call print/open/input
         'max-line-length': 100,
@@ -49,12 +49,12 @@ if __name__ == '__main__':
 
     from argparse import ArgumentParser
     import tkinter as tk
-    import pickle
     import spotipy
 
     from song_tkinter import UserPlaylistEntry, NewPlaylistOutput
     from preprocess import Data
-    from post_cluster import Graph_Save
+    from graph_file import open_graphs
+    from server import RecommendationClient
 
     print('Running main.py. Tkinter interface will appear', end=' ')
     print('when everything finishes loading.\n', end='\r')
@@ -62,38 +62,43 @@ if __name__ == '__main__':
     print('Parsing args...', end='\r')
     arg_parser = ArgumentParser()
     arg_parser.add_argument('--graphs-file-name', type=str)
+    arg_parser.add_argument('--graph-memory-budget-mb', type=int, default=1024)
+    # With a running recommendation server (see server.py), nothing is loaded here
+    arg_parser.add_argument('--server-url', type=str, default=None)
     args = arg_parser.parse_args()
     print('Done parsing args!\n', end='\r')
 
-    # Preprocessed data
-    print('Restoring preprocessed data...', end='\r')
-    data_obj = Data()
-    print('Done restoring preprocessed data!\n', end='\r')
-
-    # Spotify
-    print('Initializing Spotipy client...', end='\r')
-    credentials_manager = spotipy.oauth2.SpotifyClientCredentials(
-        'daf1fbca87e94c9db377c98570e32ece', '1a674398d1bb44859ccaa4488df1aaa9')
-    sp = spotipy.Spotify(client_credentials_manager=credentials_manager)
-    print('Done initializing Spotipy client!\n', end='\r')
-
-    # Restore centroid_to_graph
-    print('Restoring Graphs... This will take a while (3 - 10 min).', end='\r')
-    graphs_file = open(args.graphs_file_name, 'rb')
-    centroid_to_graph_save = pickle.load(file=graphs_file)
-    centroid_to_graph = dict()
-    for centroid in centroid_to_graph_save:
-        cur_graph_save = centroid_to_graph_save[centroid]
-        restored_graph = cur_graph_save.restore()
-        centroid_to_graph[centroid] = restored_graph
-    print('Done restoring Graphs!                                  \n', end='\r')
+    if args.server_url is not None:
+        print(f'Using the recommendation server at {args.server_url}.\n', end='\r')
+        core = {'server': RecommendationClient(args.server_url)}
+    else:
+        # Preprocessed data
+        print('Restoring preprocessed data...', end='\r')
+        data_obj = Data()
+        print('Done restoring preprocessed data!\n', end='\r')
+
+        # Spotify
+        print('Initializing Spotipy client...', end='\r')
+        credentials_manager = spotipy.oauth2.SpotifyClientCredentials(
+            'daf1fbca87e94c9db377c98570e32ece', '1a674398d1bb44859ccaa4488df1aaa9')
+        sp = spotipy.Spotify(client_credentials_manager=credentials_manager)
+        print('Done initializing Spotipy client!\n', end='\r')
+
+        # Restore centroid_to_graph
+        # Each Graph is only restored the first time it is used (see graph_file.LazyGraphs)
+        # New songs are appended to the log of the graphs file and replayed over the graphs
+        print('Restoring Graphs...', end='\r')
+        centroid_to_graph = open_graphs(args.graphs_file_name,
+                                        args.graph_memory_budget_mb * 1024 ** 2)
+        print('Done restoring Graphs!                                  \n', end='\r')
+        core = {'data_obj': data_obj,
+                'sp': sp,
+                'centroid_to_graph': centroid_to_graph,
+                'song_index': centroid_to_graph.song_index}
 
     # Show tkinter
     print('Starting Tkinter interface.\n', end='\r')
     input_window_root = tk.Tk()
-    input_window = UserPlaylistEntry(root=input_window_root,
-                                     core={'data_obj': data_obj,
-                                           'sp': sp,
-                                           'centroid_to_graph': centroid_to_graph})
+    input_window = UserPlaylistEntry(root=input_window_root, core=core)
     input_window.run_window()
     input_window_root.mainloop()
@@ -37,17 +37,23 @@ This file is Copyright (c) 2021 Si Yuan Zhao, Hayk Nazaryan, Cliff Zhang, Joanne
 
 from __future__ import annotations
 import random
-from collections import deque
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import contextlib
+import io
 import pickle
 from argparse import ArgumentParser
+import numpy as np
 import matplotlib.pyplot as plt
 from mpl_toolkits.mplot3d import Axes3D
 import spotipy
 from Point import Point
+from PointStore import PointStore, store_from_points
+from KDTree import KDTree
+from Adjacency import Adjacency, adjacency_from_points
 from preprocess import Data
 from spotify_client import Spotify_Client
 from k_means import KMeansAlgo
-from typing import Any, List
+from typing import Any, List, Optional
 
 
 DATA = Data()
@@ -55,6 +61,9 @@ CLIENT_CREDENTIALS_MANAGER = spotipy.oauth2.SpotifyClientCredentials(
     'daf1fbca87e94c9db377c98570e32ece', '1a674398d1bb44859ccaa4488df1aaa9')
 SPOTIPY = spotipy.Spotify(client_credentials_manager=CLIENT_CREDENTIALS_MANAGER)
 
+# Number of points whose neighbours are looked up in the spatial index at once in init_edges
+EDGE_BLOCK_SIZE = 1024
+
 
 class Graph:
     """
@@ -66,21 +75,61 @@ class Graph:
         - epsilon: float representing a distance
         - id_point_mapping: a dictionary a str ID to a Point object
         - song_ids: list of ids
+        - store: PointStore where row i is the position and id of self.points[i]
+        - mutated: whether points were added since the graph was created or restored
+        - new_point_listeners: functions called with every point added by init_new_point
     """
 
     points: list
     epsilon: float
     id_point_mapping: dict
     song_ids: Any
-
-    def __init__(self, points=[], epsilon=-1) -> None:
+    store: PointStore
+    mutated: bool
+    new_point_listeners: list
+
+    # Private Instance Attributes:
+    #     - _index:
+    #         The KDTree over self.store, or None until the first spatial query.
+    #     - _adjacency:
+    #         The neighbours of every point sorted by distance, or None until the first search.
+    _index: Optional[KDTree]
+    _adjacency: Optional[Adjacency]
+
+    def __init__(self, points=[], epsilon=-1, store: Optional[PointStore] = None,
+                 adjacency: Optional[Adjacency] = None) -> None:
         """
         Initialize Graph class
+        If store is None, a PointStore is built from the positions and ids of points.
+        If adjacency is None, it is built from the neighbours of points when first needed.
         """
         self.points = points
         self.epsilon = epsilon
         self.id_point_mapping = {point.id: point for point in self.points}
         self.song_ids = list(self.id_point_mapping.keys())
+        self.store = store_from_points(self.points) if store is None else store
+        self.mutated = False
+        self.new_point_listeners = []
+        self._index = None
+        self._adjacency = adjacency
+
+    @property
+    def index(self) -> KDTree:
+        """
+        The KDTree over self.store, built the first time it is used
+        """
+        if self._index is None:
+            self._index = KDTree(self.store)
+        return self._index
+
+    @property
+    def adjacency(self) -> Adjacency:
+        """
+        The neighbour rows of every point sorted by distance, built the first time it is used
+        """
+        if self._adjacency is None:
+            self._adjacency = adjacency_from_points(self.points)
+        return self._adjacency
 
     def draw_with_matplotlib(self) -> None:
         """
@@ -175,6 +224,10 @@ class Graph:
         self.epsilon = restored_graph.epsilon
         self.id_point_mapping = {point.id: point for point in self.points}
         self.song_ids = list(self.id_point_mapping.keys())
+        self.store = restored_graph.store
+        self.mutated = False
+        self._index = None
+        self._adjacency = None
 
     def init_edges(self) -> None:
         """
@@ -185,10 +238,15 @@ class Graph:
         """
         noise = []
         progress = 0
-        for point in self.points:
-            close_points = self.points_within_epsilon(point)
+        for row, point in enumerate(self.points):
+            if row % EDGE_BLOCK_SIZE == 0:
+                # Query the index for a whole block of points at once
+                block = self.index.query_radius(
+                    self.store.positions[row:row + EDGE_BLOCK_SIZE], self.epsilon)
+            close_points = [self.points[close_row] for close_row in block[row % EDGE_BLOCK_SIZE]
+                            if close_row != row]
             if len(close_points) == 0:
-                noise.append(point)
+                noise.append(row)
             else:
                 for close_point in close_points:
                     if not point.is_neighbour_with(close_point):
@@ -197,45 +255,60 @@ class Graph:
                 print(f'Progress: {progress} / {len(self.points)} => '
                       f'{round(progress * 100 / len(self.points), 2)}%',
                       end='\r')
-        for far_point in noise:
-            closest_point = self.points[self.closest_point_index(far_point)]
+        # The closest point of every noise point is looked up in a single batch
+        noise = np.array(noise, dtype=np.intp)
+        closest_rows = self.index.nearest(self.store.positions[noise], exclude=noise)
+        for far_row, closest_row in zip(noise, closest_rows):
+            far_point, closest_point = self.points[far_row], self.points[closest_row]
             far_point.become_neighbour(closest_point)
             progress += 1
             print(f'Progress: {progress} / {len(self.points)} => '
                   f'{round(progress * 100 / len(self.points), 2)}%',
                   end='\r')
+        self._adjacency = None
         print('\r')
 
     def points_within_epsilon(self, point: Point) -> Any:
         """
         Return points within self.epsilon
         """
-        close_points = []
-        for a_point in self.points:
-            if a_point is point:
-                continue
-            if point.distance_from(a_point) <= self.epsilon:
-                close_points.append(a_point)
-        return close_points
+        return [self.points[row] for row in self.rows_within_epsilon(point.pos)
+                if self.points[row] is not point]
+
+    def rows_within_epsilon(self, pos: List[float]) -> Any:
+        """
+        Return the rows (in self.store, i.e. indices in self.points) of the points
+        within self.epsilon of the given position, in increasing order
+        """
+        return self.index.query_radius(np.array([pos], dtype=float), self.epsilon)[0].tolist()
+
+    def row_of(self, song_id: str) -> int:
+        """
+        Return the row of the song (its index in self.points)
+
+        Preconditions:
+            - song_id in self.id_point_mapping
+        """
+        return self.store.id_to_row[song_id]
 
     def closest_point_index(self, point: Point) -> Any:
         """
-        Return index of the closest point (in self.points)
+        Return index of the closest point (in self.points), other than point itself.
+        Ties go to the smallest index.
         """
-        closest_point_index = -1
-        closest_point_distance = -1
-        for i in range(len(self.points)):
-            if self.points[i] is point:
-                continue
-            cur_distance = point.distance_from(self.points[i])
-            if cur_distance > closest_point_distance:
-                closest_point_index = i
-                closest_point_distance = cur_distance
-        return closest_point_index
+        row = self.store.row_of(point.id)
+        if row is None or self.points[row] is not point:
+            row = -1
+        return int(self.index.nearest(np.array([point.pos], dtype=float), np.array([row]))[0])
 
-    def recommend(self, input_song_ids: List[str], adventure: int) -> tuple:
+    def recommend(self, input_song_ids: List[str], adventure: int,
+                  new_song_positions: Optional[dict] = None) -> tuple:
         """
-        Use self.bfs() to make recommendations for each song.
+        Use self.search_many() to make recommendations for each song: the songs of the graph
+        are searched together, and each gets the song self.bfs() would find for it.
+        Songs not in the graph are added to it first (see self.init_new_point), at the normalized
+        position given by new_song_positions[song id] if there is one, so that the caller can
+        fetch the features of every new song in one batch; otherwise by self.get_new_song_pos().
         There is fails counter, this counts the number of times when:
         - self.bfs() can't find any song at depth=adventure
         - self.bfs() can find at least 1 song at depth=adventure,
@@ -245,30 +318,47 @@ class Graph:
           song is not in previous recommendations
         """
         recommendations = []
+        blacklist = set(input_song_ids)
+        fails = self.extend_recommendations(input_song_ids, adventure, blacklist, recommendations,
+                                            new_song_positions)
+        self.fill_recommendations(fails, blacklist, recommendations)
+        return recommendations, fails
+
+    def extend_recommendations(self, input_song_ids: List[str], adventure: int, blacklist: set,
+                               recommendations: List[str],
+                               new_song_positions: Optional[dict] = None) -> int:
+        """
+        Make the recommendations of self.recommend() for input_song_ids, without handling fails:
+        append the songs found to recommendations and return the number of fails.
+        Calling it on consecutive parts of the input songs, with the same blacklist and
+        recommendations, finds the same songs as calling it once on all of them.
+
+        Preconditions:
+            - blacklist contains every input song (including those of later calls)
+        """
         fails = 0      # too many fails means cluster too small and/or adventure too big
+        batch = []
         for input_song_id in input_song_ids:
-            if input_song_id in self.song_ids:
-                blacklist = recommendations + input_song_ids
-                res = self.bfs(input_song_id, adventure, blacklist)
-                if res['success']:
-                    recommendations.append(res['data'])
-                else:
-                    fails += 1
-                    continue
-            else:
+            if input_song_id not in self.id_point_mapping:
                 # Handle song not in graph
-                pos = self.get_new_song_pos(input_song_id)
+                # Adding it changes the graph, so the songs before it are searched first
+                fails += self._recommend_batch(batch, adventure, blacklist, recommendations)
+                batch = []
+                if new_song_positions is not None and input_song_id in new_song_positions:
+                    pos = new_song_positions[input_song_id]
+                else:
+                    pos = self.get_new_song_pos(input_song_id)
                 new_song = Point(pos, input_song_id)
                 self.init_new_point(new_song)
+            batch.append(input_song_id)
+        fails += self._recommend_batch(batch, adventure, blacklist, recommendations)
+        return fails
 
-                blacklist = recommendations + input_song_ids
-                res = self.bfs(input_song_id, adventure, blacklist)
-                if res['success']:
-                    recommendations.append(res['data'])
-                else:
-                    fails += 1
-                    continue
-
+    def fill_recommendations(self, fails: int, blacklist: set, recommendations: List[str]) -> None:
+        """
+        Handle the fails of self.extend_recommendations(): append a random song of the graph
+        that is not in blacklist to recommendations for each fail
+        """
         # Handle fails: Find random song in graph
         # Will still be good results overall because graph is a cluster from kmeans,
         # songs in a given cluster share explicable/inexplicable resemblance
@@ -277,15 +367,23 @@ class Graph:
             counter = 0
             for _ in range(fails):
                 random_song = shuffled_songs[counter]
-                blacklist = recommendations + input_song_ids
                 while random_song in blacklist:
                     random_song = shuffled_songs[counter]
                     counter += 1
                     if counter > len(self.song_ids):
                         raise Exception('Cluster too small / Asking for too many songs')
                 recommendations.append(random_song)
+                blacklist.add(random_song)
 
-        return recommendations, fails
+    def _recommend_batch(self, song_ids: List[str], adventure: int, blacklist: set,
+                         recommendations: List[str]) -> int:
+        """
+        Append the songs found by self.search_many() for song_ids to recommendations and
+        return the number of songs of song_ids for which none was found
+        """
+        found = self.search_many(song_ids, adventure, blacklist)
+        recommendations.extend(song_id for song_id in found if song_id is not None)
+        return found.count(None)
 
     def bfs(self, root_song_id: str, adventure: int, blacklist: List[str]) -> dict:
         """
@@ -295,43 +393,105 @@ class Graph:
         - Input (root_song_id) itself
         - Any song in blacklist
         """
-        queue = deque()
-        visited = set()
-        visited.add(root_song_id)
-        queue.append((root_song_id, 0))
-        depth = 0
-        while queue:
-            cur_song_id, cur_depth = queue.popleft()
-
-            # Criteria
-            not_root = cur_song_id != root_song_id
-            adventure_ok = cur_depth == adventure
-            not_blacklisted = cur_song_id not in blacklist
-            if not_root and adventure_ok and not_blacklisted:
-                return {'success': True, 'data': cur_song_id}
-
-            if cur_depth > depth:
-                depth += 1
-
-            cur_song = self.id_point_mapping[cur_song_id]
-            neighbour_keys = sorted(list(cur_song.neighbours.keys()))   # This is distances
-            for neighbour_key in neighbour_keys:
-                neighbour = cur_song.get_neighbour(neighbour_key)
-                if neighbour.id not in visited:
-                    visited.add(neighbour.id)
-                    queue.append((neighbour.id, depth + 1))
-
-        return {'success': False}
+        found = self.search_many([root_song_id], adventure, set(blacklist))[0]
+        if found is None:
+            return {'success': False}
+        return {'success': True, 'data': found}
+
+    def search_many(self, root_song_ids: List[str], adventure: int,
+                    blacklist: set) -> List[Optional[str]]:
+        """
+        For each song of root_song_ids in order, return the song self.bfs(root song id,
+        adventure, blacklist) finds, or None if it finds none, and add it to blacklist (so
+        that the later root songs find different songs).
+
+        The breadth-first searches of all root songs advance together one level at a time
+        (each search keeps its own visited rows, so that it visits songs in the same order
+        as a search on its own) and stop at depth=adventure. The songs at depth=adventure are
+        only visited until one that is not in blacklist is found.
+        """
+        if adventure < 1:
+            return [None] * len(root_song_ids)
+        # Points are visited by row (index in self.points); the neighbours of every row are
+        # already sorted by distance in self.adjacency
+        adjacency = self.adjacency
+        roots = [self.row_of(song_id) for song_id in root_song_ids]
+        # The rows at depth=adventure - 1 and every row visited so far, for each distinct root
+        frontiers = {root: [root] for root in roots}
+        visited = {root: {root} for root in roots}
+        for _ in range(adventure - 1):
+            for root in frontiers:
+                seen = visited[root]
+                next_frontier = []
+                for row in frontiers[root]:
+                    for neighbour_row in adjacency.neighbours(row):
+                        if neighbour_row not in seen:
+                            seen.add(neighbour_row)
+                            next_frontier.append(neighbour_row)
+                frontiers[root] = next_frontier
+
+        found = []
+        for root in roots:
+            seen = visited[root]
+            level = set()
+            song_id = None
+            for row in frontiers[root]:
+                for neighbour_row in adjacency.neighbours(row):
+                    if neighbour_row not in seen and neighbour_row not in level:
+                        level.add(neighbour_row)
+                        if self.points[neighbour_row].id not in blacklist:
+                            song_id = self.points[neighbour_row].id
+                            break
+                if song_id is not None:
+                    break
+            if song_id is not None:
+                blacklist.add(song_id)
+            found.append(song_id)
+        return found
 
     def get_new_song_pos(self, song_id: str) -> List[float]:
         """
         Return normalized position of a new song based on its attributes
+        Raise ValueError if Spotify has no audio features for the song.
         """
         spotify_instance = Spotify_Client()
-        spotify_pos = spotify_instance.get_song_features(song_id)
-        normalized_pos = DATA.normalize_value(spotify_pos)
+        normalized_pos = spotify_instance.get_songs_normalized_features([song_id], DATA)[0]
+        if normalized_pos is None:
+            raise ValueError(f'No audio features for song {song_id}')
         return normalized_pos
 
+    def add_point(self, new_point: Point) -> None:
+        """
+        Add new_point to the graph as it is, without giving it neighbours and without calling
+        self.new_point_listeners
+        """
+        self.points.append(new_point)
+        self.id_point_mapping[new_point.id] = new_point
+        self.song_ids.append(new_point.id)
+        row = self.store.append(new_point.pos, new_point.id)
+        if self._index is not None:
+            self._index.add(row)
+        if self._adjacency is not None:
+            self._adjacency.append_row()
+
+    def connect(self, point: Point, neighbour: Point, distance: Optional[float] = None) -> None:
+        """
+        Make point and neighbour neighbours under distance, or as Point.become_neighbour does
+        if distance is None, keeping self.adjacency sorted
+
+        Preconditions:
+            - point in self.points and neighbour in self.points
+        """
+        if distance is None:
+            distance = point.become_neighbour(neighbour)
+        else:
+            point.neighbours[distance] = neighbour
+            neighbour.neighbours[distance] = point
+        if self._adjacency is not None:
+            row, neighbour_row = self.store.id_to_row[point.id], self.store.id_to_row[neighbour.id]
+            self._adjacency.add(row, distance, neighbour_row)
+            self._adjacency.add(neighbour_row, distance, row)
+
     def init_new_point(self, new_point: Point) -> None:
         """
         Initialize a new song and give it neighbours (make edges)
@@ -346,16 +506,17 @@ class Graph:
         # !!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!
         assert new_point.id not in self.song_ids, "New song's id already in self.song_ids"
         print('Initializing new point...', end='\r')
-        self.points.append(new_point)
-        self.id_point_mapping[new_point.id] = new_point
-        self.song_ids.append(new_point.id)
+        self.mutated = True
+        self.add_point(new_point)
         close_points = self.points_within_epsilon(new_point)
         if len(close_points) == 0:
             closest_point = self.points[self.closest_point_index(new_point)]
-            new_point.become_neighbour(closest_point)
+            self.connect(new_point, closest_point)
         else:
             for close_point in close_points:
-                new_point.become_neighbour(close_point)
+                self.connect(new_point, close_point)
+        for listener in self.new_point_listeners:
+            listener(new_point)
         num_edges = len(close_points) if len(close_points) != 0 else 1
         print(f'Initialized new point with {num_edges} edges!')
 
@@ -404,6 +565,23 @@ class Graph_Save:
         self.edges = edges
         self.epsilon = graph.epsilon
 
+    def save_edge_rows(self, points: List[Point], edge_rows: np.ndarray, epsilon: float) -> None:
+        """
+        Store the same data as self.save(graph) for a graph of points with the given epsilon,
+        whose edges are given as pairs of indices in points, in the order returned by
+        graph_edge_rows(graph). The resulting sets are identical to those of self.save(graph),
+        down to their iteration order.
+        """
+        points_saved = set()
+        for point in points:
+            points_saved.add((tuple(point.pos), point.id))
+        edges = set()
+        for row, neighbour_row in edge_rows.tolist():
+            edges.add((points[row].id, points[neighbour_row].id))
+        self.points = points_saved
+        self.edges = edges
+        self.epsilon = epsilon
+
     def restore(self) -> Graph:
         """
         Reconstruct from attributes to: Restore and return Graph object
@@ -439,13 +617,45 @@ def generate_random_points(dimension: int, num: int) -> List[Point]:
                    for j in range(dimension)], generate_id()) for i in range(num)]
 
 
+def graph_edge_rows(graph: Graph) -> np.ndarray:
+    """
+    Return the edges of graph as a (number of edges, 2) array of indices in graph.points, each
+    edge once, with its two points sorted by id, in the order Graph_Save.save adds them
+    """
+    id_to_row = {point.id: row for row, point in enumerate(graph.points)}
+    seen = set()
+    edge_rows = []
+    for point in graph.points:
+        for neighbour_distance in point.neighbours:
+            neighbour = point.neighbours[neighbour_distance]
+            edge = tuple(sorted([point.id, neighbour.id]))
+            if edge not in seen:
+                seen.add(edge)
+                edge_rows.append((id_to_row[edge[0]], id_to_row[edge[1]]))
+    return np.array(edge_rows, dtype=np.int32).reshape(-1, 2)
+
+
+def build_edge_rows(positions: np.ndarray, ids: List[str], epsilon: float) -> np.ndarray:
+    """
+    Build the graph of the points with the given positions and ids, as the build below does
+    with Graph(points=cluster, epsilon=epsilon).init_edges(), and return graph_edge_rows of it.
+    This is run by the worker processes of the build, so it only receives and returns arrays.
+    """
+    points = [Point(pos, point_id) for pos, point_id in zip(positions.tolist(), ids)]
+    graph = Graph(points=points, epsilon=epsilon)
+    with contextlib.redirect_stdout(io.StringIO()):
+        graph.init_edges()
+    return graph_edge_rows(graph)
+
+
 if __name__ == '__main__':
     import python_ta
     python_ta.check_all(config={
         'extra-imports': ['pickle', 'tkinter', 'PIL', 'urllib', 'webbrowser',
                           'Recommendation', 'Spotify.Spotify_client', 'Spotify.song_features',
                           'k_means', 'spotipy', 'argparse', 'song_tkinter', 'preprocess',
-                          'post_cluster'],
+                          'post_cluster', 'numpy', 'PointStore', 'KDTree', 'Adjacency',
+                          'concurrent.futures', 'contextlib', 'io'],
         'allowed-io': [],
         # the names (strs) of functions that call print/open/input
         'max-line-length': 100,
@@ -463,6 +673,7 @@ if __name__ == '__main__':
     arg_parser.add_argument('--epsilon', type=float)
     arg_parser.add_argument('--input-kmeans-clusters-file-name', type=str)
     arg_parser.add_argument('--output-graphs-file-name', type=str)
+    arg_parser.add_argument('--workers', type=int, default=1)
     args = arg_parser.parse_args()
 
     # Restore kmeans
@@ -473,13 +684,40 @@ if __name__ == '__main__':
     # Initialize edges for each Graph
     # Map centroid to Graph_Save
     centroid_to_graph_save = dict()
-    for centroid in centroid_to_cluster:
-        cur_cluster = centroid_to_cluster[centroid]
-        cur_graph = Graph(points=cur_cluster, epsilon=args.epsilon)
-        cur_graph.init_edges()
-        cur_graph_save = Graph_Save()
-        cur_graph_save.save(cur_graph)
-        centroid_to_graph_save[centroid] = cur_graph_save
+    if args.workers <= 1:
+        for centroid in centroid_to_cluster:
+            cur_cluster = centroid_to_cluster[centroid]
+            cur_graph = Graph(points=cur_cluster, epsilon=args.epsilon)
+            cur_graph.init_edges()
+            cur_graph_save = Graph_Save()
+            cur_graph_save.save(cur_graph)
+            centroid_to_graph_save[centroid] = cur_graph_save
+    else:
+        # Each worker builds one graph from the positions and ids of its cluster and sends
+        # back its edges as an array of index pairs; the largest clusters are started first
+        centroids = sorted(centroid_to_cluster, key=lambda c: len(centroid_to_cluster[c]),
+                           reverse=True)
+        centroid_to_edge_rows = dict()
+        with ProcessPoolExecutor(max_workers=args.workers) as executor:
+            futures = dict()
+            for centroid in centroids:
+                cur_cluster = centroid_to_cluster[centroid]
+                cur_positions = np.array([point.pos for point in cur_cluster],
+                                         dtype=float).reshape(len(cur_cluster), -1)
+                futures[executor.submit(build_edge_rows, cur_positions,
+                                        [point.id for point in cur_cluster],
+                                        args.epsilon)] = centroid
+            for future in as_completed(futures):
+                centroid_to_edge_rows[futures[future]] = future.result()
+                print(f'Graphs built: {len(centroid_to_edge_rows)} / {len(centroids)}',
+                      end='\r')
+        print('\r')
+        # The graphs are saved in the same order as the serial build
+        for centroid in centroid_to_cluster:
+            cur_graph_save = Graph_Save()
+            cur_graph_save.save_edge_rows(centroid_to_cluster[centroid],
+                                          centroid_to_edge_rows[centroid], args.epsilon)
+            centroid_to_graph_save[centroid] = cur_graph_save
 
     # Pickle centroid_to_graph_save
     save_file = open(args.output_graphs_file_name, 'wb')
@@ -35,22 +35,79 @@ OTHER DEALINGS IN THE SOFTWARE.
 
 This file is Copyright (c) 2021 Si Yuan Zhao, Hayk Nazaryan, Cliff Zhang, Joanne Pan.
 """
+import json
+import os
+from typing import Any, Dict, List, Optional, Union
+import numpy as np
 import pandas as pd
 
+# The un-normalized dataset, and the file storing the statistics of it used for normalization
+DATA_FILE_NAME = 'Data/music_data.csv'
+STATS_FILE_NAME = 'Data/music_data_stats.json'
+
+# Number of rows of the raw dataset processed at a time by preprocess_data_streaming
+CHUNK_SIZE = 100_000
+
+# The columns normalized by Data, with their index in a list of song features
+NORMALIZED_COLUMNS = {'duration_ms': 3, 'tempo': 6, 'loudness': 8, 'key': 10}
+
 
 class Data:
     """
     A class to store the the un-normalized music data for normalization purposes.
      This class is used to normalize new song data in the post_cluster module
+
+    Only the minimum and maximum of each column of NORMALIZED_COLUMNS are needed to normalize, so
+    they are computed once and stored in a small statistics file next to the dataset; the
+    dataset itself is only read again if it is newer than the statistics file.
+
+    Instance Attributes:
+        - data_file: The path of the un-normalized dataset
+        - stats_file: The path of the statistics file
+        - minimums: The minimum of each column of NORMALIZED_COLUMNS in the dataset
+        - maximums: The maximum of each column of NORMALIZED_COLUMNS in the dataset
      """
-    data: pd.DataFrame
+    data_file: str
+    stats_file: str
+    minimums: Dict[str, Union[int, float]]
+    maximums: Dict[str, Union[int, float]]
+
+    # Private Instance Attributes:
+    #     - _data:
+    #         The dataset as a pandas dataframe, or None until self.data is used
+    _data: Optional[pd.DataFrame]
 
-    def __init__(self) -> None:
+    def __init__(self, data_file: str = DATA_FILE_NAME, stats_file: str = STATS_FILE_NAME) -> None:
         """
-        Initializes a object that stores the music data as a pandas dataframe. Contains
+        Initializes a object that stores the music data statistics. Contains
         function to normalize any new data based on data in our dataset.
+        The statistics file is (re)written if it is missing or older than the dataset.
         """
-        self.data = pd.read_csv('Data/music_data.csv')
+        self.data_file = data_file
+        self.stats_file = stats_file
+        self._data = None
+        if os.path.exists(stats_file) and (not os.path.exists(data_file) or
+                                           os.path.getmtime(stats_file) >=
+                                           os.path.getmtime(data_file)):
+            with open(stats_file) as file:
+                stats = json.load(file)
+        else:
+            columns = pd.read_csv(data_file, usecols=list(NORMALIZED_COLUMNS))
+            stats = {column: [columns[column].min().item(), columns[column].max().item()]
+                     for column in NORMALIZED_COLUMNS}
+            temporary_file = stats_file + '.tmp'
+            with open(temporary_file, 'w') as file:
+                json.dump(stats, file)
+            os.replace(temporary_file, stats_file)
+        self.minimums = {column: stats[column][0] for column in NORMALIZED_COLUMNS}
+        self.maximums = {column: stats[column][1] for column in NORMALIZED_COLUMNS}
+
+    @property
+    def data(self) -> pd.DataFrame:
+        """The music data as a pandas dataframe, read the first time it is used"""
+        if self._data is None:
+            self._data = pd.read_csv(self.data_file)
+        return self._data
 
     def normalize_value(self, pos: list) -> list:
         """
@@ -73,18 +130,47 @@ class Data:
         loudness = pos[8]
         key = pos[10]
 
-        normalized_duration = (duration - self.data['duration_ms'].min()) / \
-                              (self.data['duration_ms'].max() - self.data['duration_ms'].min())
-        normalized_tempo = (tempo - self.data['tempo'].min()) / \
-                           (self.data['tempo'].max() - self.data['tempo'].min())
-        normalized_loudness = (loudness - self.data['loudness'].min()) / \
-                              (self.data['loudness'].max() - self.data['loudness'].min())
-        normalized_key = (key - self.data['key'].min()) / \
-                         (self.data['key'].max() - self.data['key'].min())
+        normalized_duration = (duration - self.minimums['duration_ms']) / \
+                              (self.maximums['duration_ms'] - self.minimums['duration_ms'])
+        normalized_tempo = (tempo - self.minimums['tempo']) / \
+                           (self.maximums['tempo'] - self.minimums['tempo'])
+        normalized_loudness = (loudness - self.minimums['loudness']) / \
+                              (self.maximums['loudness'] - self.minimums['loudness'])
+        normalized_key = (key - self.minimums['key']) / \
+                         (self.maximums['key'] - self.minimums['key'])
 
         return pos[:3] + [normalized_duration] + pos[4:6] + \
             [normalized_tempo] + [pos[7]] + [normalized_loudness] + [pos[9]] + [normalized_key]
 
+    def normalize_matrix(self, positions: Union[np.ndarray, List[list]]) -> np.ndarray:
+        """
+        Return a new float matrix whose row i is self.normalize_value(positions[i]).
+        The results are exactly those of self.normalize_value.
+
+        Preconditions:
+            - every row of positions is ordered as in self.normalize_value
+
+        >>> data = Data()
+        >>> inputs = [[0.991, 0.598, 0.224, 168333, 0.000522, 0.634, 149.976, 0.379, -12.628,
+        ...            0.0936, 5]]
+        >>> data.normalize_matrix(inputs).tolist() == [data.normalize_value(inputs[0])]
+        True
+        """
+        normalized = np.array(positions, dtype=float).reshape(-1, 11)
+        for column, index in NORMALIZED_COLUMNS.items():
+            minimum, maximum = float(self.minimums[column]), float(self.maximums[column])
+            normalized[:, index] = (normalized[:, index] - minimum) / (maximum - minimum)
+        return normalized
+
+    def normalization_key(self) -> str:
+        """
+        Return a string identifying the normalization done by self.normalize_value, i.e. the
+        minimum and maximum of each normalized column. Normalized features cached by
+        FeatureCache are only reused with the same key.
+        """
+        return ';'.join(f'{column}:{float(self.minimums[column])!r}:'
+                        f'{float(self.maximums[column])!r}' for column in NORMALIZED_COLUMNS)
+
 
 def normalize_df(df: pd.DataFrame, column_name: str) -> None:
     """
@@ -104,6 +190,21 @@ def normalize_df(df: pd.DataFrame, column_name: str) -> None:
     df[column_name] /= max_val
 
 
+def normalize_df_with(df: pd.DataFrame, column_name: str, min_val: Any, max_val: Any) -> None:
+    """
+    Normalizes every value in the specified column in the dataframe like normalize_df, but with
+    the given min and max value of the column instead of the ones of df (e.g. the min and max of
+    the whole dataset when df is one chunk of it).
+
+    Preconditions:
+        - column_name in df.keys()
+        - columns only have numerical values stored in them
+        - min_val and max_val have the type of the values of the column
+    """
+    df[column_name] -= min_val
+    df[column_name] /= max_val - min_val
+
+
 def preprocess_data(file_name: str, columns_to_reorder: list, columns_to_normalize: list,
                     processed_name: str, new_file: bool = False) -> pd.DataFrame:
     """
@@ -139,6 +240,69 @@ def preprocess_data(file_name: str, columns_to_reorder: list, columns_to_normali
     return df_reorder
 
 
+def preprocess_data_streaming(file_name: str, columns_to_reorder: list,
+                              columns_to_normalize: list, processed_name: str,
+                              chunk_size: int = CHUNK_SIZE) -> None:
+    """
+    Generate the same file as preprocess_data(file_name, columns_to_reorder,
+    columns_to_normalize, processed_name, True), byte for byte, without ever holding more than
+    chunk_size rows of the dataset in memory.
+
+    The dataset is read twice, chunk_size rows at a time, and only the columns of
+    columns_to_reorder are read:
+        1. The first pass finds the type pandas would give each column when reading the whole
+           file, and the min and max of each column of columns_to_normalize.
+        2. The second pass reads each chunk with those types, reorders and normalizes it, and
+           appends it to the new file.
+
+    Preconditions:
+        - file_name is a .csv file in the Data folder
+        - file_name is formatted as specified on the database website at top of file
+        - chunk_size > 0
+    """
+    file_path = 'Data/' + file_name
+    header = pd.read_csv(file_path, nrows=0).columns
+    columns = [column for column in header if column in columns_to_reorder]
+
+    dtypes, minimums, maximums = dict(), dict(), dict()
+    for chunk in pd.read_csv(file_path, usecols=columns, chunksize=chunk_size):
+        for column in columns:
+            dtypes[column] = _merge_dtypes(dtypes.get(column), chunk[column].dtype)
+        for column in columns_to_normalize:
+            if column in chunk and chunk[column].notna().any():
+                minimums[column] = min(minimums.get(column, chunk[column].min()),
+                                       chunk[column].min())
+                maximums[column] = max(maximums.get(column, chunk[column].max()),
+                                       chunk[column].max())
+    for column in columns_to_normalize:
+        dtype = dtypes.get(column, np.dtype(float))
+        minimums[column] = dtype.type(minimums.get(column, np.nan))
+        maximums[column] = dtype.type(maximums.get(column, np.nan))
+
+    with open('Data/normalized_' + processed_name, 'w', newline='') as file:
+        first_chunk = True
+        for chunk in pd.read_csv(file_path, usecols=columns, dtype=dtypes,
+                                 chunksize=chunk_size):
+            df_reorder = chunk.reindex(columns=columns_to_reorder)
+            for column in columns_to_normalize:
+                normalize_df_with(df_reorder, column, minimums[column], maximums[column])
+            df_reorder.to_csv(file, index=False, header=first_chunk)
+            first_chunk = False
+        if first_chunk:
+            pd.DataFrame(columns=columns_to_reorder).to_csv(file, index=False)
+
+
+def _merge_dtypes(dtype: Optional[np.dtype], chunk_dtype: np.dtype) -> np.dtype:
+    """Helper function for preprocess_data_streaming.
+    Return the type pandas gives a column whose values so far had the type dtype (None if there
+    were none) and whose next values have the type chunk_dtype."""
+    if dtype is None or dtype == chunk_dtype:
+        return chunk_dtype
+    if dtype.kind in 'if' and chunk_dtype.kind in 'if':
+        return np.dtype(float)
+    return np.dtype(object)
+
+
 if __name__ == "__main__":
     file = "music_data.csv"
     columns_titles = ["id", "name", "artists", "year", "explicit", "mode", "acousticness",
@@ -157,15 +321,19 @@ if __name__ == "__main__":
     # The following function was the one we called to normalize and format our raw data:
     # preprocess_data(file, columns_more_dropped_titles, columns_to_normalize,
     # 'music_data.csv', True)
+    # For raw data larger than memory, this generates the same file chunk by chunk:
+    # preprocess_data_streaming(file, columns_more_dropped_titles, columns_to_normalize,
+    # 'music_data.csv')
 
     import doctest
     doctest.testmod()
 
     import python_ta
     python_ta.check_all(config={
-        'extra-imports': ['pandas'],  # the names (strs) of imported modules
-        'allowed-io': [],  # the names (strs) of functions that
-        # call print/open/input
+        'extra-imports': ['pandas', 'numpy', 'json', 'os', 'typing'],
+        # the names (strs) of imported modules
+        'allowed-io': ['__init__', 'preprocess_data_streaming'],
+        # the names (strs) of functions that call print/open/input
         'max-line-length': 100,
         'disable': ['E1136']
     })
@@ -0,0 +1,292 @@
+"""
+CSC111 Final Project: Playlist Generator
+
+Module Description
+==================
+
+This file is dedicated to the recommendation server, which loads the graphs once and then
+makes recommendations for every client, and to RecommendationClient, the client used by
+main.py (with --server-url) and by the command line below.
+
+Restoring the graphs takes minutes, so instead of every run of main.py paying for it, the
+server keeps them in memory and answers HTTP/JSON requests on a local port:
+- GET /health: {"status": "ok", "graphs": number of graphs, "songs": number of songs}
+- POST /recommend with {"playlist_link": ..., "adventure": ..., "playlist_name": ...}:
+  {"playlist_link": link of the new playlist, "recommendations": [song ids], "summary": {...}}
+  If "playlist_name" is left out, no playlist is created and "playlist_link" is null.
+
+Requests are answered in parallel threads: fetching playlists and audio features from Spotify
+overlaps, and so do the searches of the graphs. Only merging the songs of a playlist that were
+not in the graphs is done one request at a time, while no other request searches the graphs
+(see Recommendation.graph_lock).
+
+Start the server with:
+python server.py serve --graphs-file-name=Graph_Final
+and make a playlist from the command line with:
+python server.py recommend --playlist-link=... --adventure=5 --playlist-name=...
+
+Copyright and Usage Information
+===============================
+
+Permission is hereby granted, free of charge, to any person
+obtaining a copy of this software and associated documentation
+files (the "Software"), to deal in the Software without
+restriction, including without limitation the rights to use,
+copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the
+Software is furnished to do so, subject to the following
+conditions:
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES
+OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY,
+WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+OTHER DEALINGS IN THE SOFTWARE.
+
+This file is Copyright (c) 2021 Si Yuan Zhao, Hayk Nazaryan, Cliff Zhang, Joanne Pan.
+"""
+from __future__ import annotations
+import json
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Optional
+from urllib.error import HTTPError
+from urllib.request import Request, urlopen
+from Recommendation import Recommendation, playlist_summary, recommend_playlist
+from ReadWriteLock import ReadWriteLock
+
+# Default address of the server
+HOST = '127.0.0.1'
+PORT = 8111
+
+
+class RecommendationServer(ThreadingHTTPServer):
+    """
+    A local HTTP server making recommendations with graphs that stay loaded.
+
+    Instance Attributes:
+        - core: The data object, Spotify API, graphs and song index used to recommend (as
+          passed to song_tkinter.UserPlaylistEntry)
+        - graph_lock: Held for reading by a request while it searches the graphs, and for
+          writing while it merges new songs into them
+    """
+    daemon_threads = True
+    core: dict
+    graph_lock: ReadWriteLock
+
+    def __init__(self, core: dict, host: str = HOST, port: int = PORT) -> None:
+        """
+        Start listening on host:port (any free port if port is 0). Call serve_forever to answer
+        requests.
+        """
+        super().__init__((host, port), RecommendationRequestHandler)
+        self.core = core
+        self.graph_lock = ReadWriteLock()
+
+    @property
+    def url(self) -> str:
+        """
+        The address of the server, as given to RecommendationClient
+        """
+        host, port = self.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def health(self) -> Dict[str, Any]:
+        """
+        Return the status of the server and the size of its graphs
+        """
+        return {'status': 'ok', 'graphs': len(self.core['centroid_to_graph']),
+                'songs': len(self.core['song_index'])}
+
+    def recommend(self, request: dict) -> Dict[str, Any]:
+        """
+        Make the recommendations of a /recommend request (see the module description).
+        Raise a ValueError if the request is not valid.
+        """
+        playlist_link = request.get('playlist_link')
+        adventure = request.get('adventure')
+        playlist_name = request.get('playlist_name')
+        if not isinstance(playlist_link, str) or playlist_link == '':
+            raise ValueError('playlist_link must be a non-empty string')
+        if not isinstance(adventure, int) or isinstance(adventure, bool) or adventure < 1:
+            raise ValueError('adventure must be a positive integer')
+        if playlist_name is not None and (not isinstance(playlist_name, str)
+                                          or playlist_name == ''):
+            raise ValueError('playlist_name must be a non-empty string')
+
+        if playlist_name is not None:
+            return recommend_playlist(playlist_link, adventure, playlist_name, self.core,
+                                      self.graph_lock)
+        recommended_song_ids = Recommendation(playlist_link, adventure, self.core['data_obj'],
+                                              self.core['sp'], self.core['centroid_to_graph'],
+                                              self.core['song_index'], self.graph_lock).action()
+        return {'playlist_link': None,
+                'recommendations': recommended_song_ids,
+                'summary': playlist_summary(recommended_song_ids, self.core['data_obj'])}
+
+
+class RecommendationRequestHandler(BaseHTTPRequestHandler):
+    """
+    Answers one connection to a RecommendationServer
+    """
+    protocol_version = 'HTTP/1.1'
+    server: RecommendationServer
+
+    def do_GET(self) -> None:
+        """
+        Answer /health
+        """
+        if self.path == '/health':
+            self._reply(200, self.server.health())
+        else:
+            self._reply(404, {'error': f'Unknown path {self.path}'})
+
+    def do_POST(self) -> None:
+        """
+        Answer /recommend
+        """
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        if self.path != '/recommend':
+            self._reply(404, {'error': f'Unknown path {self.path}'})
+            return
+        try:
+            request = json.loads(body)
+            if not isinstance(request, dict):
+                raise ValueError('the request must be a JSON object')
+            result = self.server.recommend(request)
+        except ValueError as error:
+            self._reply(400, {'error': str(error)})
+        except Exception as error:  # The server must keep serving whatever a request does
+            self._reply(500, {'error': f'{type(error).__name__}: {error}'})
+        else:
+            self._reply(200, result)
+
+    def _reply(self, status: int, content: Any) -> None:
+        """
+        Send content as a JSON response with the given status
+        """
+        data = json.dumps(content).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+class RecommendationClient:
+    """
+    A client of a RecommendationServer.
+
+    Instance Attributes:
+        - url: The address of the server
+        - timeout: The number of seconds to wait for an answer, or None to wait for as long
+          as the recommendations take
+    """
+    url: str
+    timeout: Optional[float]
+
+    def __init__(self, url: str = f'http://{HOST}:{PORT}', timeout: Optional[float] = None) -> None:
+        """
+        Initialize a client of the server at url
+        """
+        self.url = url.rstrip('/')
+        self.timeout = timeout
+
+    def health(self) -> Dict[str, Any]:
+        """
+        Return the status of the server (see RecommendationServer.health)
+        """
+        return self._request('GET', '/health')
+
+    def recommend(self, playlist_link: str, adventure: int,
+                  playlist_name: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Return the recommendations for the playlist at playlist_link, as a dictionary with the
+        link of the new playlist named playlist_name ('playlist_link', None if playlist_name is
+        None), the recommended song ids ('recommendations') and the averages of their features
+        ('summary').
+        Raise a RuntimeError if the server could not make the recommendations, and an OSError
+        if it cannot be reached.
+        """
+        request = {'playlist_link': playlist_link, 'adventure': adventure}
+        if playlist_name is not None:
+            request['playlist_name'] = playlist_name
+        return self._request('POST', '/recommend', request)
+
+    def _request(self, method: str, path: str, content: Optional[dict] = None) -> Dict[str, Any]:
+        """
+        Send a request to the server and return its JSON answer
+        """
+        data = None if content is None else json.dumps(content).encode('utf-8')
+        request = Request(self.url + path, data=data, method=method,
+                          headers={'Content-Type': 'application/json'})
+        try:
+            with urlopen(request, timeout=self.timeout) as response:
+                return json.loads(response.read())
+        except HTTPError as error:
+            try:
+                message = json.loads(error.read()).get('error', error.reason)
+            except ValueError:
+                message = error.reason
+            raise RuntimeError(message) from error
+
+
+if __name__ == '__main__':
+    import python_ta
+    python_ta.check_all(config={
+        'extra-imports': ['json', 'http.server', 'typing', 'urllib.error', 'urllib.request',
+                          'Recommendation', 'ReadWriteLock', 'argparse', 'spotipy',
+                          'preprocess', 'graph_file'],
+        'allowed-io': [],
+        # the names (strs) of functions that call print/open/input
+        'max-line-length': 100,
+        'disable': ['E1136']
+    })
+
+    from argparse import ArgumentParser
+
+    arg_parser = ArgumentParser()
+    commands = arg_parser.add_subparsers(dest='command', required=True)
+    serve_parser = commands.add_parser('serve')
+    serve_parser.add_argument('--graphs-file-name', type=str)
+    serve_parser.add_argument('--graph-memory-budget-mb', type=int, default=1024)
+    serve_parser.add_argument('--host', type=str, default=HOST)
+    serve_parser.add_argument('--port', type=int, default=PORT)
+    recommend_parser = commands.add_parser('recommend')
+    recommend_parser.add_argument('--server-url', type=str, default=f'http://{HOST}:{PORT}')
+    recommend_parser.add_argument('--playlist-link', type=str)
+    recommend_parser.add_argument('--adventure', type=int, default=5)
+    recommend_parser.add_argument('--playlist-name', type=str, default=None)
+    args = arg_parser.parse_args()
+
+    if args.command == 'serve':
+        import spotipy
+        from preprocess import Data
+        from graph_file import open_graphs
+
+        print('Restoring preprocessed data...', end='\r')
+        data_obj = Data()
+        credentials_manager = spotipy.oauth2.SpotifyClientCredentials(
+            'daf1fbca87e94c9db377c98570e32ece', '1a674398d1bb44859ccaa4488df1aaa9')
+        sp = spotipy.Spotify(client_credentials_manager=credentials_manager)
+        print('Restoring Graphs...              ', end='\r')
+        centroid_to_graph = open_graphs(args.graphs_file_name,
+                                        args.graph_memory_budget_mb * 1024 ** 2)
+        recommendation_server = RecommendationServer({'data_obj': data_obj,
+                                                      'sp': sp,
+                                                      'centroid_to_graph': centroid_to_graph,
+                                                      'song_index': centroid_to_graph.song_index},
+                                                     args.host, args.port)
+        print(f'Recommendation server listening at {recommendation_server.url}')
+        try:
+            recommendation_server.serve_forever()
+        except KeyboardInterrupt:
+            recommendation_server.server_close()
+    else:
+        answer = RecommendationClient(args.server_url).recommend(
+            args.playlist_link, args.adventure, args.playlist_name)
+        if answer['playlist_link'] is not None:
+            print(f'New playlist: {answer["playlist_link"]}')
+        print('\n'.join(answer['recommendations']))
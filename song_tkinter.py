@@ -43,8 +43,7 @@ import tkinter as tk
 from tkinter import ttk
 import webbrowser
 from PIL import ImageTk, Image
-from Recommendation import Recommendation
-from spotify_client import Spotify_Client
+from Recommendation import recommend_playlist
 from k_means import KMeansAlgo
 
 
@@ -63,9 +62,12 @@ class UserPlaylistEntry:
 
     Instance Attributes:
         - root: This instance attribute is used for storing the root of the Tkinter window
+        - server: A client of the recommendation server making the recommendations, or None if
+        they are made in this process
         - data_obj: A Data object with all of the raw data
         - sp: Spotify API
         - centroid_to_graph: Mapping of centroid point to its associated graph object
+        - song_index: Mapping of song id to the centroid of the graph containing it
         - ordered_centroids: list of ordered centroid points
         - playlist_entry: the inputted playlist by the user
         - scale_entry: the inputted value on scale/slider by the user
@@ -78,9 +80,11 @@ class UserPlaylistEntry:
     """
 
     root: Any
+    server: Any
     data_obj: Any
     sp: Any
     centroid_to_graph: Any
+    song_index: Any
     ordered_centroids: Any
     playlist_entry: str
     scale_entry: Any
@@ -110,15 +114,20 @@ class UserPlaylistEntry:
     def __init__(self, root: Any, core: dict) -> None:
         """
         Initialize UserPlaylistEntry class
+        core either holds the data object, Spotify API, graphs and song index used to recommend,
+        or only a client of the recommendation server ('server', see server.py).
         """
         # We first initialize the root of our tkinter window
         self.root = root
 
         # Initialize data needed to recommend
-        self.data_obj = core['data_obj']
-        self.sp = core['sp']
-        self.centroid_to_graph = core['centroid_to_graph']
-        self.ordered_centroids = list(self.centroid_to_graph.keys())
+        self.server = core.get('server')
+        self.data_obj = core.get('data_obj')
+        self.sp = core.get('sp')
+        self.centroid_to_graph = core.get('centroid_to_graph')
+        self.song_index = core.get('song_index')
+        self.ordered_centroids = [] if self.centroid_to_graph is None \
+            else list(self.centroid_to_graph.keys())
 
         # Here we initialize the rest of the class attributes that are user inputs to empty strings
         self.playlist_entry = ''
@@ -264,46 +273,21 @@ class UserPlaylistEntry:
                                          ' \n THANK YOU!',
                          font=("Proxima nova", "9", "bold"), fg='white', bg='black').grid()
 
-                # Recommendation computation from module
-                recommended_song_ids = Recommendation(self.playlist_entry,
-                                                      self.scale_entry,
-                                                      self.data_obj,
-                                                      self.sp,
-                                                      self.centroid_to_graph).action()
-
                 # Generating new link
-                # new_playlist_link = SpotifyClient(recommended_song_ids,
-                # self.new_playlist_name).url
-                spotify_instance = Spotify_Client()
-                new_playlist_link = spotify_instance.create_playlist(self.new_playlist_name,
-                                                                     recommended_song_ids)
+                # Recommendation computation, by the recommendation server if there is one
+                if self.server is not None:
+                    result = self.server.recommend(self.playlist_entry, self.scale_entry,
+                                                   self.new_playlist_name)
+                else:
+                    result = recommend_playlist(self.playlist_entry, self.scale_entry,
+                                                self.new_playlist_name,
+                                                {'data_obj': self.data_obj, 'sp': self.sp,
+                                                 'centroid_to_graph': self.centroid_to_graph,
+                                                 'song_index': self.song_index})
+                new_playlist_link = result['playlist_link']
 
                 # Calculating old playlist averages to display
-                aves = [0] * 9      # 9 features
-                num_songs = 0
-                for song_id in recommended_song_ids:
-                    num_songs += 1
-                    # features = self.data_obj.normalize_value(get_features(song_id, self.sp))
-
-                    features = self.data_obj.normalize_value(
-                        spotify_instance.get_song_features(song_id))
-
-                    # Removing duration(ms) and key
-                    cols_removed_features = features[:3] + features[4:10]
-                    for i in range(len(aves)):
-                        aves[i] += cols_removed_features[i]
-
-                aves = list(map(lambda ave: round(ave / num_songs * 100), aves))
-
-                output_playlist_summary = {'Acousticness': aves[0],
-                                           'Danceability': aves[1],
-                                           'Energy': aves[2],
-                                           'Instrumentalness': aves[3],
-                                           'Valence': aves[4],
-                                           'Tempo': aves[5],
-                                           'Liveness': aves[6],
-                                           'Loudness': aves[7],
-                                           'Speechiness': aves[8]}
+                output_playlist_summary = result['summary']
 
                 # Running another Tkinter window (Top Level) to
                 # display computations(aka new playlist)
@@ -319,6 +303,8 @@ class UserPlaylistEntry:
                 print('There is a song in this playlist that the Spotipy API cannot read. \n'
                       'This is because this song is not defined in Spotify but rather '
                       'it most likely is from a local file. \n Please input a new playlist! ')
+            except (OSError, RuntimeError) as error:
+                print(f'The recommendation server could not make the playlist: {error}')
         else:
             print('Invalid playlist entry inputs.\nPlease input all entries!.')
 
@@ -369,6 +355,10 @@ class UserPlaylistEntry:
                 k_means.centroids = list(k_means.clusters)
                 k_means.graph_3d(self.att_1, self.att_2, self.att_3, n=5)
 
+            elif self.centroid_to_graph is None:
+                print('Graphs can only be visualized when they are loaded by main.py \n'
+                      '(run it with --graphs-file-name instead of --server-url).')
+
             else:   # self.visualization == 'Individual Graph'
                 centroid = self.ordered_centroids[self.graph_int - 1]
                 graph = self.centroid_to_graph[centroid]
@@ -33,14 +33,60 @@ OTHER DEALINGS IN THE SOFTWARE.
 
 This file is Copyright (c) 2021 Si Yuan Zhao, Hayk Nazaryan, Cliff Zhang, Joanne Pan.
 """
-from typing import List, Any
+from __future__ import annotations
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Iterable, Iterator, List, Optional, Tuple
+import requests
 import spotipy
+from FeatureCache import FeatureCache
+from SpotifySession import API_URL_VARIABLE, SpotifySession, shared_session
+
+# The permissions requested from the user
+SCOPE = 'playlist-modify-public'
+
+# Maximum number of track ids accepted by one request to the audio-features endpoint
+AUDIO_FEATURES_LIMIT = 100
+
+# Maximum number of items returned by one request for the items of a playlist
+PLAYLIST_PAGE_LIMIT = 100
+
+# The fields requested for each page of the items of a playlist
+PLAYLIST_PAGE_FIELDS = 'total,items(is_local,track(id,type))'
+
+# Number of pages of a playlist requested at the same time
+PLAYLIST_PAGE_WORKERS = 4
+
+# Number of requests for audio features sent at the same time by Recommendation.action
+FEATURE_WORKERS = 4
+
+# Maximum number of tracks added to a playlist by one request
+PLAYLIST_WRITE_LIMIT = 100
+
+# Number of times a failed request adding tracks to a playlist is retried, and the number of
+# seconds waited before the first retry (doubled for each retry)
+WRITE_RETRIES = 3
+WRITE_RETRY_DELAY = 0.5
+
+# The audio features considered for clustering, in the order used by Point positions
+FEATURE_NAMES = ['acousticness', 'danceability', 'energy', 'duration_ms', 'instrumentalness',
+                 'valence', 'tempo', 'liveness', 'loudness', 'speechiness', 'key']
 
 
 class Spotify_Client:
     """
     Using the spotipy library to create a playlist, get song features and get song ids
+
+    Instance Attributes:
+        - cache: The persistent cache of audio features that is checked before the Spotify API
+        - session: The logged in session used for every request
     """
+    cache: FeatureCache
+    session: SpotifySession
+
     # Private Instance Attributes:
     #     - _public_id:
     #         The unique identifier for our application.
@@ -54,39 +100,56 @@ class Spotify_Client:
     _secret_id: Any
     _redirect_uri: Any
 
-    def __init__(self) -> None:
+    def __init__(self, cache: Optional[FeatureCache] = None,
+                 session: Optional[SpotifySession] = None) -> None:
         """
         Initializes the public_id, secret_id and the redirect_uri so
         that init_user can be called anytime
+        If cache is None, the default FeatureCache (Data/feature_cache.sqlite3) is used, or an
+        in-memory one if the Spotify API is replaced by a stand-in (see SpotifySession).
+        If session is None, the session shared by every Spotify_Client of this process is used.
         """
+        if cache is None:
+            cache = FeatureCache(':memory:') if API_URL_VARIABLE in os.environ else FeatureCache()
+        self.cache = cache
         self._public_id = 'daf1fbca87e94c9db377c98570e32ece'
         self._secret_id = '1a674398d1bb44859ccaa4488df1aaa9'
         self._redirect_uri = 'https://pass-post.netlify.app'
+        if session is None:
+            session = shared_session(self._public_id, self._secret_id, self._redirect_uri, SCOPE)
+        self.session = session
 
     def init_user(self) -> Any:
         """
-        Initializes an instance of spotipy.Spotify that is logged in
+        Return the logged in instance of spotipy.Spotify of self.session
         """
-        return \
-            spotipy.Spotify(auth_manager=spotipy.oauth2.SpotifyOAuth(scope="playlist-modify-public",
-                            client_id=self._public_id, client_secret=self._secret_id,
-                            redirect_uri=self._redirect_uri))
+        return self.session.client
 
     def create_playlist(self, playlist_name: str, song_ids: List[str]) -> str:
         """
         Create a new playlist and return the playlist link
+        The songs are added PLAYLIST_WRITE_LIMIT at a time, in order (see PlaylistWriter).
+        """
+        playlist_link, writer = self.open_playlist(playlist_name)
+        writer.append(song_ids)
+        writer.close()
+        return playlist_link
+
+    def open_playlist(self, playlist_name: str) -> Tuple[str, PlaylistWriter]:
+        """
+        Create a new empty playlist and return its link and a PlaylistWriter adding songs to it,
+        so that songs can be added as soon as they are known. The writer must be closed.
         """
         user = self.init_user()
         user_id = user.me()['id']
         playlist_data = user.user_playlist_create(
             user=user_id, name=playlist_name, public=True)
-        user.playlist_add_items(playlist_data['id'], song_ids)
         playlist_link = playlist_data['external_urls']['spotify']
-        return playlist_link
+        return playlist_link, PlaylistWriter(user, playlist_data['id'])
 
-    def get_song_features(self, song_id: str) -> List[float]:
+    def get_song_features(self, song_id: str) -> Optional[List[float]]:
         """
-        Return the audio features of a song
+        Return the audio features of a song, or None if Spotify has no audio features for it
         Not all the features are returned, only the ones we are considering for clustering:
         acousticness, danceability, energy, duration_ms, instrumentalness, valence, tempo, liveness,
         loudness, speechiness and key.
@@ -94,27 +157,102 @@ class Spotify_Client:
         Preconditions:
             - song_id is not None
         """
-        user = self.init_user()
-        user.trace = True
-        features = user.audio_features(song_id)[0]
-        return [features['acousticness'], features['danceability'],
-                features['energy'], features['duration_ms'],
-                features['instrumentalness'], features['valence'],
-                features['tempo'], features['liveness'],
-                features['loudness'], features['speechiness'],
-                features['key']]
+        return self.get_songs_features([song_id])[0]
+
+    def get_songs_features(self, song_ids: List[str]) -> List[Optional[List[float]]]:
+        """
+        Return the audio features of each song of song_ids, in the same order, as returned by
+        get_song_features (None for a song that Spotify has no audio features for).
+        Songs found in self.cache are not requested; the others are requested
+        AUDIO_FEATURES_LIMIT at a time, with a single logged in client, and added to self.cache.
+
+        Preconditions:
+            - all(song_id is not None for song_id in song_ids)
+        """
+        return self._songs_features(song_ids, True)
+
+    def _songs_features(self, song_ids: List[str],
+                        count: bool) -> List[Optional[List[float]]]:
+        """
+        Return get_songs_features(song_ids); the lookups of self.cache are only counted in its
+        hits and misses if count is True
+        """
+        song_to_features = self.cache.get_many(song_ids, count)
+        missing = [song_id for song_id in dict.fromkeys(song_ids)
+                   if song_id not in song_to_features]
+        if len(missing) > 0:
+            user = self.init_user()
+            fetched = dict()
+            for start in range(0, len(missing), AUDIO_FEATURES_LIMIT):
+                chunk = missing[start:start + AUDIO_FEATURES_LIMIT]
+                chunk_features = user.audio_features(chunk) or []
+                chunk_features = list(chunk_features) + \
+                    [None] * (len(chunk) - len(chunk_features))
+                for song_id, features in zip(chunk, chunk_features):
+                    fetched[song_id] = features_to_list(features)
+            self.cache.put_many(fetched)
+            song_to_features.update(fetched)
+        return [song_to_features[song_id] for song_id in song_ids]
+
+    def get_songs_normalized_features(self, song_ids: List[str],
+                                      data: Any) -> List[Optional[List[float]]]:
+        """
+        Return the audio features of each song of song_ids normalized by data.normalize_value
+        (computed for the whole batch by data.normalize_matrix), in the same order (None for a
+        song that Spotify has no audio features for).
+        Normalized features are cached under data.normalization_key(), so songs seen before
+        need neither a request nor a normalization.
+
+        Preconditions:
+            - data is a preprocess.Data
+        """
+        normalization = data.normalization_key()
+        song_to_normalized = self.cache.get_normalized_many(song_ids, normalization)
+        missing = [song_id for song_id in dict.fromkeys(song_ids)
+                   if song_id not in song_to_normalized]
+        if len(missing) > 0:
+            # The songs were already counted as cache misses
+            song_to_features = dict(zip(missing, self._songs_features(missing, False)))
+            normalized = {song_id: None for song_id in missing}
+            found = [song_id for song_id in missing if song_to_features[song_id] is not None]
+            if len(found) > 0:
+                matrix = data.normalize_matrix([song_to_features[song_id] for song_id in found])
+                normalized.update(zip(found, matrix.tolist()))
+            self.cache.put_normalized_many(normalized, normalization)
+            song_to_normalized.update(normalized)
+        return [song_to_normalized[song_id] for song_id in song_ids]
 
     def get_song_ids(self, playlist_link: str) -> List[str]:
         """
         Given the user's playlist URL, return a list of track ids included in the playlist.
         """
+        return list(self.iter_song_ids(playlist_link))
+
+    def iter_song_ids(self, playlist_link: str) -> Iterator[str]:
+        """
+        Given the user's playlist URL, yield the id of every track of the playlist, in order.
+        Local files, episodes and unavailable tracks are skipped.
+
+        The first page of the playlist gives the number of items of the playlist: every other
+        page is requested (PLAYLIST_PAGE_WORKERS at a time) before the songs of the first page
+        are yielded, so that the later pages arrive while the first pages are consumed.
+        """
         user = self.init_user()
         playlist_id = self.parse_link_to_id(playlist_link)
-        res = user.playlist_items(playlist_id,
-                                  offset=0,
-                                  fields='items.track.id',
-                                  additional_types=['track'])['items']
-        return [item['track']['id'] for item in res]
+        first_page = _get_playlist_page(user, playlist_id, 0)
+        offsets = range(PLAYLIST_PAGE_LIMIT, first_page.get('total', 0), PLAYLIST_PAGE_LIMIT)
+        if len(offsets) == 0:
+            yield from _page_song_ids(first_page)
+            return
+        executor = ThreadPoolExecutor(max_workers=PLAYLIST_PAGE_WORKERS)
+        try:
+            pages = [executor.submit(_get_playlist_page, user, playlist_id, offset)
+                     for offset in offsets]
+            yield from _page_song_ids(first_page)
+            for page in pages:
+                yield from _page_song_ids(page.result())
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
 
     def parse_link_to_id(self, playlist_link: str) -> str:
         """
@@ -125,6 +263,156 @@ class Spotify_Client:
         return split_2[0]
 
 
+class PlaylistWriter:
+    """
+    Adds songs to the end of a playlist, in order, PLAYLIST_WRITE_LIMIT songs per request.
+
+    Songs are appended with append(); every full chunk is sent right away by a background
+    thread while the caller goes on, and close() sends the last partial chunk and waits for
+    every chunk. A failed chunk is retried (only that chunk, and only if the failed request did
+    not add it) up to WRITE_RETRIES times. Chunks are sent one after the other on the pooled
+    connection, because a chunk can only be added at the end of the playlist once the chunks
+    before it are there.
+
+    Instance Attributes:
+        - playlist_id: The id of the playlist the songs are added to
+        - written: The number of songs added to the playlist so far
+    """
+    playlist_id: str
+    written: int
+
+    # Private Instance Attributes:
+    #     - _user:
+    #         The logged in spotipy client
+    #     - _pending:
+    #         The appended songs that do not fill a chunk yet
+    #     - _chunks:
+    #         The chunks waiting to be sent, followed by None once the writer is closed
+    #     - _error:
+    #         The error of the chunk that failed every retry, or None
+    #     - _thread:
+    #         The background thread sending the chunks
+    _user: Any
+    _pending: List[str]
+    _chunks: queue.Queue
+    _error: Optional[Exception]
+    _thread: threading.Thread
+
+    def __init__(self, user: Any, playlist_id: str) -> None:
+        """
+        Initialize a writer adding songs to the playlist playlist_id with the client user
+        """
+        self.playlist_id = playlist_id
+        self.written = 0
+        self._user = user
+        self._pending = []
+        self._chunks = queue.Queue()
+        self._error = None
+        self._thread = threading.Thread(target=self._send_chunks, daemon=True)
+        self._thread.start()
+
+    def append(self, song_ids: Iterable[str]) -> None:
+        """
+        Add song_ids to the end of the playlist
+        """
+        self._pending.extend(song_ids)
+        while len(self._pending) >= PLAYLIST_WRITE_LIMIT:
+            self._chunks.put(self._pending[:PLAYLIST_WRITE_LIMIT])
+            self._pending = self._pending[PLAYLIST_WRITE_LIMIT:]
+
+    def close(self) -> None:
+        """
+        Send the remaining songs and wait until every song was added.
+        Raise the error of the chunk that could not be added, if any; the songs after it are
+        not added, so that the playlist keeps the order of the appended songs.
+        """
+        if len(self._pending) > 0:
+            self._chunks.put(self._pending)
+            self._pending = []
+        self._chunks.put(None)
+        self._thread.join()
+        if self._error is not None:
+            raise self._error
+
+    def _send_chunks(self) -> None:
+        """
+        Send every chunk of self._chunks, in order, until None
+        """
+        chunk = self._chunks.get()
+        while chunk is not None:
+            if self._error is None:
+                try:
+                    self._send(chunk)
+                    self.written += len(chunk)
+                except Exception as error:  # Any error must reach close(), not end the thread
+                    self._error = error
+            chunk = self._chunks.get()
+
+    def _send(self, chunk: List[str]) -> None:
+        """
+        Add chunk to the end of the playlist, retrying up to WRITE_RETRIES times.
+
+        Adding songs is not idempotent: a request that failed (e.g. a read timeout) may still
+        have been applied by Spotify. The playlist was created empty and only this writer adds
+        to it, so it holds self.written songs before the chunk: before sending the chunk again,
+        the size of the playlist tells whether the failed request added it. If the playlist
+        holds neither self.written songs nor the chunk on top of them, the error is raised.
+        """
+        error = None
+        for retry in range(WRITE_RETRIES + 1):
+            try:
+                if retry > 0:
+                    total = self._playlist_size()
+                    if total == self.written + len(chunk):
+                        return
+                    if total != self.written:
+                        raise error
+                self._user.playlist_add_items(self.playlist_id, chunk)
+                return
+            except (requests.RequestException, spotipy.SpotifyException) as send_error:
+                if retry == WRITE_RETRIES or send_error is error:
+                    raise
+                error = send_error
+                time.sleep(WRITE_RETRY_DELAY * 2 ** retry)
+
+    def _playlist_size(self) -> int:
+        """
+        Return the number of items in the playlist
+        """
+        return self._user.playlist_items(self.playlist_id, limit=1, fields='total')['total']
+
+
+def _get_playlist_page(user: Any, playlist_id: str, offset: int) -> dict:
+    """Helper function for Spotify_Client.iter_song_ids.
+    Return the page of the items of the playlist starting at offset."""
+    return user.playlist_items(playlist_id, offset=offset, limit=PLAYLIST_PAGE_LIMIT,
+                               fields=PLAYLIST_PAGE_FIELDS, additional_types=['track'])
+
+
+def _page_song_ids(page: dict) -> List[str]:
+    """Helper function for Spotify_Client.iter_song_ids.
+    Return the ids of the tracks of a page of the items of a playlist, skipping local files,
+    episodes and unavailable tracks."""
+    song_ids = []
+    for item in page.get('items') or []:
+        track = item.get('track') if item is not None else None
+        if track is None or item.get('is_local') or track.get('id') is None or \
+                track.get('type', 'track') != 'track':
+            continue
+        song_ids.append(track['id'])
+    return song_ids
+
+
+def features_to_list(features: Optional[dict]) -> Optional[List[float]]:
+    """
+    Return the FEATURE_NAMES values of an audio-features object returned by the Spotify API,
+    or None if features is None or is missing one of them (e.g. an unavailable track)
+    """
+    if features is None or any(features.get(name) is None for name in FEATURE_NAMES):
+        return None
+    return [features[name] for name in FEATURE_NAMES]
+
+
 if __name__ == '__main__':
 
     import python_ta
@@ -132,7 +420,9 @@ if __name__ == '__main__':
         'extra-imports': ['pickle', 'tkinter', 'PIL', 'urllib', 'webbrowser',
                           'Recommendation', 'Spotify.Spotify_client', 'Spotify.song_features',
                           'k_means', 'spotipy', 'argparse', 'song_tkinter', 'preprocess',
-                          'post_cluster', 'pprint'],
+                          'post_cluster', 'pprint', 'FeatureCache', 'SpotifySession',
+                          'concurrent.futures', 'os', 'queue', 'threading', 'time',
+                          'requests'],
         'allowed-io': [],
         # the names (strs) of functions that call print/open/input
         'max-line-length': 100,
@@ -0,0 +1,153 @@
+"""
+CSC111 Final Project: Playlist Generator
+
+Module Description
+==================
+
+This file contains the tests of graph_file: a Graph saved to a graph file (or a mapping of
+centroid to Graph saved to a graphs directory) must load back the same, and so must the graphs
+of a Graph_Save pickle converted to a graphs directory.
+
+Copyright and Usage Information
+===============================
+
+Permission is hereby granted, free of charge, to any person
+obtaining a copy of this software and associated documentation
+files (the "Software"), to deal in the Software without
+restriction, including without limitation the rights to use,
+copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the
+Software is furnished to do so, subject to the following
+conditions:
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES
+OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY,
+WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+OTHER DEALINGS IN THE SOFTWARE.
+
+This file is Copyright (c) 2021 Si Yuan Zhao, Hayk Nazaryan, Cliff Zhang, Joanne Pan.
+"""
+import os
+import pickle
+import random
+from typing import Dict
+from Point import Point
+from post_cluster import Graph, Graph_Save, generate_random_points
+from graph_file import convert_graph_saves, load_graph, load_graphs, same_graph, save_graph, \
+    save_graphs
+
+# Number of coordinates of the positions of the test points, like the audio features
+DIMENSION = 11
+
+
+def small_graph(num: int, epsilon: float) -> Graph:
+    """
+    Return a graph of num random points whose edges are initialized with epsilon
+    """
+    graph = Graph(generate_random_points(DIMENSION, num), epsilon)
+    graph.init_edges()
+    return graph
+
+
+def test_save_graph_round_trip(tmp_path) -> None:
+    """
+    Test that a graph saved with save_graph loads back the same with load_graph
+    """
+    random.seed(111)
+    graph = small_graph(60, 15.0)
+    path = os.path.join(tmp_path, 'cluster_0.graph')
+    save_graph(graph, path)
+    assert same_graph(graph, load_graph(path))
+
+
+def test_save_graph_round_trip_new_point(tmp_path) -> None:
+    """
+    Test that a graph with a point added by init_new_point (appended after the points it was
+    built with) loads back the same
+    """
+    random.seed(112)
+    graph = small_graph(40, 15.0)
+    graph.init_new_point(Point([0.0] * DIMENSION, 'new_song'))
+    path = os.path.join(tmp_path, 'cluster_0.graph')
+    save_graph(graph, path)
+    assert same_graph(graph, load_graph(path))
+
+
+def test_save_graphs_round_trip(tmp_path) -> None:
+    """
+    Test that graphs saved with save_graphs load back the same with load_graphs, mapped from
+    centroids with the same positions, in the same order
+    """
+    random.seed(113)
+    centroid_to_graph: Dict[Point, Graph] = dict()
+    for num in [1, 2, 30, 45]:
+        centroid = generate_random_points(DIMENSION, 1)[0]
+        centroid_to_graph[centroid] = small_graph(num, 15.0)
+    directory = os.path.join(tmp_path, 'Graphs')
+    save_graphs(centroid_to_graph, directory)
+    loaded = load_graphs(directory)
+    assert [list(centroid.pos) for centroid in loaded] == \
+           [list(centroid.pos) for centroid in centroid_to_graph]
+    for graph, loaded_graph in zip(centroid_to_graph.values(), loaded.values()):
+        assert same_graph(graph, loaded_graph)
+
+
+def test_convert_graph_saves(tmp_path) -> None:
+    """
+    Test that the graphs of a Graph_Save pickle, including an evolved graph (with points added
+    by init_new_point), are converted to a graphs directory that loads back the same as
+    Graph_Save.restore()
+    """
+    random.seed(115)
+    centroid_to_graph_save: Dict[Point, Graph_Save] = dict()
+    for num in [1, 25, 40]:
+        graph = small_graph(num, 15.0)
+        graph_save = Graph_Save()
+        graph_save.save(graph)
+        centroid_to_graph_save[generate_random_points(DIMENSION, 1)[0]] = graph_save
+    evolved_graph = small_graph(30, 15.0)
+    evolved_graph.init_new_point(Point([0.0] * DIMENSION, 'new_song'))
+    evolved_graph.init_new_point(Point([20.0] * DIMENSION, 'far_new_song'))
+    evolved_graph_save = Graph_Save()
+    evolved_graph_save.save(evolved_graph)
+    centroid_to_graph_save[generate_random_points(DIMENSION, 1)[0]] = evolved_graph_save
+
+    pickle_path = os.path.join(tmp_path, 'Graphs.pickle')
+    with open(pickle_path, 'wb') as file:
+        pickle.dump(obj=centroid_to_graph_save, file=file, protocol=pickle.HIGHEST_PROTOCOL)
+    with open(pickle_path, 'rb') as file:
+        centroid_to_graph_save = pickle.load(file)
+
+    directory = os.path.join(tmp_path, 'Graphs')
+    loaded = convert_graph_saves(centroid_to_graph_save, directory)
+    assert [list(centroid.pos) for centroid in loaded] == \
+           [list(centroid.pos) for centroid in centroid_to_graph_save]
+    for graph_save, loaded_graph in zip(centroid_to_graph_save.values(), loaded.values()):
+        assert same_graph(graph_save.restore(), loaded_graph)
+    assert 'new_song' in list(loaded.values())[-1].id_point_mapping
+
+
+def test_same_graph_detects_difference(tmp_path) -> None:
+    """
+    Test that same_graph is False for a loaded graph whose neighbours differ from the saved
+    graph
+    """
+    random.seed(114)
+    graph = small_graph(20, 15.0)
+    path = os.path.join(tmp_path, 'cluster_0.graph')
+    save_graph(graph, path)
+    first, last = graph.points[0], graph.points[-1]
+    if not first.is_neighbour_with(last):
+        first.become_neighbour(last)
+    else:
+        first.neighbours.clear()
+    assert not same_graph(graph, load_graph(path))
+
+
+if __name__ == '__main__':
+    import pytest
+    pytest.main(['test_graph_file.py'])
@@ -0,0 +1,257 @@
+"""
+CSC111 Final Project: Playlist Generator
+
+Module Description
+==================
+
+This file contains the tests of the recommendation server: a FakeSpotify and a
+RecommendationServer are started on free ports, over a few small graphs made from a
+generated music data CSV, and the server is checked through its HTTP interface.
+
+Copyright and Usage Information
+===============================
+
+Permission is hereby granted, free of charge, to any person
+obtaining a copy of this software and associated documentation
+files (the "Software"), to deal in the Software without
+restriction, including without limitation the rights to use,
+copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the
+Software is furnished to do so, subject to the following
+conditions:
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES
+OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY,
+WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+OTHER DEALINGS IN THE SOFTWARE.
+
+This file is Copyright (c) 2021 Si Yuan Zhao, Hayk Nazaryan, Cliff Zhang, Joanne Pan.
+"""
+import csv
+import json
+import os
+import random
+import threading
+from typing import Any, Dict, Iterator, List
+from urllib.error import HTTPError
+from urllib.request import Request, urlopen
+import numpy as np
+import pytest
+from Point import Point
+from post_cluster import Graph, generate_id
+from preprocess import Data
+from fake_spotify import FakeSpotify, read_music_data
+from graph_file import open_graphs, save_graphs
+from spotify_client import FEATURE_NAMES
+from SpotifySession import API_URL_VARIABLE
+from server import RecommendationClient, RecommendationServer
+
+# Song and playlist ids are made of letters and digits, like Spotify ids
+ID_ALPHABET = '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz'
+
+# Number of songs of the music data, split into NUM_GRAPHS graphs. Every graph must have more
+# songs than a test playlist and its recommendations, like the clusters of the real data.
+NUM_SONGS = 300
+NUM_GRAPHS = 3
+
+# Epsilon of the test graphs (the positions are normalized, so distances are around 1)
+EPSILON = 0.9
+
+# Number of requests sent at the same time by test_concurrent_requests
+NUM_CONCURRENT = 4
+
+
+def write_music_data(path: str, num: int) -> List[str]:
+    """
+    Write a music data CSV of num songs with random audio features to path, and return the ids
+    of its songs
+    """
+    song_ids = [generate_id(22, ID_ALPHABET) for _ in range(num)]
+    with open(path, 'w', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerow(['id'] + FEATURE_NAMES)
+        for song_id in song_ids:
+            features = {name: random.random() for name in FEATURE_NAMES}
+            features.update({'duration_ms': random.randint(60000, 600000),
+                             'tempo': random.uniform(50.0, 200.0),
+                             'loudness': random.uniform(-40.0, 0.0),
+                             'key': random.randint(0, 11)})
+            writer.writerow([song_id] + [features[name] for name in FEATURE_NAMES])
+    return song_ids
+
+
+def playlist_link(playlist_id: str) -> str:
+    """
+    Return the link of the playlist playlist_id
+    """
+    return f'https://open.spotify.com/playlist/{playlist_id}'
+
+
+def post(url: str, body: bytes) -> int:
+    """
+    Send body to the /recommend endpoint of the server at url and return the status of the
+    response
+    """
+    request = Request(url + '/recommend', data=body, method='POST',
+                      headers={'Content-Type': 'application/json'})
+    try:
+        with urlopen(request) as response:
+            return response.status
+    except HTTPError as error:
+        return error.code
+
+
+@pytest.fixture(scope='module')
+def servers(tmp_path_factory) -> Iterator[Dict[str, Any]]:
+    """
+    Start a FakeSpotify and a RecommendationServer over NUM_GRAPHS graphs of the songs of a
+    generated music data CSV, and stop them after the tests of this file
+    """
+    random.seed(222)
+    directory = tmp_path_factory.mktemp('server')
+    data_file = os.path.join(directory, 'music_data.csv')
+    song_ids = write_music_data(data_file, NUM_SONGS)
+    data_obj = Data(data_file, os.path.join(directory, 'music_data_stats.json'))
+    features = read_music_data(data_file)
+
+    positions = data_obj.normalize_matrix([[features[song_id][name] for name in FEATURE_NAMES]
+                                           for song_id in song_ids])
+    centroid_to_graph = dict()
+    size = NUM_SONGS // NUM_GRAPHS
+    for start in range(0, NUM_SONGS, size):
+        rows = range(start, start + size)
+        graph = Graph([Point(positions[row].tolist(), song_ids[row]) for row in rows], EPSILON)
+        graph.init_edges()
+        centroid_to_graph[Point(np.mean(positions[rows], axis=0).tolist())] = graph
+    graphs_directory = os.path.join(directory, 'Graphs')
+    save_graphs(centroid_to_graph, graphs_directory)
+    graphs = open_graphs(graphs_directory)
+
+    playlists = {'known': song_ids[::30],
+                 'mixed': song_ids[5::30] + [generate_id(22, ID_ALPHABET) for _ in range(5)]}
+    for k in range(NUM_CONCURRENT):
+        playlists[f'concurrent{k}'] = song_ids[10 + k::40] + \
+            [generate_id(22, ID_ALPHABET) for _ in range(3)]
+    fake = FakeSpotify(playlists, features)
+    threading.Thread(target=fake.serve_forever, daemon=True).start()
+    previous_api_url = os.environ.get(API_URL_VARIABLE)
+    os.environ[API_URL_VARIABLE] = fake.url
+
+    server = RecommendationServer({'data_obj': data_obj, 'sp': None,
+                                   'centroid_to_graph': graphs,
+                                   'song_index': graphs.song_index}, port=0)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield {'fake': fake, 'server': server, 'client': RecommendationClient(server.url),
+           'graphs': graphs, 'playlists': playlists}
+
+    server.shutdown()
+    server.server_close()
+    fake.shutdown()
+    fake.server_close()
+    graphs.log.close()
+    if previous_api_url is None:
+        del os.environ[API_URL_VARIABLE]
+    else:
+        os.environ[API_URL_VARIABLE] = previous_api_url
+
+
+def test_health(servers: Dict[str, Any]) -> None:
+    """
+    Test that /health reports the number of graphs and songs
+    """
+    health = servers['client'].health()
+    assert health == {'status': 'ok', 'graphs': NUM_GRAPHS,
+                      'songs': len(servers['graphs'].song_index)}
+
+
+def test_recommend(servers: Dict[str, Any]) -> None:
+    """
+    Test that a valid /recommend creates a playlist of the recommended songs, and adds the
+    songs of the playlist that were not in the graphs to them
+    """
+    answer = servers['client'].recommend(playlist_link('mixed'), 2, 'Mixed Recommendations')
+    recommendations = answer['recommendations']
+    assert len(recommendations) > 0
+    assert not set(recommendations) & set(servers['playlists']['mixed'])
+    created_id = answer['playlist_link'].rsplit('/', 1)[1]
+    assert servers['fake'].playlists[created_id] == recommendations
+    assert len(answer['summary']) == 9
+    assert all(song_id in servers['graphs'].song_index
+               for song_id in servers['playlists']['mixed'])
+
+
+def test_recommend_without_playlist(servers: Dict[str, Any]) -> None:
+    """
+    Test that a /recommend without a playlist name creates no playlist
+    """
+    num_playlists = len(servers['fake'].playlists)
+    answer = servers['client'].recommend(playlist_link('known'), 2)
+    assert answer['playlist_link'] is None
+    assert len(answer['recommendations']) > 0
+    assert len(servers['fake'].playlists) == num_playlists
+
+
+def test_failed_recommend(servers: Dict[str, Any]) -> None:
+    """
+    Test that a /recommend whose recommendations fail (the playlist does not exist) is answered
+    with an error and leaves no empty playlist behind
+    """
+    num_playlists = len(servers['fake'].playlists)
+    with pytest.raises(RuntimeError):
+        servers['client'].recommend(playlist_link('missing'), 2, 'Missing Recommendations')
+    assert len(servers['fake'].playlists) == num_playlists
+
+
+@pytest.mark.parametrize('body', [
+    b'not json',
+    b'[1, 2]',
+    json.dumps({'adventure': 2}).encode('utf-8'),
+    json.dumps({'playlist_link': playlist_link('known'), 'adventure': 0}).encode('utf-8'),
+    json.dumps({'playlist_link': playlist_link('known'), 'adventure': True}).encode('utf-8'),
+    json.dumps({'playlist_link': playlist_link('known'), 'adventure': 2,
+                'playlist_name': ''}).encode('utf-8')])
+def test_bad_request(servers: Dict[str, Any], body: bytes) -> None:
+    """
+    Test that a /recommend request that is not valid is answered with 400 and creates no
+    playlist
+    """
+    num_playlists = len(servers['fake'].playlists)
+    assert post(servers['server'].url, body) == 400
+    assert len(servers['fake'].playlists) == num_playlists
+
+
+def test_concurrent_requests(servers: Dict[str, Any]) -> None:
+    """
+    Test that requests answered at the same time each get the playlist of their own
+    recommendations, and that the new songs of every request are added to the graphs
+    """
+    answers = dict()
+    errors = []
+
+    def recommend(k: int) -> None:
+        try:
+            answers[k] = servers['client'].recommend(playlist_link(f'concurrent{k}'), 2,
+                                                     f'Concurrent {k}')
+        except (RuntimeError, OSError) as error:
+            errors.append(error)
+
+    threads = [threading.Thread(target=recommend, args=(k,)) for k in range(NUM_CONCURRENT)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    for k in range(NUM_CONCURRENT):
+        created_id = answers[k]['playlist_link'].rsplit('/', 1)[1]
+        assert servers['fake'].playlists[created_id] == answers[k]['recommendations']
+        assert all(song_id in servers['graphs'].song_index
+                   for song_id in servers['playlists'][f'concurrent{k}'])
+    assert servers['client'].health()['songs'] == len(servers['graphs'].song_index)
+
+
+if __name__ == '__main__':
+    pytest.main(['test_server.py'])